@@ -98,6 +98,18 @@ DATABASES = {
     }
 }
 
+# Pragmas aplicados a cada conexión SQLite (core.sqlite.aplicar_perfil).
+# cache_size negativo se expresa en KiB; mmap_size en bytes. Nombres y valores se
+# validan contra core.sqlite.VALORES_PERMITIDOS al arrancar.
+SQLITE_PRAGMAS = {
+    'journal_mode': config('SQLITE_JOURNAL_MODE', default='wal'),
+    'synchronous': config('SQLITE_SYNCHRONOUS', default='normal'),
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int),
+    'cache_size': config('SQLITE_CACHE_SIZE', default=-20000, cast=int),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=134217728, cast=int),
+    'temp_store': config('SQLITE_TEMP_STORE', default='memory'),
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 
 
 class Producto(models.Model):
@@ -16,6 +17,7 @@ class Producto(models.Model):
     activo = models.BooleanField(default=True)
     
     imagen = models.ImageField(upload_to='catalogo/productos/', null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.nombre
@@ -23,4 +25,11 @@ class Producto(models.Model):
     class Meta:
       
         verbose_name = "Producto del Catálogo"
-        verbose_name_plural = "Productos del Catálogo"
\ No newline at end of file
+        verbose_name_plural = "Productos del Catálogo"
+        # El catálogo público y el listado filtrado por estado buscan los activos
+        # de una categoría. Es parcial porque Django compara los booleanos como
+        # ``WHERE activo`` y no ``activo = 1``: un índice que empiece por activo no
+        # se usaría.
+        indexes = [
+            models.Index(fields=['categoria'], condition=Q(activo=True), name='catalogo_producto_activos'),
+        ]
\ No newline at end of file
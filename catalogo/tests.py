@@ -1,3 +1,67 @@
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from categoria.models import Categoria
+
+from .models import Producto
+
+
+class FacetasCatalogoTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.url = reverse("catalogo:gestion_productos")
+		self.ramos = Categoria.objects.create(nombre="Ramos")
+		self.cajas = Categoria.objects.create(nombre="Cajas")
+		Producto.objects.create(nombre="Ramo Rosas", categoria=self.ramos, precio=40000, tamano="M")
+		Producto.objects.create(nombre="Ramo Lirios", categoria=self.ramos, precio=120000, tamano="G")
+		Producto.objects.create(nombre="Caja Rosas", categoria=self.cajas, precio=60000, tamano="M", activo=False)
+
+	def test_cada_faceta_ignora_su_propio_filtro(self):
+		response = self.client.get(self.url, {"categoria": self.ramos.pk, "tamano": "M"})
+
+		conteos = {c.nombre: c.conteo for c in response.context["categorias_filtro"]}
+		self.assertEqual(conteos, {"Cajas": 1, "Ramos": 1})
+		self.assertEqual(response.context["tamanos_filtro"], [("G", 1), ("M", 1)])
+		self.assertEqual(response.context["estados_filtro"], {"activo": 1, "inactivo": 0})
+		self.assertEqual([r.productos for r in response.context["precios_filtro"]], [1, 0, 0, 0])
+		self.assertEqual(response.context["resultados_filtrados"], 1)
+		self.assertEqual(response.context["total_productos"], 3)
+		self.assertEqual(response.context["total_inactivos"], 1)
+		self.assertEqual(response.context["total_categorias"], 2)
+
+	def test_texto_y_precio_restringen_todas_las_facetas(self):
+		response = self.client.get(self.url, {"q": "rosas", "precio_min": "50000"})
+
+		self.assertEqual(response.context["estados_filtro"], {"activo": 0, "inactivo": 1})
+		self.assertEqual([r.productos for r in response.context["precios_filtro"]], [1, 1, 0, 0])
+		self.assertEqual(len(response.context["productos"]), 1)
+
+	def test_conteos_cacheados_hasta_que_cambia_el_catalogo(self):
+		self.client.get(self.url, {"estado": "activo"})
+		with CaptureQueriesContext(connection) as consultas:
+			response = self.client.get(self.url, {"estado": "activo"})
+		# Versiones de tablas, categorías del filtro y el listado.
+		self.assertEqual(len(consultas), 3)
+		self.assertEqual(response.context["resultados_filtrados"], 2)
+
+		Producto.objects.create(nombre="Ramo Girasoles", categoria=self.ramos, precio=30000, tamano="P")
+		response = self.client.get(self.url, {"estado": "activo"})
+		self.assertEqual(response.context["resultados_filtrados"], 3)
+
+	def test_tamanos_con_mayusculas_coinciden_con_el_listado(self):
+		Producto.objects.create(nombre="Caja Mini", categoria=self.cajas, precio=20000, tamano="m")
+		Producto.objects.create(nombre="Ramo Pequeño", categoria=self.ramos, precio=20000, tamano="Pequeño")
+		Producto.objects.create(nombre="Caja Pequeña", categoria=self.cajas, precio=20000, tamano="PEQUEÑO")
+
+		response = self.client.get(self.url)
+		tamanos = dict(response.context["tamanos_filtro"])
+		self.assertEqual(tamanos["M"], 3)
+		self.assertNotIn("m", tamanos)
+
+		for tamano in ("m", "pequeño", "PEQUEÑO"):
+			with self.subTest(tamano=tamano):
+				response = self.client.get(self.url, {"tamano": tamano})
+				self.assertEqual(response.context["resultados_filtrados"], len(response.context["productos"]))
@@ -2,12 +2,12 @@ import base64
 from django.shortcuts import render, redirect, get_object_or_404
 from decimal import Decimal, InvalidOperation
 
-from django.db.models import Q
 from django.core.files.base import ContentFile
 from django.contrib import messages
 from .models import Producto
 
 from categoria.models import Categoria
+from core.facetas import FiltrosCatalogo, condicion_filtros, facetas_catalogo
 
 
 def _parse_decimal(valor):
@@ -57,27 +57,6 @@ def lista_productos(request):
     precio_min_raw = request.GET.get('precio_min', '').strip()
     precio_max_raw = request.GET.get('precio_max', '').strip()
 
-    productos = Producto.objects.select_related('categoria').all()
-
-    if query:
-        productos = productos.filter(
-            Q(nombre__icontains=query) |
-            Q(descripcion__icontains=query) |
-            Q(categoria__nombre__icontains=query) |
-            Q(tamano__icontains=query)
-        )
-
-    if categoria_id.isdigit():
-        productos = productos.filter(categoria_id=int(categoria_id))
-
-    if estado == 'activo':
-        productos = productos.filter(activo=True)
-    elif estado == 'inactivo':
-        productos = productos.filter(activo=False)
-
-    if tamano:
-        productos = productos.filter(tamano__iexact=tamano)
-
     precio_min = _parse_decimal(precio_min_raw)
     precio_max = _parse_decimal(precio_max_raw)
 
@@ -87,33 +66,39 @@ def lista_productos(request):
         precio_max_raw = str(precio_max)
         messages.info(request, 'Se ajusto el rango de precios porque el minimo era mayor al maximo.')
 
-    if precio_min is not None:
-        productos = productos.filter(precio__gte=precio_min)
-    if precio_max is not None:
-        productos = productos.filter(precio__lte=precio_max)
-
-    productos = productos.order_by('-id')
-
-    total_productos = Producto.objects.count()
-    total_activos = Producto.objects.filter(activo=True).count()
-    total_inactivos = total_productos - total_activos
-    total_categorias = Producto.objects.values('categoria_id').distinct().count()
+    filtros = FiltrosCatalogo(
+        texto=query,
+        categoria_id=int(categoria_id) if categoria_id.isdigit() else None,
+        estado=estado,
+        tamano=tamano,
+        precio_min=precio_min,
+        precio_max=precio_max,
+    )
+    productos = Producto.objects.select_related('categoria').filter(condicion_filtros(filtros)).order_by('-id')
+
+    # Totales y conteos del panel de filtros en dos consultas agrupadas, cacheadas por filtros.
+    facetas = facetas_catalogo(filtros, request)
+    categorias_filtro = list(Categoria.objects.filter(activo=True).order_by('nombre'))
+    for categoria in categorias_filtro:
+        categoria.conteo = facetas.categorias.get(categoria.pk, 0)
 
     return render(request, 'catalogo_producto.html', {
         'productos': productos,
         'busqueda': query,
-        'categorias_filtro': Categoria.objects.filter(activo=True).order_by('nombre'),
-        'tamanos_filtro': Producto.objects.exclude(tamano__isnull=True).exclude(tamano='').values_list('tamano', flat=True).distinct().order_by('tamano'),
+        'categorias_filtro': categorias_filtro,
+        'tamanos_filtro': list(facetas.tamanos.items()),
+        'estados_filtro': facetas.estados,
+        'precios_filtro': facetas.precios,
         'categoria_filtro': categoria_id,
         'estado_filtro': estado,
         'tamano_filtro': tamano,
         'precio_min_filtro': precio_min_raw,
         'precio_max_filtro': precio_max_raw,
-        'total_productos': total_productos,
-        'total_activos': total_activos,
-        'total_inactivos': total_inactivos,
-        'total_categorias': total_categorias,
-        'resultados_filtrados': productos.count(),
+        'total_productos': facetas.total,
+        'total_activos': facetas.activos,
+        'total_inactivos': facetas.inactivos,
+        'total_categorias': facetas.total_categorias,
+        'resultados_filtrados': facetas.resultados,
         'hay_filtros': any([query, categoria_id, estado, tamano, precio_min_raw, precio_max_raw]),
     })
 
@@ -1,6 +1,21 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def _asegurar_indice_clientes(using, **kwargs):
+    from django.db import connections
+
+    from .utils import TABLA_INDICE_CLIENTES, asegurar_indice_clientes
+
+    conexion = connections[using]
+    # Solo tras la migración que crea el índice; antes la tabla no tiene las columnas.
+    if TABLA_INDICE_CLIENTES in conexion.introspection.table_names():
+        asegurar_indice_clientes(conexion)
 
 
 class ClientesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'clientes'
+
+    def ready(self):
+        post_migrate.connect(_asegurar_indice_clientes, sender=self)
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.27 on 2026-10-18 08:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='busqueda_correo',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='busqueda_documento',
+            field=models.CharField(blank=True, default='', editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='busqueda_nombre',
+            field=models.CharField(blank=True, default='', editable=False, max_length=201),
+        ),
+    ]
@@ -0,0 +1,77 @@
+import unicodedata
+
+from django.db import migrations
+
+
+# El SQL y la normalización se copian aquí a propósito: la migración debe
+# hacer siempre lo mismo aunque luego cambie clientes.utils.
+TABLA_INDICE = "clientes_cliente_fts"
+COLUMNAS = "busqueda_nombre, busqueda_documento, busqueda_correo"
+VALORES_NUEVOS = "new.id, new.busqueda_nombre, new.busqueda_documento, new.busqueda_correo"
+VALORES_ANTERIORES = "old.id, old.busqueda_nombre, old.busqueda_documento, old.busqueda_correo"
+
+SQL_INDICE = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_INDICE} USING fts5({COLUMNAS}, "
+    "content = 'clientes_cliente', content_rowid = 'id', "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    f"CREATE TRIGGER IF NOT EXISTS {TABLA_INDICE}_ai AFTER INSERT ON clientes_cliente BEGIN "
+    f"INSERT INTO {TABLA_INDICE} (rowid, {COLUMNAS}) VALUES ({VALORES_NUEVOS}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TABLA_INDICE}_ad AFTER DELETE ON clientes_cliente BEGIN "
+    f"INSERT INTO {TABLA_INDICE} ({TABLA_INDICE}, rowid, {COLUMNAS}) "
+    f"VALUES ('delete', {VALORES_ANTERIORES}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TABLA_INDICE}_au AFTER UPDATE ON clientes_cliente BEGIN "
+    f"INSERT INTO {TABLA_INDICE} ({TABLA_INDICE}, rowid, {COLUMNAS}) "
+    f"VALUES ('delete', {VALORES_ANTERIORES}); "
+    f"INSERT INTO {TABLA_INDICE} (rowid, {COLUMNAS}) VALUES ({VALORES_NUEVOS}); END",
+]
+
+TAMANO_LOTE = 500
+
+
+def normalizar(texto):
+    descompuesto = unicodedata.normalize("NFKD", texto or "")
+    sin_tildes = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return " ".join(sin_tildes.lower().split())
+
+
+def poblar_busqueda(apps, schema_editor):
+    Cliente = apps.get_model("clientes", "Cliente")
+    ultimo_pk = 0
+    while True:
+        lote = list(Cliente.objects.filter(pk__gt=ultimo_pk).order_by("pk")[:TAMANO_LOTE])
+        if not lote:
+            break
+        for cliente in lote:
+            cliente.busqueda_nombre = normalizar(f"{cliente.nombre} {cliente.apellido}")
+            cliente.busqueda_documento = normalizar(cliente.documento)
+            cliente.busqueda_correo = normalizar(cliente.correo_electronico)
+        Cliente.objects.bulk_update(lote, ["busqueda_nombre", "busqueda_documento", "busqueda_correo"])
+        ultimo_pk = lote[-1].pk
+
+
+def crear_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for sql in SQL_INDICE:
+        schema_editor.execute(sql)
+    schema_editor.execute(f"INSERT INTO {TABLA_INDICE} ({TABLA_INDICE}) VALUES ('rebuild')")
+
+
+def eliminar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for sufijo in ("ai", "ad", "au"):
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {TABLA_INDICE}_{sufijo}")
+    schema_editor.execute(f"DROP TABLE IF EXISTS {TABLA_INDICE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0002_cliente_busqueda'),
+    ]
+
+    operations = [
+        migrations.RunPython(poblar_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.core.validators import RegexValidator
 from django.utils import timezone
 
+from .utils import normalizar_busqueda
+
 class Cliente(models.Model):
     """Modelo para clientes de la floristería."""
 
@@ -35,6 +37,11 @@ class Cliente(models.Model):
     ciudad = models.CharField('Ciudad', max_length=100, blank=True, null=True)
     departamento = models.CharField('Departamento', max_length=45, blank=True, null=True)
 
+    # Columnas normalizadas (minúsculas, sin tildes) para la búsqueda de clientes.
+    busqueda_nombre = models.CharField(max_length=201, blank=True, default='', editable=False)
+    busqueda_documento = models.CharField(max_length=10, blank=True, default='', editable=False)
+    busqueda_correo = models.CharField(max_length=100, blank=True, default='', editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -46,8 +53,20 @@ class Cliente(models.Model):
     def __str__(self):
         return f"{self.nombre} {self.apellido} ({self.documento})"
 
+    CAMPOS_BUSQUEDA = ['busqueda_nombre', 'busqueda_documento', 'busqueda_correo']
+
+    def actualizar_busqueda(self):
+        """Recalcula las columnas normalizadas a partir de los datos del cliente."""
+        self.busqueda_nombre = normalizar_busqueda(f"{self.nombre} {self.apellido}")
+        self.busqueda_documento = normalizar_busqueda(self.documento)
+        self.busqueda_correo = normalizar_busqueda(self.correo_electronico)
+
     def save(self, *args, **kwargs):
         """Asegurar que updated_at siempre tenga un valor."""
         if not self.updated_at:
             self.updated_at = timezone.now()
+        self.actualizar_busqueda()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | set(self.CAMPOS_BUSQUEDA)
         super().save(*args, **kwargs)
\ No newline at end of file
@@ -1,3 +1,37 @@
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from usuarios.models import Usuario
+
+from .models import Cliente
+
+
+class ClienteBusquedaTests(TestCase):
+	def setUp(self):
+		self.user = Usuario.objects.create_user(
+			username="cliente_tester",
+			password="test12345",
+			documento="1234571",
+			email="cliente_tester@example.com",
+		)
+		self.user.is_staff = True
+		self.user.save(update_fields=["is_staff"])
+		self.client.force_login(self.user)
+
+		self.cliente = Cliente.objects.create(
+			documento="9001001",
+			tipo_documento="CC",
+			nombre="María",
+			apellido="Gómez",
+			correo_electronico="Maria.Gomez@Correo.com",
+		)
+		Cliente.objects.create(documento="9001002", tipo_documento="CC", nombre="Pedro", apellido="Díaz")
+
+	def test_columnas_normalizadas(self):
+		self.assertEqual(self.cliente.busqueda_nombre, "maria gomez")
+		self.assertEqual(self.cliente.busqueda_correo, "maria.gomez@correo.com")
+
+	def test_lista_busca_por_nombre_documento_y_correo(self):
+		for texto in ("maria gomez", "GOMEZ", "9001001", "correo"):
+			response = self.client.get(reverse("clientes:lista_clientes"), {"q": texto})
+			self.assertEqual([c.pk for c in response.context["clientes"]], [self.cliente.pk], texto)
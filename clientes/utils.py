@@ -0,0 +1,92 @@
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+
+TABLA_INDICE_CLIENTES = "clientes_cliente_fts"
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+_COLUMNAS = "busqueda_nombre, busqueda_documento, busqueda_correo"
+_VALORES_NUEVOS = "new.id, new.busqueda_nombre, new.busqueda_documento, new.busqueda_correo"
+_VALORES_ANTERIORES = "old.id, old.busqueda_nombre, old.busqueda_documento, old.busqueda_correo"
+
+# Índice FTS5 de contenido externo: lee las columnas de clientes_cliente y se
+# mantiene con triggers, así también cubre los UPDATE masivos.
+SQL_INDICE_CLIENTES = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_INDICE_CLIENTES} USING fts5({_COLUMNAS}, "
+    "content = 'clientes_cliente', content_rowid = 'id', "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    f"CREATE TRIGGER IF NOT EXISTS {TABLA_INDICE_CLIENTES}_ai AFTER INSERT ON clientes_cliente BEGIN "
+    f"INSERT INTO {TABLA_INDICE_CLIENTES} (rowid, {_COLUMNAS}) VALUES ({_VALORES_NUEVOS}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TABLA_INDICE_CLIENTES}_ad AFTER DELETE ON clientes_cliente BEGIN "
+    f"INSERT INTO {TABLA_INDICE_CLIENTES} ({TABLA_INDICE_CLIENTES}, rowid, {_COLUMNAS}) "
+    f"VALUES ('delete', {_VALORES_ANTERIORES}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TABLA_INDICE_CLIENTES}_au AFTER UPDATE ON clientes_cliente BEGIN "
+    f"INSERT INTO {TABLA_INDICE_CLIENTES} ({TABLA_INDICE_CLIENTES}, rowid, {_COLUMNAS}) "
+    f"VALUES ('delete', {_VALORES_ANTERIORES}); "
+    f"INSERT INTO {TABLA_INDICE_CLIENTES} (rowid, {_COLUMNAS}) VALUES ({_VALORES_NUEVOS}); END",
+]
+
+
+def normalizar_busqueda(texto):
+    """Minúsculas, sin tildes y con espacios simples: "Muñoz  Pérez" -> "munoz perez"."""
+    descompuesto = unicodedata.normalize("NFKD", texto or "")
+    sin_tildes = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return " ".join(sin_tildes.lower().split())
+
+
+def q_busqueda_cliente(texto, prefijo=""):
+    """
+    Filtro ``Q`` que exige que cada palabra de ``texto`` sea prefijo de alguna
+    palabra del nombre completo, el documento o el correo del cliente.
+
+    Solo coinciden prefijos: "4567" ya no encuentra el documento "1234567"
+    como con el antiguo ``icontains``; se busca desde el comienzo ("1234").
+    ``prefijo`` permite usarlo desde otros modelos (p. ej. ``"cliente__"`` en Venta).
+    En SQLite la búsqueda usa el índice FTS5 sobre las columnas normalizadas.
+    """
+    tokens = _TOKEN.findall(normalizar_busqueda(texto))
+    if not tokens:
+        return Q()
+
+    if connection.vendor == "sqlite":
+        match = " ".join(f'"{token}"*' for token in tokens)
+        subconsulta = RawSQL(
+            f"SELECT rowid FROM {TABLA_INDICE_CLIENTES} WHERE {TABLA_INDICE_CLIENTES} MATCH %s",
+            [match],
+        )
+        return Q(**{f"{prefijo}pk__in": subconsulta})
+
+    filtro = Q()
+    for token in tokens:
+        filtro &= (
+            Q(**{f"{prefijo}busqueda_nombre__contains": token})
+            | Q(**{f"{prefijo}busqueda_documento__startswith": token})
+            | Q(**{f"{prefijo}busqueda_correo__contains": token})
+        )
+    return filtro
+
+
+def asegurar_indice_clientes(conexion, reconstruir=False):
+    """
+    Crea (si faltan) la tabla FTS5 y los triggers de clientes.
+
+    SQLite descarta los triggers cuando una migración reconstruye la tabla
+    clientes_cliente; por eso se llama también tras cada ``migrate``.
+    """
+    if conexion.vendor != "sqlite":
+        return
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+            [f"{TABLA_INDICE_CLIENTES}_%"],
+        )
+        faltan_triggers = cursor.fetchone()[0] < 3
+        for sql in SQL_INDICE_CLIENTES:
+            cursor.execute(sql)
+        if reconstruir or faltan_triggers:
+            cursor.execute(f"INSERT INTO {TABLA_INDICE_CLIENTES} ({TABLA_INDICE_CLIENTES}) VALUES ('rebuild')")
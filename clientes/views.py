@@ -1,11 +1,14 @@
 from django.contrib import messages
-from django.db import OperationalError, ProgrammingError, models
+from django.db import OperationalError, ProgrammingError
 from django.shortcuts import redirect
 from django.urls import reverse_lazy
 from django.views import generic
 
+from core.versiones import respuesta_condicional
+
 from .forms import ClienteForm
 from .models import Cliente
+from .utils import q_busqueda_cliente
 from django.http import JsonResponse
 
 
@@ -47,12 +50,7 @@ class ClienteListView(generic.ListView):
             self.departamento = self.request.GET.get('departamento', '').strip()
 
             if self.q:
-                qs = qs.filter(
-                    models.Q(nombre__icontains=self.q) |
-                    models.Q(apellido__icontains=self.q) |
-                    models.Q(documento__icontains=self.q) |
-                    models.Q(correo_electronico__icontains=self.q)
-                )
+                qs = qs.filter(q_busqueda_cliente(self.q))
 
             if self.tipo_documento:
                 qs = qs.filter(tipo_documento=self.tipo_documento)
@@ -147,6 +145,7 @@ class ClienteDeleteView(DBSafeMixin, generic.DeleteView):
         return super().form_valid(form)
 
 
+@respuesta_condicional('clientes.Cliente', privado=True)
 def verificar_documento(request):
     """Vista AJAX para verificar si un documento ya existe"""
     documento = request.GET.get('documento', '')
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.27 on 2026-10-18 08:29
+
+from django.db import migrations, models
+
+
+def poblar_resumen(apps, schema_editor):
+    Compra = apps.get_model('compras', 'Compra')
+    ResumenDiarioCompra = apps.get_model('compras', 'ResumenDiarioCompra')
+    filas = (
+        Compra.objects.order_by()
+        .values('fecha_emision', 'proveedor_id')
+        .annotate(r_num_compras=models.Count('pk'), r_subtotal=models.Sum('subtotal'), r_total=models.Sum('total_compra'))
+    )
+    ResumenDiarioCompra.objects.bulk_create(
+        (
+            ResumenDiarioCompra(
+                fecha=fila['fecha_emision'],
+                proveedor_id=fila['proveedor_id'],
+                num_compras=fila['r_num_compras'],
+                subtotal=fila['r_subtotal'],
+                total=fila['r_total'],
+            )
+            for fila in filas
+        ),
+        batch_size=500,
+    )
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('proveedores', '0001_initial'),
+        ('compras', '0003_remove_compra_ciudad_remove_compra_departamento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiarioCompra',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('num_compras', models.IntegerField(default=0)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('proveedor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='proveedores.proveedor')),
+            ],
+            options={
+                'verbose_name': 'Resumen diario de compras',
+                'verbose_name_plural': 'Resúmenes diarios de compras',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='resumendiariocompra',
+            constraint=models.UniqueConstraint(fields=('fecha', 'proveedor'), name='compras_resumen_diario_unico'),
+        ),
+        migrations.RunPython(poblar_resumen, migrations.RunPython.noop),
+    ]
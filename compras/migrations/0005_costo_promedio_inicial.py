@@ -0,0 +1,37 @@
+# Generated by Django 4.2.27 on 2026-10-18 08:38
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def poblar_costo_promedio(apps, schema_editor):
+    # Sin el historial de stock no se puede repetir el promedio móvil; se parte
+    # del precio medio de compra de cada item.
+    DetalleCompra = apps.get_model('compras', 'DetalleCompra')
+    for tipo_item, app, modelo, campo in (('FLOR', 'flor', 'Flor', 'flor_id'), ('PRODUCTO', 'producto', 'Producto', 'producto_id')):
+        Item = apps.get_model(app, modelo)
+        filas = (
+            DetalleCompra.objects.filter(tipo_item=tipo_item, **{f'{campo}__isnull': False})
+            .order_by()
+            .values(campo)
+            .annotate(unidades=models.Sum('cantidad'), importe=models.Sum('subtotal'))
+        )
+        costos = {fila[campo]: fila['importe'] / fila['unidades'] for fila in filas if fila['unidades'] > 0}
+        items = list(Item.objects.filter(pk__in=list(costos)))
+        for item in items:
+            item.costo_promedio = Decimal(costos[item.pk]).quantize(Decimal('0.0001'))
+        Item.objects.bulk_update(items, ['costo_promedio'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('compras', '0004_resumen_diario_compra'),
+        ('flor', '0003_costo_promedio'),
+        ('producto', '0003_costo_promedio'),
+    ]
+
+    operations = [
+        migrations.RunPython(poblar_costo_promedio, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.27 on 2026-10-18 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('compras', '0005_costo_promedio_inicial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='compra',
+            index=models.Index(fields=['fecha_emision', 'total_compra'], name='compras_compra_fecha_total'),
+        ),
+        migrations.AddIndex(
+            model_name='compra',
+            index=models.Index(fields=['total_compra'], name='compras_compra_total'),
+        ),
+    ]
@@ -1,8 +1,12 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Sum
 from django.conf import settings
 from decimal import Decimal
 from proveedores.models import Proveedor
 
+from core.costos import registrar_entradas
+from core.resumenes import acumular_en_fila_de, mover_aporte, reconstruir
+
 # --- Definiciones de Choices para Compra ---
 
 FORMA_PAGO_CHOICES = [
@@ -56,16 +60,82 @@ class Compra(models.Model):
     class Meta:
         verbose_name = "Compra"
         verbose_name_plural = "Compras"
+        # Filtros del listado: rango de fechas (con o sin rango de total) y rango de total solo.
+        indexes = [
+            models.Index(fields=["fecha_emision", "total_compra"], name="compras_compra_fecha_total"),
+            models.Index(fields=["total_compra"], name="compras_compra_total"),
+        ]
 
     def __str__(self):
         return f"Compra {self.id} - {self.descripcion}"
 
     def calcular_totales(self):
-        """Calcula automáticamente los totales de la compra"""
-        detalles = self.detalles.all()
-        self.subtotal = sum((d.subtotal for d in detalles), Decimal('0'))
-        self.total_compra = self.subtotal
-        self.save()
+        """Recalcula los totales leyendo todos los detalles (reconciliación completa)."""
+        subtotal = sum((d.subtotal for d in self.detalles.all()), Decimal('0'))
+        with transaction.atomic():
+            anterior = self._aporte_anterior()
+            Compra.objects.filter(pk=self.pk).update(subtotal=subtotal, total_compra=subtotal)
+            self.subtotal = self.total_compra = subtotal
+            mover_aporte(ResumenDiarioCompra, anterior, self.aporte_resumen())
+
+    def sumar_a_totales(self, delta):
+        """Suma ``delta`` (cambio en los items) a subtotal y total_compra con un UPDATE F()."""
+        Compra.objects.filter(pk=self.pk).update(
+            subtotal=F('subtotal') + delta,
+            total_compra=F('total_compra') + delta,
+        )
+        self.subtotal += delta
+        self.total_compra += delta
+
+        acumular_en_fila_de(
+            ResumenDiarioCompra,
+            Compra.objects.filter(pk=self.pk),
+            {'fecha': 'fecha_emision', 'proveedor': 'proveedor'},
+            {'subtotal': delta, 'total': delta},
+        )
+
+    def sumar_a_lineas(self, cambios):
+        """Lleva al costo promedio de los items ``{(tipo_item, item_pk): (cantidad, subtotal)}``."""
+        registrar_entradas(cambios)
+
+    def aporte_resumen(self):
+        """Claves y valores con que la compra suma a ``ResumenDiarioCompra``."""
+        claves = {'fecha': self.fecha_emision, 'proveedor_id': self.proveedor_id}
+        valores = {
+            'num_compras': 1,
+            'subtotal': self.subtotal or Decimal('0'),
+            'total': self.total_compra or Decimal('0'),
+        }
+        return claves, valores
+
+    def _aporte_anterior(self):
+        """
+        Aporte de la fila guardada, leída con bloqueo dentro de la transacción.
+
+        Los totales los mantienen los detalles por delta, así que se toman de la
+        fila: una instancia cargada antes de editar las líneas no los pisa.
+        """
+        if self._state.adding or self.pk is None:
+            return None
+        guardada = Compra.objects.select_for_update().filter(pk=self.pk).first()
+        if guardada is None:
+            return None
+        self.subtotal = guardada.subtotal
+        self.total_compra = guardada.total_compra
+        return guardada.aporte_resumen()
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            anterior = self._aporte_anterior()
+            super().save(*args, **kwargs)
+            mover_aporte(ResumenDiarioCompra, anterior, self.aporte_resumen())
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            anterior = self._aporte_anterior()
+            resultado = super().delete(*args, **kwargs)
+            mover_aporte(ResumenDiarioCompra, anterior, None)
+        return resultado
 
 
 # --- Modelo DetalleCompra ---
@@ -108,14 +178,111 @@ class DetalleCompra(models.Model):
     def __str__(self):
         return f"Detalle {self.id} - Compra {self.compra.id} - {self.item_nombre} x {self.cantidad}"
 
-    def save(self, *args, **kwargs):
+    def preparar(self):
+        """Normaliza FK y subtotal; bulk_create/bulk_update no pasan por save()."""
         if self.tipo_item == 'FLOR':
             self.producto = None
         elif self.tipo_item == 'PRODUCTO':
             self.flor = None
 
         self.subtotal = self.cantidad * self.precio
-        super().save(*args, **kwargs)
+        return self
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._subtotal_guardado = instancia.__dict__.get('subtotal')
+        if not instancia.get_deferred_fields():
+            instancia._entrada_guardada = instancia._entrada()
+        return instancia
 
+    def _entrada(self):
+        item_pk = self.flor_id if self.tipo_item == 'FLOR' else self.producto_id
+        return (self.tipo_item, item_pk), self.cantidad, self.subtotal
+
+    def _subtotal_anterior(self):
+        if self._state.adding:
+            return Decimal('0')
+        anterior = getattr(self, '_subtotal_guardado', None)
+        if anterior is None:
+            anterior = DetalleCompra.objects.filter(pk=self.pk).values_list('subtotal', flat=True).first()
+        return anterior or Decimal('0')
+
+    def _entrada_anterior(self):
+        if self._state.adding:
+            return None
+        entrada = getattr(self, '_entrada_guardada', None)
+        if entrada is None:
+            guardado = DetalleCompra.objects.filter(pk=self.pk).first()
+            entrada = guardado._entrada() if guardado else None
+        return entrada
+
+    @staticmethod
+    def _mover_entradas(anterior, nueva):
+        """Cambio en el costo promedio al pasar de la entrada ``anterior`` a ``nueva``."""
+        entradas = {}
+        for entrada, signo in ((anterior, -1), (nueva, 1)):
+            if entrada:
+                clave, cantidad, subtotal = entrada
+                acumulado = entradas.get(clave, (0, Decimal('0')))
+                entradas[clave] = (acumulado[0] + signo * cantidad, acumulado[1] + signo * subtotal)
+        registrar_entradas(entradas)
+
+    def save(self, *args, **kwargs):
+        self.preparar()
+        delta = self.subtotal - self._subtotal_anterior()
+        anterior = self._entrada_anterior()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._mover_entradas(anterior, self._entrada())
+            if delta:
+                self.compra.sumar_a_totales(delta)
+        self._subtotal_guardado = self.subtotal
+        self._entrada_guardada = self._entrada()
+
+    def delete(self, *args, **kwargs):
+        anterior = self._subtotal_anterior()
+        entrada = self._entrada_anterior()
+        with transaction.atomic():
+            resultado = super().delete(*args, **kwargs)
+            self._mover_entradas(entrada, None)
+            if anterior:
+                self.compra.sumar_a_totales(-anterior)
+        return resultado
+
+
+# --- Resumen diario de compras ---
+
+class ResumenDiarioCompra(models.Model):
+    """Totales de compras por día y proveedor, mantenidos por diferencias."""
+    fecha = models.DateField()
+    proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE, related_name='resumenes_diarios')
+    num_compras = models.IntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'proveedor'], name='compras_resumen_diario_unico'),
+        ]
+        verbose_name = "Resumen diario de compras"
+        verbose_name_plural = "Resúmenes diarios de compras"
 
+    @classmethod
+    def reconstruir(cls):
+        """Recalcula el resumen completo desde Compra con un GROUP BY. Devuelve las filas creadas."""
+        filas = (
+            Compra.objects.order_by()
+            .values('fecha_emision', 'proveedor_id')
+            .annotate(r_num_compras=Count('pk'), r_subtotal=Sum('subtotal'), r_total=Sum('total_compra'))
+        )
+        return reconstruir(cls, (
+            {
+                'fecha': fila['fecha_emision'],
+                'proveedor_id': fila['proveedor_id'],
+                'num_compras': fila['r_num_compras'],
+                'subtotal': fila['r_subtotal'],
+                'total': fila['r_total'],
+            }
+            for fila in filas
+        ))
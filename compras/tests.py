@@ -1,14 +1,19 @@
 from datetime import date
+from decimal import Decimal
 
+from django.db import transaction
 from django.test import TestCase
 from django.urls import reverse
 
+from core.concurrencia import VersionDesactualizada
+from core.costos import registrar_entradas
+from core.movimientos import diferencias_con_contadores
 from flor.models import Flor
 from producto.models import Producto
 from proveedores.models import Proveedor
 from usuarios.models import Usuario
 
-from .models import Compra
+from .models import Compra, ResumenDiarioCompra
 
 
 class CompraStockTests(TestCase):
@@ -94,6 +99,7 @@ class CompraStockTests(TestCase):
 		self.producto.refresh_from_db()
 		self.assertEqual(self.flor.cantidad, 7)
 		self.assertEqual(self.producto.cantidad, 1)
+		self.assertEqual(diferencias_con_contadores(), [])
 
 	def test_eliminar_compra_revierte_stock(self):
 		self._crear_compra(cant_flor=6, cant_producto=3)
@@ -108,6 +114,21 @@ class CompraStockTests(TestCase):
 		self.assertEqual(self.flor.cantidad, 0)
 		self.assertEqual(self.producto.cantidad, 0)
 
+	def test_eliminar_compra_sin_stock_suficiente_no_revierte(self):
+		self._crear_compra(cant_flor=6, cant_producto=3)
+		compra = Compra.objects.latest("id")
+		Flor.objects.filter(pk=self.flor.pk).update(cantidad=2)
+
+		response = self.client.post(reverse("compras:eliminar_compra", args=[compra.id]))
+
+		self.assertEqual(response.status_code, 302)
+		self.assertTrue(Compra.objects.filter(pk=compra.pk).exists())
+
+		self.flor.refresh_from_db()
+		self.producto.refresh_from_db()
+		self.assertEqual(self.flor.cantidad, 2)
+		self.assertEqual(self.producto.cantidad, 3)
+
 	def test_subtotal_y_total_compra_se_guardan_correctamente(self):
 		response = self._crear_compra(cant_flor=5, cant_producto=2)
 		self.assertEqual(response.status_code, 302)
@@ -117,6 +138,89 @@ class CompraStockTests(TestCase):
 		self.assertEqual(float(compra.total_compra), 60000.0)
 
 
+	def test_resumen_diario_sigue_crear_editar_y_eliminar(self):
+		self._crear_compra(cant_flor=5, cant_producto=2)
+		compra = Compra.objects.latest("id")
+		fila = ResumenDiarioCompra.objects.get()
+		self.assertEqual((fila.num_compras, float(fila.total)), (1, 60000.0))
+
+		self.client.post(
+			reverse("compras:editar_compra", args=[compra.id]),
+			{
+				"proveedor": self.proveedor.id,
+				"fecha_emision": date.today().isoformat(),
+				"descripcion": "Compra test editada",
+				"item_id[]": [f"F-{self.flor.id}"],
+				"precio[]": ["10000"],
+				"cantidad[]": ["1"],
+			},
+		)
+		fila.refresh_from_db()
+		self.assertEqual((fila.num_compras, float(fila.subtotal), float(fila.total)), (1, 10000.0, 10000.0))
+
+		self.client.post(reverse("compras:eliminar_compra", args=[compra.id]))
+		fila.refresh_from_db()
+		self.assertEqual((fila.num_compras, float(fila.total)), (0, 0.0))
+
+	def test_costo_promedio_ponderado_sigue_las_compras(self):
+		def _comprar(cantidad, precio):
+			self.client.post(
+				reverse("compras:crear_compra"),
+				{
+					"proveedor": self.proveedor.id,
+					"fecha_emision": date.today().isoformat(),
+					"descripcion": "Compra costo",
+					"item_id[]": [f"F-{self.flor.id}"],
+					"precio[]": [str(precio)],
+					"cantidad[]": [str(cantidad)],
+				},
+			)
+			self.flor.refresh_from_db()
+			return Compra.objects.latest("id")
+
+		_comprar(10, 1000)
+		self.assertEqual(self.flor.costo_promedio, Decimal("1000"))
+		_comprar(10, 2000)
+		self.assertEqual(self.flor.costo_promedio, Decimal("1500"))
+
+		# Salen 5 unidades: el promedio no cambia y la siguiente compra pondera con 15.
+		Flor.objects.filter(pk=self.flor.pk).update(cantidad=15)
+		ultima = _comprar(5, 3000)
+		self.assertEqual(self.flor.costo_promedio, Decimal("1875"))
+
+		self.client.post(
+			reverse("compras:editar_compra", args=[ultima.id]),
+			{
+				"proveedor": self.proveedor.id,
+				"fecha_emision": date.today().isoformat(),
+				"descripcion": "Compra costo",
+				"item_id[]": [f"F-{self.flor.id}"],
+				"precio[]": ["1500"],
+				"cantidad[]": ["5"],
+			},
+		)
+		self.flor.refresh_from_db()
+		self.assertEqual(self.flor.costo_promedio, Decimal("1500"))
+
+		self.client.post(reverse("compras:eliminar_compra", args=[ultima.id]))
+		self.flor.refresh_from_db()
+		self.assertEqual((self.flor.cantidad, self.flor.costo_promedio), (15, Decimal("1500")))
+
+
+	def test_costo_promedio_en_decimal_y_con_version(self):
+		Flor.objects.filter(pk=self.flor.pk).update(cantidad=3, costo_promedio=Decimal("1000"))
+		editado = Flor.objects.get(pk=self.flor.pk)
+
+		registrar_entradas({("FLOR", self.flor.pk): (4, Decimal("4001.33"))})
+
+		self.flor.refresh_from_db()
+		# (3 * 1000 + 4001.33) / 7 = 1000.19
+		self.assertEqual(self.flor.costo_promedio, Decimal("1000.1900"))
+		editado.precio = 1200
+		with self.assertRaises(VersionDesactualizada), transaction.atomic():
+			editado.save()
+
+
 class CompraFiltroListadoTests(TestCase):
 	def setUp(self):
 		self.user = Usuario.objects.create_user(
@@ -181,3 +285,32 @@ class CompraFiltroListadoTests(TestCase):
 		compras = list(response.context["compras"])
 		self.assertEqual(len(compras), 1)
 		self.assertEqual(float(compras[0].total_compra), 12000.0)
+
+	def test_kpis_en_una_sola_consulta(self):
+		from core.kpis import resumir_kpis
+
+		with self.assertNumQueries(1):
+			kpis = resumir_kpis(
+				Compra.objects.all(),
+				campo_monto="total_compra",
+				campo_relacion="proveedor",
+				campo_fecha="fecha_emision",
+			)
+
+		self.assertEqual(kpis.total, 2)
+		self.assertEqual(float(kpis.monto_total), 40000.0)
+		self.assertEqual(kpis.relacionados, 2)
+		self.assertEqual(kpis.del_mes, 2)
+
+		response = self.client.get(reverse("compras:lista_compra"), {"precio_min": "20000"})
+		self.assertEqual(response.context["kpis"].total, 1)
+		self.assertEqual(response.context["resultados_filtrados"], 1)
+
+	def test_exporta_csv_con_filtros(self):
+		response = self.client.get(reverse("compras:exportar_compras"), {"precio_min": "20000"})
+
+		self.assertEqual(response.status_code, 200)
+		contenido = b"".join(response.streaming_content).decode("utf-8-sig")
+		filas = [fila for fila in contenido.splitlines() if fila]
+		self.assertEqual(len(filas), 2)
+		self.assertIn("Proveedor Dos", filas[1])
@@ -6,6 +6,7 @@ app_name = 'compras'
 
 urlpatterns = [
     path('', views.compras_list, name='lista_compra'),
+    path('exportar/', views.exportar_compras, name='exportar_compras'),
     path('<int:id>/', views.compra_detail, name='compra_detail'),
     path('crear/', views.CompraCreateView.as_view(), name='crear_compra'),
     path('editar/<int:compra_id>/', views.CompraUpdateView.as_view(), name='editar_compra'),
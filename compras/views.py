@@ -2,8 +2,7 @@ from decimal import Decimal, InvalidOperation
 
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db import transaction
-from django.db.models import Q, Sum
+from django.db.models import Prefetch, Q
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.template import loader
@@ -11,7 +10,15 @@ from django.urls import reverse_lazy
 from django.views import generic
 
 from datetime import date, datetime
-
+from urllib.parse import urlencode
+
+from core.costos import agrupar_entradas, registrar_entradas
+from core.detalles import conciliar_detalles
+from core.exportacion import respuesta_csv, respuesta_xlsx
+from core.kpis import resumir_kpis
+from core.movimientos import movimientos_de, registrar_movimientos
+from core.stock import agrupar_cantidades, ajustar_stock
+from core.transacciones import escritura
 from flor.models import Flor
 from producto.models import Producto
 from proveedores.models import Proveedor
@@ -20,6 +27,9 @@ from .forms import CompraForm
 from .models import Compra, DetalleCompra
 
 
+EXPORTACION_CHUNK = 500
+
+
 def _parse_item_id(raw_item_id):
     tipo_raw, raw_id = (raw_item_id or "").split("-", 1)
     item_id = int(raw_id)
@@ -84,49 +94,60 @@ def _parse_detalles_compra(request):
     return detalles
 
 
-def _bloquear_item(tipo_item, item_pk):
-    if tipo_item == "FLOR":
-        return Flor.objects.select_for_update().get(pk=item_pk)
-    return Producto.objects.select_for_update().get(pk=item_pk)
-
-
-def _sumar_stock_item(tipo_item, item_pk, cantidad):
-    item = _bloquear_item(tipo_item, item_pk)
-    item.cantidad += cantidad
-    item.save(update_fields=["cantidad"])
-
-
-def _restar_stock_item(tipo_item, item_pk, cantidad, contexto):
-    item = _bloquear_item(tipo_item, item_pk)
-    if item.cantidad < cantidad:
-        raise ValueError(
-            f"No hay stock suficiente para ajustar {item.nombre} en {contexto}. Disponible: {item.cantidad}, requerido: {cantidad}."
+def _construir_detalles(compra, detalles):
+    """Arma los DetalleCompra (sin guardar) a partir de los detalles del POST."""
+    nuevos = []
+    for data in detalles:
+        detalle = DetalleCompra(
+            compra=compra,
+            tipo_item=data["tipo_item"],
+            cantidad=data["cantidad"],
+            precio=data["precio"],
         )
-    item.cantidad -= cantidad
-    item.save(update_fields=["cantidad"])
+        if data["tipo_item"] == "FLOR":
+            detalle.flor_id = data["item_pk"]
+        else:
+            detalle.producto_id = data["item_pk"]
+        nuevos.append(detalle.preparar())
+    return nuevos
 
 
-def compras_list(request):
-    lista_compras = Compra.objects.select_related("proveedor", "usuario").prefetch_related(
-        "detalles__flor", "detalles__producto"
-    )
+def _detalles_guardados(compra):
+    """Detalles actuales de la compra en el formato de ``_parse_detalles_compra``."""
+    detalles = []
+    for tipo_item, flor_id, producto_id, cantidad, precio in compra.detalles.values_list(
+        "tipo_item", "flor_id", "producto_id", "cantidad", "precio"
+    ):
+        item_pk = flor_id if tipo_item == "FLOR" else producto_id
+        if item_pk:
+            detalles.append({"tipo_item": tipo_item, "item_pk": item_pk, "cantidad": cantidad, "precio": precio})
+    return detalles
 
-    q = request.GET.get("q", "").strip()
-    proveedor_nombre = request.GET.get("proveedor_nombre", "").strip()
-    fecha_desde = request.GET.get("fecha_desde", "")
-    precio_min = request.GET.get("precio_min", "").strip()
-    precio_max = request.GET.get("precio_max", "").strip()
 
-    def _parse_decimal(raw_numero):
-        valor = (raw_numero or "").strip()
-        if not valor:
-            return None
-        try:
-            if "," in valor:
-                valor = valor.replace(".", "").replace(",", ".")
-            return Decimal(valor)
-        except (InvalidOperation, ValueError, TypeError):
-            return None
+def _parse_decimal(raw_numero):
+    valor = (raw_numero or "").strip()
+    if not valor:
+        return None
+    try:
+        if "," in valor:
+            valor = valor.replace(".", "").replace(",", ".")
+        return Decimal(valor)
+    except (InvalidOperation, ValueError, TypeError):
+        return None
+
+
+def _filtrar_compras(params):
+    """
+    Aplica los filtros del listado de compras (q, proveedor, fechas, precios).
+
+    Devuelve ``(compras, filtros)``; en ``filtros`` los valores inválidos quedan vacíos.
+    """
+    lista_compras = Compra.objects.select_related("proveedor", "usuario")
+    filtros = {
+        clave: params.get(clave, "").strip()
+        for clave in ("q", "proveedor_nombre", "fecha_desde", "fecha_hasta", "precio_min", "precio_max")
+    }
+    q = filtros["q"]
 
     if q:
         filtros_q = (
@@ -138,64 +159,110 @@ def compras_list(request):
             filtros_q = filtros_q | Q(id=int(q))
         lista_compras = lista_compras.filter(filtros_q)
 
-    if proveedor_nombre:
-        lista_compras = lista_compras.filter(proveedor__nombre_proveedor__icontains=proveedor_nombre)
+    if filtros["proveedor_nombre"]:
+        lista_compras = lista_compras.filter(proveedor__nombre_proveedor__icontains=filtros["proveedor_nombre"])
 
-    if fecha_desde:
-        try:
-            fecha = datetime.strptime(fecha_desde, "%Y-%m-%d").date()
-            lista_compras = lista_compras.filter(fecha_emision__gte=fecha)
-        except ValueError:
-            fecha_desde = ""
+    for clave, lookup in (("fecha_desde", "fecha_emision__gte"), ("fecha_hasta", "fecha_emision__lte")):
+        if filtros[clave]:
+            try:
+                fecha = datetime.strptime(filtros[clave], "%Y-%m-%d").date()
+                lista_compras = lista_compras.filter(**{lookup: fecha})
+            except ValueError:
+                filtros[clave] = ""
 
-    precio_min_val = _parse_decimal(precio_min)
-    precio_max_val = _parse_decimal(precio_max)
+    for clave, lookup in (("precio_min", "total_compra__gte"), ("precio_max", "total_compra__lte")):
+        if filtros[clave]:
+            valor = _parse_decimal(filtros[clave])
+            if valor is not None:
+                lista_compras = lista_compras.filter(**{lookup: valor})
+            else:
+                filtros[clave] = ""
 
-    if precio_min and precio_min_val is None:
-        precio_min = ""
-    if precio_max and precio_max_val is None:
-        precio_max = ""
+    return lista_compras, filtros
 
-    if precio_min_val is not None:
-        lista_compras = lista_compras.filter(total_compra__gte=precio_min_val)
-    if precio_max_val is not None:
-        lista_compras = lista_compras.filter(total_compra__lte=precio_max_val)
+
+def compras_list(request):
+    lista_compras, filtros = _filtrar_compras(request.GET)
+    lista_compras = lista_compras.prefetch_related("detalles__flor", "detalles__producto")
 
     template = loader.get_template("lista_compra.html")
     proveedores = Proveedor.objects.all().order_by("nombre_proveedor")
 
-    total_compras = lista_compras.count()
-    monto_total = lista_compras.aggregate(Sum("total_compra"))["total_compra__sum"] or 0
-    total_proveedores = lista_compras.values("proveedor").distinct().count()
-
-    hoy = date.today()
-    inicio_mes = hoy.replace(day=1)
-    compras_mes = lista_compras.filter(fecha_emision__gte=inicio_mes, fecha_emision__lte=hoy).count()
+    kpis = resumir_kpis(
+        lista_compras, campo_monto="total_compra", campo_relacion="proveedor", campo_fecha="fecha_emision"
+    )
 
     context = {
         "compras": lista_compras,
-        "query": q,
-        "total_compras": total_compras,
-        "monto_total": monto_total,
-        "total_proveedores": total_proveedores,
-        "compras_mes": compras_mes,
+        "query": filtros["q"],
+        "kpis": kpis,
         "proveedores": proveedores,
-        "proveedor_nombre_filtro": proveedor_nombre,
-        "fecha_desde_filtro": fecha_desde,
-        "precio_min_filtro": precio_min,
-        "precio_max_filtro": precio_max,
-        "resultados_filtrados": lista_compras.count(),
-        "hay_filtros": any([q, proveedor_nombre, fecha_desde, precio_min, precio_max]),
+        "proveedor_nombre_filtro": filtros["proveedor_nombre"],
+        "fecha_desde_filtro": filtros["fecha_desde"],
+        "fecha_hasta_filtro": filtros["fecha_hasta"],
+        "precio_min_filtro": filtros["precio_min"],
+        "precio_max_filtro": filtros["precio_max"],
+        "filtros_query": urlencode({clave: valor for clave, valor in filtros.items() if valor}),
+        "resultados_filtrados": kpis.total,
+        "hay_filtros": any(filtros.values()),
     }
     return HttpResponse(template.render(context, request))
 
 
+ENCABEZADOS_EXPORTACION = [
+    "Compra", "Fecha emision", "Proveedor", "Documento proveedor", "Descripcion", "Forma de pago",
+    "Medio de pago", "Subtotal compra", "Total compra",
+    "Tipo item", "Item", "Cantidad", "Precio unitario", "Subtotal linea",
+]
+
+
+def _filas_exportacion(compras):
+    """Una fila por línea de compra; las compras sin líneas salen con las columnas de item vacías."""
+    detalles = Prefetch(
+        "detalles",
+        queryset=DetalleCompra.objects.select_related("flor", "producto").order_by("pk"),
+    )
+    consulta = compras.order_by("fecha_emision", "pk").prefetch_related(detalles)
+    for compra in consulta.iterator(chunk_size=EXPORTACION_CHUNK):
+        datos_compra = [
+            compra.pk,
+            compra.fecha_emision,
+            compra.proveedor.nombre_proveedor,
+            compra.proveedor.numero_documento,
+            compra.descripcion,
+            compra.get_forma_pago_display(),
+            compra.get_medio_pago_display(),
+            compra.subtotal,
+            compra.total_compra,
+        ]
+        lineas = compra.detalles.all()
+        if not lineas:
+            yield datos_compra + ["", "", "", "", ""]
+        for detalle in lineas:
+            yield datos_compra + [
+                detalle.get_tipo_item_display(),
+                detalle.item_nombre,
+                detalle.cantidad,
+                detalle.precio,
+                detalle.subtotal,
+            ]
+
+
+def exportar_compras(request):
+    compras, _ = _filtrar_compras(request.GET)
+    nombre = f"compras_{date.today():%Y%m%d}"
+    filas = _filas_exportacion(compras)
+
+    if request.GET.get("formato") == "xlsx":
+        return respuesta_xlsx(nombre, ENCABEZADOS_EXPORTACION, filas, hoja="Compras")
+    return respuesta_csv(nombre, ENCABEZADOS_EXPORTACION, filas)
+
+
 def compra_detail(request, id):
     una_compra = get_object_or_404(
         Compra.objects.select_related("proveedor", "usuario").prefetch_related("detalles__flor", "detalles__producto"),
         id=id,
     )
-    una_compra.calcular_totales()
     template = loader.get_template("compra_detail.html")
 
     context = {
@@ -227,29 +294,20 @@ class CompraCreateView(LoginRequiredMixin, generic.CreateView):
             return self.form_invalid(form)
 
         try:
-            with transaction.atomic():
+            with escritura():
                 compra = form.save(commit=False)
-                compra.subtotal = 0
-                compra.total_compra = 0
+                nuevos = _construir_detalles(compra, detalles)
+                compra.subtotal = sum((d.subtotal for d in nuevos), Decimal("0"))
+                compra.total_compra = compra.subtotal
                 compra.usuario = self.request.user
                 compra.save()
 
-                for data in detalles:
-                    detalle = DetalleCompra(
-                        compra=compra,
-                        tipo_item=data["tipo_item"],
-                        cantidad=data["cantidad"],
-                        precio=data["precio"],
-                    )
-                    if data["tipo_item"] == "FLOR":
-                        detalle.flor = Flor.objects.get(pk=data["item_pk"])
-                    else:
-                        detalle.producto = Producto.objects.get(pk=data["item_pk"])
-                    detalle.save()
-
-                    _sumar_stock_item(data["tipo_item"], data["item_pk"], data["cantidad"])
-
-                compra.calcular_totales()
+                DetalleCompra.objects.bulk_create(nuevos)
+                # El costo promedio se calcula con el stock previo a la entrada.
+                registrar_entradas(agrupar_entradas(detalles))
+                cambios = agrupar_cantidades(detalles)
+                ajustar_stock(cambios)
+                registrar_movimientos(movimientos_de(cambios, "COMPRA", compra.pk))
 
             messages.success(self.request, f"Compra registrada exitosamente con {len(detalles)} item(s).")
             return redirect(self.success_url)
@@ -294,41 +352,12 @@ class CompraUpdateView(LoginRequiredMixin, generic.UpdateView):
         compra = self.get_object()
 
         try:
-            with transaction.atomic():
+            with escritura():
                 compra = form.save()
 
-                detalles_actuales = list(compra.detalles.select_related("flor", "producto"))
-
-                for detalle in detalles_actuales:
-                    item_pk = detalle.flor_id if detalle.tipo_item == "FLOR" else detalle.producto_id
-                    if not item_pk:
-                        continue
-
-                    _restar_stock_item(
-                        detalle.tipo_item,
-                        item_pk,
-                        detalle.cantidad,
-                        "la edicion de compra",
-                    )
-
-                compra.detalles.all().delete()
-
-                for data in nuevos_detalles:
-                    detalle = DetalleCompra(
-                        compra=compra,
-                        tipo_item=data["tipo_item"],
-                        cantidad=data["cantidad"],
-                        precio=data["precio"],
-                    )
-                    if data["tipo_item"] == "FLOR":
-                        detalle.flor = Flor.objects.get(pk=data["item_pk"])
-                    else:
-                        detalle.producto = Producto.objects.get(pk=data["item_pk"])
-                    detalle.save()
-
-                    _sumar_stock_item(data["tipo_item"], data["item_pk"], data["cantidad"])
-
-                compra.calcular_totales()
+                deltas = conciliar_detalles(compra, nuevos_detalles)
+                ajustar_stock(deltas, contexto="la edicion de compra")
+                registrar_movimientos(movimientos_de(deltas, "COMPRA_EDITADA", compra.pk))
 
             messages.success(self.request, f"Compra actualizada exitosamente con {len(nuevos_detalles)} item(s).")
             return redirect(self.success_url)
@@ -357,19 +386,12 @@ class CompraDeleteView(LoginRequiredMixin, generic.DeleteView):
     def post(self, request, *args, **kwargs):
         compra = self.get_object()
         try:
-            with transaction.atomic():
-                detalles = list(compra.detalles.select_related("flor", "producto"))
-                for detalle in detalles:
-                    item_pk = detalle.flor_id if detalle.tipo_item == "FLOR" else detalle.producto_id
-                    if not item_pk:
-                        continue
-
-                    _restar_stock_item(
-                        detalle.tipo_item,
-                        item_pk,
-                        detalle.cantidad,
-                        "la eliminacion de compra",
-                    )
+            with escritura():
+                guardados = _detalles_guardados(compra)
+                registrar_entradas(agrupar_entradas(guardados, signo=-1))
+                cambios = agrupar_cantidades(guardados, signo=-1)
+                ajustar_stock(cambios, contexto="la eliminacion de compra")
+                registrar_movimientos(movimientos_de(cambios, "COMPRA_ELIMINADA", compra.pk))
                 compra.delete()
 
             messages.success(request, f"La compra {compra.id} ha sido eliminada exitosamente.")
@@ -1,6 +1,24 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def _asegurar_triggers_versiones(using, **kwargs):
+    from django.db import connections
+
+    from .versiones import asegurar_triggers
+
+    # Una migración que reconstruye una tabla en SQLite borra sus triggers.
+    asegurar_triggers(connections[using])
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .sqlite import pragmas
+
+        # Un SQLITE_PRAGMAS inválido debe fallar al arrancar, no en la primera conexión.
+        pragmas()
+        post_migrate.connect(_asegurar_triggers_versiones, sender=self)
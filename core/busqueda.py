@@ -0,0 +1,259 @@
+"""
+Índices de búsqueda: inventario (flores y productos) y catálogo público.
+
+En SQLite se usan tablas virtuales FTS5 con plegado de tildes
+(``remove_diacritics``), de modo que "orquidea" encuentra "Orquídea", con
+búsqueda por prefijo y orden por relevancia (bm25). En el inventario precio,
+stock e imagen se leen en la misma consulta uniendo con las tablas de items;
+en el catálogo el índice solo aporta los ids, en orden de relevancia, al queryset.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from flor.models import Flor
+from producto.models import Producto
+
+
+TABLA_INDICE = "core_inventario_fts"
+
+SQL_CREAR_INDICE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_INDICE} USING fts5("
+    "nombre, descripcion, tipo_item UNINDEXED, item_id UNINDEXED, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+
+TABLA_INDICE_CATALOGO = "core_catalogo_fts"
+
+SQL_CREAR_INDICE_CATALOGO = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_INDICE_CATALOGO} USING fts5("
+    "nombre, descripcion, categoria, tamano, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+# Pesos bm25 por columna: nombre, descripcion, categoria, tamano.
+PESOS_CATALOGO = "10.0, 1.0, 4.0, 2.0"
+# La portada muestra a lo sumo estos productos por búsqueda.
+RESULTADOS_CATALOGO = 60
+
+_MODELOS = {"FLOR": Flor, "PRODUCTO": Producto}
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def indice_disponible():
+    return connection.vendor == "sqlite"
+
+
+def _rowid(tipo_item, item_id):
+    # Flores en rowid par y productos en impar para que la clave sea única.
+    return item_id * 2 + (0 if tipo_item == "FLOR" else 1)
+
+
+def indexar_item(tipo_item, item):
+    """Inserta o reemplaza el item en el índice."""
+    if not indice_disponible():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT OR REPLACE INTO {TABLA_INDICE} (rowid, nombre, descripcion, tipo_item, item_id) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            [_rowid(tipo_item, item.pk), item.nombre, item.descripcion or "", tipo_item, item.pk],
+        )
+
+
+def desindexar_item(tipo_item, item_id):
+    if not indice_disponible():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA_INDICE} WHERE rowid = %s", [_rowid(tipo_item, item_id)])
+
+
+def reconstruir_indice():
+    """Vacía el índice y lo vuelve a llenar desde Flor y Producto. Devuelve los items indexados."""
+    if not indice_disponible():
+        return 0
+    total = 0
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_CREAR_INDICE)
+        cursor.execute(f"DELETE FROM {TABLA_INDICE}")
+        for tipo_item, modelo in _MODELOS.items():
+            filas = [
+                (_rowid(tipo_item, pk), nombre, descripcion or "", tipo_item, pk)
+                for pk, nombre, descripcion in modelo.objects.values_list("pk", "nombre", "descripcion").iterator()
+            ]
+            cursor.executemany(
+                f"INSERT INTO {TABLA_INDICE} (rowid, nombre, descripcion, tipo_item, item_id) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                filas,
+            )
+            total += len(filas)
+    return total
+
+
+def _expresion_match(texto):
+    # Cada palabra se busca como prefijo y entre comillas para neutralizar
+    # la sintaxis de FTS5 (operadores, paréntesis, etc.).
+    return " ".join(f'"{token}"*' for token in _TOKEN.findall(texto))
+
+
+def buscar_items(texto, limite=20):
+    """
+    Devuelve hasta ``limite`` items que coinciden con ``texto``, ordenados por relevancia.
+
+    Cada resultado es un dict con ``tipo_item``, ``id``, ``nombre``, ``descripcion``,
+    ``precio``, ``cantidad`` e ``imagen`` (ruta relativa en MEDIA).
+    """
+    if not indice_disponible():
+        return _buscar_items_orm(texto, limite)
+
+    match = _expresion_match(texto)
+    tabla_flor = Flor._meta.db_table
+    tabla_producto = Producto._meta.db_table
+    sql = (
+        "SELECT i.tipo_item, i.item_id, "
+        "COALESCE(f.nombre, p.nombre), COALESCE(f.descripcion, p.descripcion), "
+        "COALESCE(f.precio, p.precio), COALESCE(f.cantidad, p.cantidad), COALESCE(f.imagen, p.imagen) "
+        f"FROM {TABLA_INDICE} i "
+        f"LEFT JOIN {tabla_flor} f ON i.tipo_item = 'FLOR' AND f.id = i.item_id "
+        f"LEFT JOIN {tabla_producto} p ON i.tipo_item = 'PRODUCTO' AND p.id = i.item_id "
+    )
+    if match:
+        sql += f"WHERE {TABLA_INDICE} MATCH %s ORDER BY bm25({TABLA_INDICE}, 10.0, 1.0) LIMIT %s"
+        params = [match, limite]
+    else:
+        sql += "ORDER BY i.nombre LIMIT %s"
+        params = [limite]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        filas = cursor.fetchall()
+
+    return [
+        {
+            "tipo_item": tipo_item,
+            "id": item_id,
+            "nombre": nombre,
+            "descripcion": descripcion or "",
+            "precio": precio,
+            "cantidad": cantidad,
+            "imagen": imagen or "",
+        }
+        for tipo_item, item_id, nombre, descripcion, precio, cantidad, imagen in filas
+        if nombre is not None
+    ]
+
+
+def _buscar_items_orm(texto, limite):
+    resultados = []
+    for tipo_item, modelo in _MODELOS.items():
+        for item in modelo.objects.filter(nombre__icontains=texto).order_by("nombre")[:limite]:
+            resultados.append(
+                {
+                    "tipo_item": tipo_item,
+                    "id": item.pk,
+                    "nombre": item.nombre,
+                    "descripcion": item.descripcion or "",
+                    "precio": item.precio,
+                    "cantidad": item.cantidad,
+                    "imagen": item.imagen.name if item.imagen else "",
+                }
+            )
+    return resultados[:limite]
+
+
+def _fila_catalogo(producto):
+    return [producto.pk, producto.nombre, producto.descripcion or "", producto.categoria.nombre, producto.tamano or ""]
+
+
+def indexar_producto_catalogo(producto):
+    """Inserta o reemplaza un ``catalogo.Producto`` en el índice del catálogo."""
+    if not indice_disponible():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT OR REPLACE INTO {TABLA_INDICE_CATALOGO} (rowid, nombre, descripcion, categoria, tamano) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            _fila_catalogo(producto),
+        )
+
+
+def desindexar_producto_catalogo(producto_id):
+    if not indice_disponible():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA_INDICE_CATALOGO} WHERE rowid = %s", [producto_id])
+
+
+def renombrar_categoria_catalogo(categoria):
+    """Actualiza el nombre de ``categoria`` en los productos indexados que la usan."""
+    if not indice_disponible():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {TABLA_INDICE_CATALOGO} SET categoria = %s "
+            "WHERE rowid IN (SELECT id FROM catalogo_producto WHERE categoria_id = %s)",
+            [categoria.nombre, categoria.pk],
+        )
+
+
+def reconstruir_indice_catalogo():
+    """Vacía el índice del catálogo y lo vuelve a llenar. Devuelve los productos indexados."""
+    from catalogo.models import Producto as ProductoCatalogo
+
+    if not indice_disponible():
+        return 0
+    filas = [_fila_catalogo(producto) for producto in ProductoCatalogo.objects.select_related("categoria").iterator()]
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_CREAR_INDICE_CATALOGO)
+        cursor.execute(f"DELETE FROM {TABLA_INDICE_CATALOGO}")
+        cursor.executemany(
+            f"INSERT INTO {TABLA_INDICE_CATALOGO} (rowid, nombre, descripcion, categoria, tamano) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            filas,
+        )
+    return len(filas)
+
+
+def buscar_en_catalogo(productos, texto, limite=RESULTADOS_CATALOGO):
+    """
+    Filtra el queryset de ``catalogo.Producto`` por ``texto`` y lo ordena por relevancia.
+
+    Busca en nombre, descripción, nombre de la categoría y tamaño, y devuelve
+    a lo sumo ``limite`` productos. Sin SQLite cada palabra debe aparecer en
+    alguno de esos campos y el orden es por nombre.
+    """
+    match = _expresion_match(texto)
+    if not match:
+        return productos
+    if not indice_disponible():
+        for token in _TOKEN.findall(texto):
+            productos = productos.filter(
+                Q(nombre__icontains=token)
+                | Q(descripcion__icontains=token)
+                | Q(categoria__nombre__icontains=token)
+                | Q(tamano__icontains=token)
+            )
+        return productos.order_by("nombre")[:limite]
+
+    # Un solo MATCH que ya aplica los filtros del queryset: el índice devuelve
+    # los ids visibles ordenados por bm25 (más negativo = más relevante) y
+    # cortados en ``limite``, así el CASE por id nunca pasa de ese tamaño.
+    sql_productos, params_productos = productos.order_by().values("pk").query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {TABLA_INDICE_CATALOGO} WHERE {TABLA_INDICE_CATALOGO} MATCH %s "
+            f"AND rowid IN ({sql_productos}) "
+            f"ORDER BY bm25({TABLA_INDICE_CATALOGO}, {PESOS_CATALOGO}), rowid LIMIT %s",
+            [match, *params_productos, limite],
+        )
+        ids = [fila[0] for fila in cursor.fetchall()]
+    if not ids:
+        return productos.none()
+    posicion = Case(*[When(pk=pk, then=Value(i)) for i, pk in enumerate(ids)], output_field=IntegerField())
+    return productos.filter(pk__in=ids).annotate(relevancia=posicion).order_by("relevancia")
+
+
+def url_imagen(ruta):
+    return f"{settings.MEDIA_URL}{ruta}" if ruta else ""
@@ -0,0 +1,122 @@
+"""
+Concurrencia optimista para el stock de flores y productos.
+
+Flor y Producto llevan una columna ``version`` que sube en cada escritura.
+``save()`` compara la versión leída (compare-and-swap) y falla con
+``VersionDesactualizada`` si otra operación cambió la fila desde que se leyó.
+``core.stock.ajustar_stock`` no necesita leer antes: su UPDATE ya lleva la
+condición de stock y sube la versión; solo si el UPDATE no alcanza y la
+lectura posterior muestra stock suficiente reintenta, unas pocas veces antes
+de rendirse con ``ContencionStock``. Dentro de una transacción de SQLite el
+candado de escritura es de toda la base y esa carrera no existe: allí la
+contención aparece como "database is locked" y la maneja
+``core.transacciones.escritura()``.
+
+Reintentos y abandonos se cuentan por día en ``ContencionDiaria``, compartida
+por todos los procesos. El contador no puede escribirse dentro de la
+transacción de la operación, que se deshace justamente al abandonar: queda
+pendiente en la conexión y se vuelca al confirmar o, tras un rollback, al
+cerrar ``core.transacciones.escritura()``.
+"""
+
+import logging
+from collections import Counter
+
+from django.db import DatabaseError, connection, models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+MAX_INTENTOS = 3
+EVENTOS_CONTENCION = ("reintentos", "agotados")
+
+
+class VersionDesactualizada(ValueError):
+    """La fila cambió desde que se leyó (p. ej. una venta mientras se editaba el item)."""
+
+    def __init__(self, instancia):
+        super().__init__(
+            f"{instancia} fue modificado por otra operación mientras lo editabas. "
+            "Revisa los datos actuales y vuelve a guardar."
+        )
+
+
+class ContencionStock(ValueError):
+    """El ajuste de stock no pudo aplicarse tras ``MAX_INTENTOS`` por escrituras concurrentes."""
+
+    def __init__(self, nombres):
+        super().__init__(
+            f"El stock de {', '.join(nombres)} está siendo modificado por otras operaciones. "
+            "Intenta nuevamente en unos segundos."
+        )
+
+
+class ModeloVersionado(models.Model):
+    """Modelo abstracto cuyo ``save()`` es un UPDATE condicionado a ``version``."""
+
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    # Sobrescribe el método privado ``Model._do_update`` con la firma de Django 4.2
+    # (requirements.txt fija Django==4.2.27); revisarlo al actualizar Django.
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        leida = self.version
+        campo = self._meta.get_field("version")
+        values = [valor for valor in values if valor[0] is not campo] + [(campo, None, F("version") + 1)]
+        if super()._do_update(base_qs.filter(version=leida), using, pk_val, values, update_fields, forced_update):
+            self.version = leida + 1
+            return True
+        if base_qs.filter(pk=pk_val).exists():
+            raise VersionDesactualizada(self)
+        return False
+
+
+def _pendientes(conexion):
+    if not hasattr(conexion, "_contencion_pendiente"):
+        conexion._contencion_pendiente = Counter()
+    return conexion._contencion_pendiente
+
+
+def volcar_contencion(conexion=None):
+    """Suma a ``ContencionDiaria`` los contadores pendientes de ``conexion``."""
+    from .models import ContencionDiaria
+
+    conexion = conexion or connection
+    pendientes = _pendientes(conexion)
+    if not pendientes:
+        return
+    eventos = dict(pendientes)
+    pendientes.clear()
+    try:
+        for (fecha, evento), cantidad in eventos.items():
+            contador, creado = ContencionDiaria.objects.get_or_create(
+                fecha=fecha, evento=evento, defaults={"cantidad": cantidad}
+            )
+            if not creado:
+                ContencionDiaria.objects.filter(pk=contador.pk).update(cantidad=F("cantidad") + cantidad)
+    except DatabaseError:
+        # Es una métrica: perderla no debe tapar el resultado de la operación.
+        logger.warning("No se pudieron guardar los contadores de contención: %s", eventos, exc_info=True)
+
+
+def registrar_contencion(evento, cantidad=1):
+    """Suma ``cantidad`` al contador diario ``evento`` (``reintentos`` o ``agotados``)."""
+    _pendientes(connection)[(timezone.localdate(), evento)] += cantidad
+    if evento == "agotados":
+        logger.warning("Ajuste de stock abandonado por contención.")
+    if connection.in_atomic_block:
+        transaction.on_commit(volcar_contencion)
+    else:
+        volcar_contencion()
+
+
+def contadores_contencion(fecha=None):
+    from .models import ContencionDiaria
+
+    fecha = fecha or timezone.localdate()
+    guardados = dict(ContencionDiaria.objects.filter(fecha=fecha).values_list("evento", "cantidad"))
+    return {evento: guardados.get(evento, 0) for evento in EVENTOS_CONTENCION}
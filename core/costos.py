@@ -0,0 +1,85 @@
+"""
+Costo promedio ponderado de los items, alimentado por las compras.
+
+Cada entrada de mercancía ``(cantidad, importe)`` mueve el costo del item a
+
+    (stock * costo_promedio + importe) / (stock + cantidad)
+
+con el stock previo a la entrada, por eso debe aplicarse antes de
+``ajustar_stock``. Las entradas negativas (líneas de compra editadas o
+eliminadas) deshacen el aporte con la misma fórmula. Las ventas no mueven el
+promedio: solo copian el costo vigente en ``DetalleVenta.costo_unitario``.
+"""
+
+from decimal import Decimal
+
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from core.stock import MODELOS_ITEM
+
+
+def agrupar_entradas(detalles, signo=1):
+    """Suma ``(cantidad, cantidad * precio)`` de los detalles por ``(tipo_item, item_pk)``."""
+    entradas = {}
+    for data in detalles:
+        clave = (data["tipo_item"], data["item_pk"])
+        cantidad, importe = entradas.get(clave, (0, Decimal("0")))
+        entradas[clave] = (
+            cantidad + signo * data["cantidad"],
+            importe + signo * data["cantidad"] * data["precio"],
+        )
+    return entradas
+
+
+def registrar_entradas(entradas):
+    """
+    Aplica ``{(tipo_item, item_pk): (cantidad, importe)}`` al costo promedio.
+
+    El promedio se calcula en ``Decimal`` con los valores leídos (bloqueados
+    hasta el fin de la transacción) y se escribe con un UPDATE por tipo que
+    también sube ``version``, así un formulario del item abierto antes no pisa
+    el costo. Si la entrada deja el stock en cero o menos (se deshace una
+    compra ya vendida) el costo no cambia.
+    """
+    for tipo_item, modelo in MODELOS_ITEM.items():
+        por_pk = {
+            pk: (cantidad, importe)
+            for (tipo, pk), (cantidad, importe) in entradas.items()
+            if tipo == tipo_item and pk and (cantidad or importe)
+        }
+        if not por_pk:
+            continue
+        campo = modelo._meta.get_field("costo_promedio")
+        exponente = Decimal(1).scaleb(-campo.decimal_places)
+        actuales = (
+            modelo.objects.select_for_update()
+            .filter(pk__in=sorted(por_pk))
+            .values_list("pk", "cantidad", "costo_promedio")
+        )
+        nuevos = {}
+        for pk, stock, costo in actuales:
+            cantidad, importe = por_pk[pk]
+            if stock + cantidad <= 0:
+                continue
+            promedio = (stock * costo + Decimal(importe)) / (stock + cantidad)
+            nuevos[pk] = max(promedio, Decimal("0")).quantize(exponente)
+        if not nuevos:
+            continue
+        modelo.objects.filter(pk__in=sorted(nuevos)).update(
+            costo_promedio=Case(
+                *[When(pk=pk, then=Value(costo)) for pk, costo in nuevos.items()],
+                default=F("costo_promedio"),
+                output_field=campo,
+            ),
+            version=F("version") + 1,
+            updated_at=timezone.now(),
+        )
+
+
+def margen(ingresos, costo):
+    """Margen bruto y su porcentaje sobre los ingresos."""
+    ingresos = ingresos or Decimal("0")
+    bruto = ingresos - (costo or Decimal("0"))
+    porcentaje = (bruto * 100 / ingresos).quantize(Decimal("0.1")) if ingresos else Decimal("0")
+    return bruto, porcentaje
@@ -0,0 +1,109 @@
+"""
+Conciliación de las líneas (detalles) de ventas y compras al editarlas.
+
+Compara las líneas enviadas en el formulario con las guardadas usando la
+clave ``(tipo_item, item_pk)`` y solo escribe lo que cambió.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+
+def _clave_detalle(detalle):
+    item_pk = detalle.flor_id if detalle.tipo_item == "FLOR" else detalle.producto_id
+    return detalle.tipo_item, item_pk
+
+
+def conciliar_detalles(padre, nuevos_detalles):
+    """
+    Sincroniza ``padre.detalles`` con ``nuevos_detalles`` y devuelve el cambio neto por item.
+
+    ``nuevos_detalles`` usa el formato de los parsers de los formularios
+    (``tipo_item``, ``item_pk``, ``cantidad``, ``precio``). Las líneas de un
+    mismo item se emparejan en orden; las que sobran se insertan o eliminan y
+    las emparejadas solo se actualizan si cambió la cantidad o el precio.
+
+    Los importes de la línea (``CAMPOS_IMPORTE`` del modelo de detalle, por
+    defecto solo ``subtotal``) se suman al padre con
+    ``padre.sumar_a_totales(*diferencias)`` y, si el padre define
+    ``sumar_a_lineas``, se le pasa el cambio ``(cantidad, *importes)`` por
+    item. El resultado es ``{(tipo_item, item_pk): cantidad_nueva - cantidad_anterior}``
+    sin las claves que no cambiaron.
+    """
+    manager = padre.detalles
+    modelo = manager.model
+    campo_padre = manager.field.name
+    campos_importe = getattr(modelo, "CAMPOS_IMPORTE", ("subtotal",))
+
+    def _importes(detalle):
+        return [getattr(detalle, campo) for campo in campos_importe]
+
+    def _sumar(clave, valores, signo=1):
+        acumulado = importes[clave]
+        for posicion, valor in enumerate(valores):
+            acumulado[posicion] += signo * valor
+
+    guardados = defaultdict(list)
+    for detalle in manager.order_by("pk"):
+        guardados[_clave_detalle(detalle)].append(detalle)
+
+    enviados = defaultdict(list)
+    for data in nuevos_detalles:
+        enviados[(data["tipo_item"], data["item_pk"])].append(data)
+
+    crear, actualizar, eliminar = [], [], []
+    deltas = defaultdict(int)
+    importes = defaultdict(lambda: [Decimal("0")] * len(campos_importe))
+
+    for clave in set(guardados) | set(enviados):
+        anteriores = guardados.get(clave, [])
+        nuevos = enviados.get(clave, [])
+
+        for detalle, data in zip(anteriores, nuevos):
+            deltas[clave] += data["cantidad"] - detalle.cantidad
+            if detalle.cantidad != data["cantidad"] or detalle.precio != data["precio"]:
+                _sumar(clave, _importes(detalle), -1)
+                detalle.cantidad = data["cantidad"]
+                detalle.precio = data["precio"]
+                actualizar.append(detalle.preparar())
+                _sumar(clave, _importes(detalle))
+
+        for detalle in anteriores[len(nuevos):]:
+            deltas[clave] -= detalle.cantidad
+            _sumar(clave, _importes(detalle), -1)
+            eliminar.append(detalle.pk)
+
+        for data in nuevos[len(anteriores):]:
+            deltas[clave] += data["cantidad"]
+            detalle = modelo(
+                tipo_item=data["tipo_item"],
+                cantidad=data["cantidad"],
+                precio=data["precio"],
+                **{campo_padre: padre},
+            )
+            campo_item = "flor" if data["tipo_item"] == "FLOR" else "producto"
+            if data.get("item") is not None:
+                # Instancia ya cargada por el parser: preparar() no vuelve a consultarla.
+                setattr(detalle, campo_item, data["item"])
+            else:
+                setattr(detalle, f"{campo_item}_id", data["item_pk"])
+            crear.append(detalle.preparar())
+            _sumar(clave, _importes(detalle))
+
+    if eliminar:
+        modelo.objects.filter(pk__in=eliminar).delete()
+    if actualizar:
+        modelo.objects.bulk_update(actualizar, ["cantidad", "precio", *campos_importe])
+    if crear:
+        modelo.objects.bulk_create(crear)
+    diferencias = [sum(columna, Decimal("0")) for columna in zip(*importes.values())]
+    if any(diferencias):
+        padre.sumar_a_totales(*diferencias)
+    if hasattr(padre, "sumar_a_lineas"):
+        cambios = {
+            clave: (deltas.get(clave, 0), *importes.get(clave, [Decimal("0")] * len(campos_importe)))
+            for clave in set(deltas) | set(importes)
+        }
+        padre.sumar_a_lineas({clave: cambio for clave, cambio in cambios.items() if any(cambio)})
+
+    return {clave: delta for clave, delta in deltas.items() if delta}
@@ -0,0 +1,158 @@
+"""
+Exportación en streaming (CSV y XLSX) para los listados del panel.
+
+Las filas llegan como un generador y se escriben a medida que se envían, así
+la memoria usada no depende del rango exportado. El XLSX se arma con
+``zipfile`` de la librería estándar escribiendo la hoja fila a fila.
+"""
+
+import csv
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+
+
+TIPO_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+FILAS_POR_BLOQUE = 500
+
+
+class _Buffer:
+    """Destino de escritura que entrega lo escrito en cada ``vaciar()``."""
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+
+class _Eco:
+    """Pseudo-archivo para ``csv.writer`` que devuelve la línea escrita."""
+
+    def write(self, valor):
+        return valor
+
+
+def _texto(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return str(valor)
+
+
+def respuesta_csv(nombre, encabezados, filas):
+    escritor = csv.writer(_Eco())
+
+    def _generar():
+        # BOM para que Excel reconozca UTF-8 (tildes, ñ).
+        yield "\ufeff" + escritor.writerow(encabezados)
+        for fila in filas:
+            yield escritor.writerow([_texto(valor) for valor in fila])
+
+    respuesta = StreamingHttpResponse(_generar(), content_type="text/csv; charset=utf-8")
+    respuesta["Content-Disposition"] = f'attachment; filename="{nombre}.csv"'
+    return respuesta
+
+
+def _columna(indice):
+    letras = ""
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _celda(fila, columna, valor):
+    ref = f"{_columna(columna)}{fila}"
+    if isinstance(valor, (int, float, Decimal)) and not isinstance(valor, bool):
+        return f'<c r="{ref}"><v>{valor}</v></c>'
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{escape(_texto(valor))}</t></is></c>'
+
+
+def _fila_xml(numero, valores):
+    celdas = "".join(_celda(numero, columna, valor) for columna, valor in enumerate(valores))
+    return f'<row r="{numero}">{celdas}</row>'
+
+
+_PARTES_FIJAS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        "</Types>"
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="{hoja}" sheetId="1" r:id="rId1"/></sheets>'
+        "</workbook>"
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        "</Relationships>"
+    ),
+}
+
+
+def _generar_xlsx(hoja, encabezados, filas):
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archivo:
+        for nombre, contenido in _PARTES_FIJAS.items():
+            archivo.writestr(nombre, contenido.replace("{hoja}", escape(hoja)))
+        yield buffer.vaciar()
+
+        with archivo.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as hoja_xml:
+            hoja_xml.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            hoja_xml.write(_fila_xml(1, encabezados).encode())
+            for numero, fila in enumerate(filas, start=2):
+                hoja_xml.write(_fila_xml(numero, fila).encode())
+                if numero % FILAS_POR_BLOQUE == 0:
+                    yield buffer.vaciar()
+            hoja_xml.write(b"</sheetData></worksheet>")
+    yield buffer.vaciar()
+
+
+def respuesta_xlsx(nombre, encabezados, filas, hoja="Datos"):
+    respuesta = StreamingHttpResponse(_generar_xlsx(hoja, encabezados, filas), content_type=TIPO_XLSX)
+    respuesta["Content-Disposition"] = f'attachment; filename="{nombre}.xlsx"'
+    return respuesta
@@ -0,0 +1,181 @@
+"""
+Conteos por faceta para el listado de gestión del catálogo.
+
+Con los filtros vigentes, el panel lateral muestra cuántos productos quedarían
+con cada categoría, tamaño, estado y rango de precio. Cada faceta se cuenta con
+los demás filtros aplicados pero no con el suyo, así cada opción indica cuántos
+resultados habría al elegirla. Todo sale de dos consultas agrupadas: una por
+``(categoria, LOWER(tamano), activo)`` que también da los totales generales y una por
+rango de precio.
+
+El resultado se guarda en la caché por firma de filtros. La clave incluye las
+versiones de las tablas (``core.versiones``), así que cualquier cambio en el
+catálogo la deja sin uso; fuera de SQLite solo vence por tiempo.
+"""
+
+import hashlib
+from collections import Counter, namedtuple
+
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Max, Min, Q, Value, When
+from django.db.models.functions import Lower
+
+from catalogo.models import Producto
+
+from .versiones import estado_tablas
+
+
+# Límites de los rangos de precio; cada rango incluye su mínimo y excluye su máximo.
+LIMITES_PRECIO = (50000, 100000, 200000)
+DURACION_FACETAS = 3600
+DURACION_SIN_VERSIONES = 60
+MODELOS_FACETAS = ("catalogo.Producto", "categoria.Categoria")
+
+FiltrosCatalogo = namedtuple("FiltrosCatalogo", "texto categoria_id estado tamano precio_min precio_max")
+RangoPrecio = namedtuple("RangoPrecio", "etiqueta minimo maximo productos")
+Facetas = namedtuple(
+    "Facetas",
+    "resultados categorias tamanos estados precios total activos inactivos total_categorias",
+)
+
+
+def _q_texto(texto):
+    return (
+        Q(nombre__icontains=texto)
+        | Q(descripcion__icontains=texto)
+        | Q(categoria__nombre__icontains=texto)
+        | Q(tamano__icontains=texto)
+    )
+
+
+def condicion_filtros(filtros, excepto=()):
+    """``Q`` con los filtros del listado, salvo las facetas nombradas en ``excepto``."""
+    condicion = Q()
+    if filtros.texto:
+        condicion &= _q_texto(filtros.texto)
+    if filtros.categoria_id is not None and "categoria" not in excepto:
+        condicion &= Q(categoria_id=filtros.categoria_id)
+    if filtros.estado in ("activo", "inactivo") and "estado" not in excepto:
+        condicion &= Q(activo=filtros.estado == "activo")
+    if filtros.tamano and "tamano" not in excepto:
+        condicion &= Q(tamano__iexact=filtros.tamano)
+    if "precio" not in excepto:
+        if filtros.precio_min is not None:
+            condicion &= Q(precio__gte=filtros.precio_min)
+        if filtros.precio_max is not None:
+            condicion &= Q(precio__lte=filtros.precio_max)
+    return condicion
+
+
+def _pesos(valor):
+    return f"${valor:,}".replace(",", ".")
+
+
+def _rangos_precio():
+    bordes = (None, *LIMITES_PRECIO, None)
+    for minimo, maximo in zip(bordes, bordes[1:]):
+        if minimo is None:
+            etiqueta = f"Menos de {_pesos(maximo)}"
+        elif maximo is None:
+            etiqueta = f"Desde {_pesos(minimo)}"
+        else:
+            etiqueta = f"{_pesos(minimo)} a {_pesos(maximo)}"
+        yield etiqueta, minimo, maximo
+
+
+def _q_rango(minimo, maximo):
+    condicion = Q()
+    if minimo is not None:
+        condicion &= Q(precio__gte=minimo)
+    if maximo is not None:
+        condicion &= Q(precio__lt=maximo)
+    return condicion
+
+
+def _calcular(filtros):
+    # Texto y precio se evalúan en SQL como conteo condicional; así la misma
+    # consulta sirve para los totales generales, que no llevan filtros. El
+    # tamaño se agrupa con LOWER() y se compara con el mismo ``iexact`` del
+    # listado: en SQLite ambos ignoran mayúsculas solo en ASCII, y así los
+    # conteos coinciden siempre con las filas que muestra el listado.
+    coinciden = condicion_filtros(filtros, excepto=("categoria", "estado", "tamano"))
+    en_tamano = Value(1)
+    if filtros.tamano:
+        en_tamano = Case(When(tamano__iexact=filtros.tamano, then=Value(1)), default=Value(0))
+    grupos = (
+        Producto.objects.annotate(tamano_normalizado=Lower("tamano"))
+        .values("categoria_id", "tamano_normalizado", "activo")
+        .annotate(
+            total=Count("id"),
+            coinciden=Count("id", filter=coinciden),
+            etiqueta=Min("tamano"),
+            en_tamano=Max(en_tamano, output_field=IntegerField()),
+        )
+        .order_by()
+    )
+
+    categorias, tamanos, estados = Counter(), Counter(), Counter()
+    etiquetas = {}
+    resultados = total = activos = 0
+    categorias_con_productos = set()
+    for grupo in grupos:
+        total += grupo["total"]
+        activos += grupo["total"] if grupo["activo"] else 0
+        categorias_con_productos.add(grupo["categoria_id"])
+        tamano = grupo["tamano_normalizado"]
+        if tamano:
+            # Las variantes que solo difieren en mayúsculas se muestran con una sola etiqueta.
+            etiquetas[tamano] = min(etiquetas.get(tamano, grupo["etiqueta"]), grupo["etiqueta"])
+            tamanos.setdefault(tamano, 0)
+
+        cuenta = grupo["coinciden"]
+        if not cuenta:
+            continue
+        en_categoria = filtros.categoria_id is None or grupo["categoria_id"] == filtros.categoria_id
+        en_estado = filtros.estado not in ("activo", "inactivo") or grupo["activo"] == (filtros.estado == "activo")
+        en_tamano = bool(grupo["en_tamano"])
+        if en_estado and en_tamano:
+            categorias[grupo["categoria_id"]] += cuenta
+        if en_categoria and en_estado and tamano:
+            tamanos[tamano] += cuenta
+        if en_categoria and en_tamano:
+            estados["activo" if grupo["activo"] else "inactivo"] += cuenta
+        if en_categoria and en_estado and en_tamano:
+            resultados += cuenta
+
+    rangos = list(_rangos_precio())
+    conteos = Producto.objects.filter(condicion_filtros(filtros, excepto=("precio",))).aggregate(
+        **{f"rango_{i}": Count("id", filter=_q_rango(minimo, maximo)) for i, (_, minimo, maximo) in enumerate(rangos)}
+    )
+    precios = [
+        RangoPrecio(etiqueta, minimo, maximo, conteos[f"rango_{i}"])
+        for i, (etiqueta, minimo, maximo) in enumerate(rangos)
+    ]
+
+    return Facetas(
+        resultados=resultados,
+        categorias=dict(categorias),
+        tamanos={etiquetas[tamano]: tamanos[tamano] for tamano in sorted(tamanos, key=etiquetas.get)},
+        estados={"activo": estados["activo"], "inactivo": estados["inactivo"]},
+        precios=precios,
+        total=total,
+        activos=activos,
+        inactivos=total - activos,
+        total_categorias=len(categorias_con_productos),
+    )
+
+
+def _clave(filtros, firma):
+    crudo = "\x00".join([firma or "", *(str(valor) for valor in filtros)])
+    return f"facetas:catalogo:{hashlib.sha1(crudo.encode()).hexdigest()}"
+
+
+def facetas_catalogo(filtros, request=None):
+    """``Facetas`` del catálogo para ``filtros``, desde la caché si ya se calcularon."""
+    estado = estado_tablas(MODELOS_FACETAS, request)
+    clave = _clave(filtros, estado.firma if estado else None)
+    facetas = cache.get(clave)
+    if facetas is None:
+        facetas = _calcular(filtros)
+        cache.set(clave, facetas, timeout=DURACION_FACETAS if estado else DURACION_SIN_VERSIONES)
+    return facetas
@@ -0,0 +1,67 @@
+"""
+Claves de idempotencia para formularios que crean registros (p. ej. ventas).
+
+El formulario lleva una clave única generada al mostrarlo. Al procesarlo la
+clave se inserta en la misma transacción que la operación; si ya existía, la
+restricción única lo detecta y se responde con el resultado original sin
+repetir la operación (ni el ajuste de stock).
+"""
+
+import re
+import uuid
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import ClaveIdempotencia
+
+
+VIGENCIA = timedelta(hours=24)
+
+_CLAVE_VALIDA = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+
+class SolicitudRepetida(Exception):
+    """La clave ya fue usada; ``resultado_id`` es el id creado por la primera solicitud."""
+
+    def __init__(self, resultado_id):
+        self.resultado_id = resultado_id
+        super().__init__("La solicitud ya fue procesada.")
+
+
+def nueva_clave():
+    return uuid.uuid4().hex
+
+
+def normalizar_clave(valor):
+    """Devuelve la clave recibida o ``None`` si falta o no tiene un formato válido."""
+    valor = (valor or "").strip()
+    return valor if _CLAVE_VALIDA.match(valor) else None
+
+
+def registrar_clave(ambito, clave):
+    """
+    Inserta la clave dentro de la transacción en curso y devuelve el registro.
+
+    Si la clave ya existe lanza ``SolicitudRepetida``; quien llama debe dejar
+    que la excepción salga del ``atomic`` para deshacer lo que haya hecho.
+    """
+    try:
+        with transaction.atomic():
+            return ClaveIdempotencia.objects.create(ambito=ambito, clave=clave)
+    except IntegrityError:
+        previo = ClaveIdempotencia.objects.filter(ambito=ambito, clave=clave).values_list("resultado_id", flat=True)
+        raise SolicitudRepetida(previo.first())
+
+
+def completar_clave(registro, resultado_id):
+    registro.resultado_id = resultado_id
+    registro.save(update_fields=["resultado_id"])
+
+
+def purgar_claves(vigencia=VIGENCIA, ahora=None):
+    """Elimina las claves más antiguas que ``vigencia``. Devuelve cuántas se borraron."""
+    limite = (ahora or timezone.now()) - vigencia
+    borradas, _ = ClaveIdempotencia.objects.filter(created_at__lt=limite).delete()
+    return borradas
@@ -0,0 +1,65 @@
+"""
+Indicadores de cabecera de los listados del panel (ventas, compras).
+
+Con filtros, todos los indicadores se calculan con una sola consulta de
+agregación condicional sobre el queryset ya filtrado. Sin filtros salen del
+resumen diario de la tabla (``core.resumenes``), que tiene unas pocas filas
+por día.
+"""
+
+from collections import namedtuple
+from datetime import date
+
+from django.db.models import Count, Q, Sum
+
+
+ResumenKpis = namedtuple("ResumenKpis", ["total", "monto_total", "relacionados", "del_mes"])
+
+
+def resumir_kpis(queryset, campo_monto, campo_relacion, campo_fecha, hoy=None):
+    """
+    Devuelve un ``ResumenKpis`` del queryset en una sola consulta.
+
+    - ``total``: número de registros.
+    - ``monto_total``: suma de ``campo_monto`` (0 si no hay registros).
+    - ``relacionados``: valores distintos de ``campo_relacion`` (clientes, proveedores).
+    - ``del_mes``: registros con ``campo_fecha`` entre el inicio del mes y hoy.
+    """
+    hoy = hoy or date.today()
+    del_mes = Q(**{f"{campo_fecha}__gte": hoy.replace(day=1), f"{campo_fecha}__lte": hoy})
+
+    # Alias con prefijo para no chocar con campos del modelo (p. ej. Venta.total).
+    datos = queryset.order_by().aggregate(
+        kpi_total=Count("pk"),
+        kpi_monto_total=Sum(campo_monto),
+        kpi_relacionados=Count(campo_relacion, distinct=True),
+        kpi_del_mes=Count("pk", filter=del_mes),
+    )
+    return ResumenKpis(
+        total=datos["kpi_total"],
+        monto_total=datos["kpi_monto_total"] or 0,
+        relacionados=datos["kpi_relacionados"],
+        del_mes=datos["kpi_del_mes"],
+    )
+
+
+def resumir_kpis_sin_filtros(resumen, campo_conteo, campo_monto, relacionados, hoy=None):
+    """
+    Devuelve el ``ResumenKpis`` de toda la tabla desde su modelo de ``resumen`` diario.
+
+    ``relacionados`` es el queryset de los clientes o proveedores con algún
+    registro; se cuenta aparte porque el resumen no los distingue.
+    """
+    hoy = hoy or date.today()
+    del_mes = Q(fecha__gte=hoy.replace(day=1), fecha__lte=hoy)
+    datos = resumen.objects.aggregate(
+        kpi_total=Sum(campo_conteo),
+        kpi_monto_total=Sum(campo_monto),
+        kpi_del_mes=Sum(campo_conteo, filter=del_mes),
+    )
+    return ResumenKpis(
+        total=datos["kpi_total"] or 0,
+        monto_total=datos["kpi_monto_total"] or 0,
+        relacionados=relacionados.count(),
+        del_mes=datos["kpi_del_mes"] or 0,
+    )
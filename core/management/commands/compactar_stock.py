@@ -0,0 +1,35 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.movimientos import compactar, ultima_compactacion
+
+
+class Command(BaseCommand):
+    help = (
+        "Compacta el libro de movimientos de stock en fotos diarias (StockDiario) para los días "
+        "cerrados aún no compactados, de modo que las consultas de stock a una fecha lean una foto "
+        "y pocos movimientos. Pensado para ejecutarse una vez al día (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hasta",
+            help="Último día a compactar (AAAA-MM-DD). Por defecto, ayer.",
+        )
+
+    def handle(self, *args, **options):
+        hasta = None
+        if options["hasta"]:
+            try:
+                hasta = date.fromisoformat(options["hasta"])
+            except ValueError:
+                raise CommandError("--hasta debe tener el formato AAAA-MM-DD.")
+            if hasta >= timezone.localdate():
+                raise CommandError("--hasta debe ser anterior a hoy: solo se compactan días cerrados.")
+
+        filas = compactar(hasta)
+        self.stdout.write(self.style.SUCCESS(
+            f"Fotos de stock creadas: {filas}. Última compactación: {ultima_compactacion() or '-'}."
+        ))
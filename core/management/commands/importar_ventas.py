@@ -0,0 +1,459 @@
+import csv
+import json
+import os
+import re
+import time
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import chain
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from clientes.models import Cliente
+from core.movimientos import registrar_movimientos
+from core.resumenes import acumular_aportes
+from core.stock import MODELOS_ITEM, StockInsuficiente, ajustar_stock
+from core.transacciones import escritura
+from ventas.models import (
+    FORMA_PAGO_CHOICES,
+    TIPO_VENTA_CHOICES,
+    DetalleVenta,
+    ResumenDiarioVenta,
+    Venta,
+    registrar_lineas_vendidas,
+)
+
+
+# Una venta leída del archivo: ``datos`` son los campos de cabecera, ``lineas``
+# los items y ``originales`` lo que se escribe tal cual en el archivo de rechazos.
+Registro = namedtuple("Registro", ["linea", "datos", "lineas", "originales"])
+
+_ID_ITEM = re.compile(r"^([FP])-(\d+)$", re.IGNORECASE)
+_VERDADEROS = {"1", "si", "sí", "true", "x", "s", "yes"}
+
+
+def _opciones(choices):
+    mapa = {}
+    for codigo, etiqueta in choices:
+        mapa[codigo.lower()] = codigo
+        mapa[etiqueta.lower()] = codigo
+    return mapa
+
+
+TIPOS_VENTA = _opciones(TIPO_VENTA_CHOICES)
+FORMAS_PAGO = _opciones(FORMA_PAGO_CHOICES)
+
+
+def _texto(valor):
+    return "" if valor is None else str(valor).strip()
+
+
+def _fecha(valor):
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y"):
+        try:
+            return datetime.strptime(valor, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Fecha inválida: '{valor}'.")
+
+
+def _decimal(valor, campo, defecto=None):
+    valor = _texto(valor)
+    if not valor:
+        return defecto
+    if "," in valor:
+        valor = valor.replace(".", "").replace(",", ".")
+    try:
+        numero = Decimal(valor)
+    except InvalidOperation:
+        raise ValueError(f"Formato inválido en {campo}: '{valor}'.")
+    if numero < 0:
+        raise ValueError(f"{campo} no puede ser negativo.")
+    return numero
+
+
+def _referencia_item(valor):
+    """``F-12``/``P-3`` se resuelven por id; cualquier otro texto, por nombre."""
+    coincidencia = _ID_ITEM.match(valor)
+    if coincidencia:
+        tipo = "FLOR" if coincidencia.group(1).upper() == "F" else "PRODUCTO"
+        return tipo, int(coincidencia.group(2))
+    # casefold y no lower(): "ÑANDÚ" y "ñandú" deben coincidir igual que "ROSA" y "rosa".
+    return None, valor.casefold()
+
+
+def _leer_csv(archivo):
+    actual = None
+    for numero, fila in enumerate(csv.DictReader(archivo), start=2):
+        fila = {_texto(clave): _texto(valor) for clave, valor in fila.items() if clave}
+        referencia = fila.get("referencia", "")
+        # Las filas consecutivas con la misma referencia son líneas de una misma venta.
+        if actual and referencia and referencia == actual.datos.get("referencia"):
+            actual.lineas.append(fila)
+            actual.originales.append(fila)
+            continue
+        if actual:
+            yield actual
+        actual = Registro(numero, fila, [fila], [fila])
+    if actual:
+        yield actual
+
+
+def _leer_ndjson(archivo):
+    for numero, texto in enumerate(archivo, start=1):
+        if not texto.strip():
+            continue
+        try:
+            objeto = json.loads(texto)
+        except ValueError:
+            yield Registro(numero, None, [], [{"original": texto.rstrip("\n")}])
+            continue
+        if not isinstance(objeto, dict):
+            yield Registro(numero, None, [], [{"original": objeto}])
+            continue
+        lineas = objeto.get("items") if isinstance(objeto.get("items"), list) else [objeto]
+        yield Registro(numero, objeto, lineas, [objeto])
+
+
+class _Rechazos:
+    """Archivo de rechazos en el mismo formato que la entrada; se crea con el primer rechazo."""
+
+    def __init__(self, ruta, formato):
+        self.ruta = ruta
+        self.formato = formato
+        self.total = 0
+        self._archivo = None
+        self._escritor = None
+
+    def agregar(self, registro, error):
+        self.total += 1
+        if self._archivo is None:
+            self._archivo = open(self.ruta, "w", encoding="utf-8", newline="")
+        if self.formato == "ndjson":
+            for original in registro.originales:
+                fila = {"_linea": registro.linea, "_error": error, **original}
+                self._archivo.write(json.dumps(fila, ensure_ascii=False, default=str) + "\n")
+            return
+        for original in registro.originales:
+            if self._escritor is None:
+                self._escritor = csv.DictWriter(
+                    self._archivo, fieldnames=["linea", "error", *original], extrasaction="ignore"
+                )
+                self._escritor.writeheader()
+            self._escritor.writerow({"linea": registro.linea, "error": error, **original})
+
+    def cerrar(self):
+        if self._archivo is not None:
+            self._archivo.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa ventas desde un archivo CSV (una fila por línea de venta, agrupadas por "
+        "'referencia') o NDJSON (una venta por línea con lista 'items'). Clientes e items se "
+        "resuelven con una consulta por lote, las ventas y detalles se crean con bulk_create y el "
+        "stock se descuenta con un ajuste agregado por lote. Las ventas con errores se escriben "
+        "en un archivo de rechazos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo", help="Ruta del archivo .csv o .ndjson/.jsonl.")
+        parser.add_argument(
+            "--formato",
+            choices=["csv", "ndjson"],
+            help="Formato del archivo (por defecto se deduce de la extensión).",
+        )
+        parser.add_argument(
+            "--rechazos",
+            help="Archivo donde se escriben las ventas rechazadas (por defecto <archivo>.rechazos.<ext>).",
+        )
+        parser.add_argument("--lote", type=int, default=1000, help="Ventas por lote (por defecto 1000).")
+        parser.add_argument(
+            "--simular",
+            action="store_true",
+            help="Valida y reporta sin guardar ventas ni tocar el stock.",
+        )
+
+    def handle(self, *args, **options):
+        ruta = options["archivo"]
+        if not os.path.exists(ruta):
+            raise CommandError(f"No existe el archivo {ruta}.")
+
+        base, extension = os.path.splitext(ruta)
+        formato = options["formato"] or ("csv" if extension.lower() == ".csv" else "ndjson")
+        lote = max(options["lote"], 1)
+        self.simular = options["simular"]
+        self.rechazos = _Rechazos(
+            options["rechazos"] or f"{base}.rechazos{extension or '.' + formato}",
+            formato,
+        )
+        self.importadas = 0
+        self._por_nombre = None
+
+        inicio = time.monotonic()
+        lector = _leer_csv if formato == "csv" else _leer_ndjson
+        try:
+            with open(ruta, encoding="utf-8-sig", newline="") as archivo:
+                pendientes = []
+                for registro in lector(archivo):
+                    pendientes.append(registro)
+                    if len(pendientes) >= lote:
+                        self._procesar_lote(pendientes)
+                        pendientes = []
+                if pendientes:
+                    self._procesar_lote(pendientes)
+        finally:
+            self.rechazos.cerrar()
+
+        duracion = max(time.monotonic() - inicio, 1e-6)
+        accion = "validadas" if self.simular else "importadas"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Ventas {accion}: {self.importadas} ({self.importadas / duracion:.0f} por segundo)."
+            )
+        )
+        if self.rechazos.total:
+            self.stdout.write(
+                self.style.WARNING(f"Ventas rechazadas: {self.rechazos.total} (ver {self.rechazos.ruta}).")
+            )
+
+    def _procesar_lote(self, registros):
+        validas = []
+        for registro in registros:
+            try:
+                validas.append((registro, self._validar(registro)))
+            except ValueError as exc:
+                self.rechazos.agregar(registro, str(exc))
+
+        if not validas:
+            return
+
+        clientes, items, por_nombre = self._buscar_referencias(validas)
+        disponible = {clave: datos["cantidad"] for clave, datos in items.items()}
+        deltas = {}
+        ventas, detalles, aceptados = [], [], []
+
+        for registro, (datos, lineas) in validas:
+            try:
+                venta, nuevos, requeridos = self._armar_venta(datos, lineas, clientes, items, por_nombre)
+                for clave, cantidad in requeridos.items():
+                    if disponible[clave] < cantidad:
+                        raise ValueError(
+                            f"Stock insuficiente para {items[clave]['nombre']}. "
+                            f"Disponible: {disponible[clave]}, solicitado: {cantidad}."
+                        )
+            except ValueError as exc:
+                self.rechazos.agregar(registro, str(exc))
+                continue
+
+            for clave, cantidad in requeridos.items():
+                disponible[clave] -= cantidad
+                deltas[clave] = deltas.get(clave, 0) - cantidad
+            ventas.append(venta)
+            detalles.extend(nuevos)
+            aceptados.append((registro, requeridos))
+
+        if not ventas:
+            return
+
+        try:
+            with escritura():
+                ajustar_stock(deltas)
+                Venta.objects.bulk_create(ventas)
+                DetalleVenta.objects.bulk_create(detalles)
+                # bulk_create no pasa por save(): resumen diario y más vendidos se suman aparte.
+                acumular_aportes(ResumenDiarioVenta, (venta.aporte_resumen() for venta in ventas))
+                registrar_lineas_vendidas(detalle.linea_vendida() for detalle in detalles)
+                registrar_movimientos(
+                    (detalle.clave_item(), -detalle.cantidad, "VENTA", detalle.venta.pk) for detalle in detalles
+                )
+                if self.simular:
+                    transaction.set_rollback(True)
+        except StockInsuficiente as exc:
+            # El stock cambió entre la lectura y el ajuste: se rechazan las ventas que
+            # usan los items faltantes y el resto del lote se procesa de nuevo.
+            self._procesar_lote(self._rechazar_faltantes(aceptados, exc.resultados))
+            return
+
+        self.importadas += len(ventas)
+
+    def _rechazar_faltantes(self, aceptados, resultados):
+        """Rechaza las ventas que piden items sin stock suficiente; devuelve los demás registros."""
+        faltantes = {clave: r for clave, r in resultados.items() if not r.suficiente}
+        restantes = []
+        for registro, requeridos in aceptados:
+            clave = next((clave for clave in requeridos if clave in faltantes), None)
+            if clave is None:
+                restantes.append(registro)
+                continue
+            resultado = faltantes[clave]
+            if resultado.disponible is None:
+                error = f"El item {clave[0][0]}-{clave[1]} ya no existe."
+            else:
+                error = (
+                    f"Stock insuficiente para {resultado.nombre} al guardar el lote. "
+                    f"Disponible: {resultado.disponible}, solicitado: {requeridos[clave]}."
+                )
+            self.rechazos.agregar(registro, error)
+        return restantes
+
+    def _validar(self, registro):
+        """Valida los campos sin consultar la base; devuelve ``(datos, lineas)``."""
+        if registro.datos is None:
+            raise ValueError("JSON inválido.")
+
+        fila = registro.datos
+        documento = _texto(fila.get("documento_cliente"))
+        if not documento:
+            raise ValueError("Falta documento_cliente.")
+
+        fecha = _texto(fila.get("fecha"))
+        if not fecha:
+            raise ValueError("Falta la fecha.")
+
+        tipo_venta = TIPOS_VENTA.get(_texto(fila.get("tipo_venta")).lower() or "ei")
+        if not tipo_venta:
+            raise ValueError(f"Tipo de venta inválido: '{_texto(fila.get('tipo_venta'))}'.")
+
+        forma_pago = FORMAS_PAGO.get(_texto(fila.get("forma_pago")).lower() or "efectivo")
+        if not forma_pago:
+            raise ValueError(f"Forma de pago inválida: '{_texto(fila.get('forma_pago'))}'.")
+
+        con_domicilio = _texto(fila.get("con_domicilio")).lower() in _VERDADEROS
+        datos = {
+            "documento": documento,
+            "fecha": _fecha(fecha),
+            "tipo_venta": tipo_venta,
+            "forma_pago": forma_pago,
+            "mano_obra": _decimal(fila.get("mano_obra"), "mano_obra", Decimal("0")),
+            "con_domicilio": con_domicilio,
+            "direccion": _texto(fila.get("direccion")) or None,
+            "precio_envio": _decimal(fila.get("precio_envio"), "precio_envio", Decimal("0")),
+            "descripcion": _texto(fila.get("descripcion")),
+        }
+
+        lineas = []
+        for idx, linea in enumerate(registro.lineas, start=1):
+            if not isinstance(linea, dict):
+                raise ValueError(f"Item {idx}: formato inválido.")
+            referencia = _texto(linea.get("item"))
+            if not referencia:
+                raise ValueError(f"Item {idx}: falta el item.")
+            try:
+                cantidad = int(_texto(linea.get("cantidad")))
+            except ValueError:
+                raise ValueError(f"Item {idx}: formato inválido en cantidad.")
+            if cantidad <= 0:
+                raise ValueError(f"Item {idx}: la cantidad debe ser mayor a 0.")
+            precio = _decimal(linea.get("precio"), f"precio del item {idx}")
+            if precio is not None and precio <= 0:
+                raise ValueError(f"Item {idx}: el precio debe ser mayor a 0.")
+            lineas.append({"referencia": _referencia_item(referencia), "cantidad": cantidad, "precio": precio})
+
+        if not lineas:
+            raise ValueError("La venta no tiene items.")
+        return datos, lineas
+
+    def _buscar_referencias(self, validas):
+        """Resuelve clientes e items del lote con una consulta por tabla."""
+        documentos = {datos["documento"] for _, (datos, _) in validas}
+        ids = {"FLOR": set(), "PRODUCTO": set()}
+        nombres = set()
+        for _, (_, lineas) in validas:
+            for linea in lineas:
+                tipo, valor = linea["referencia"]
+                if tipo:
+                    ids[tipo].add(valor)
+                else:
+                    nombres.add(valor)
+
+        clientes = dict(Cliente.objects.filter(documento__in=documentos).values_list("documento", "pk"))
+
+        candidatos = {}
+        if nombres:
+            indice = self._indice_nombres()
+            candidatos = {nombre: indice[nombre] for nombre in nombres if nombre in indice}
+            for tipo_item, pk in chain.from_iterable(candidatos.values()):
+                ids[tipo_item].add(pk)
+
+        items = {}
+        for tipo_item, modelo in MODELOS_ITEM.items():
+            if not ids[tipo_item]:
+                continue
+            filas = modelo.objects.filter(pk__in=ids[tipo_item]).values_list(
+                "pk", "nombre", "precio", "cantidad", "costo_promedio"
+            )
+            for pk, nombre, precio, cantidad, costo in filas:
+                items[(tipo_item, pk)] = {"nombre": nombre, "precio": precio, "cantidad": cantidad, "costo": costo}
+        # Un item borrado después de armar el índice ya no es candidato.
+        por_nombre = {nombre: [clave for clave in claves if clave in items] for nombre, claves in candidatos.items()}
+        return clientes, items, por_nombre
+
+    def _indice_nombres(self):
+        """
+        ``{nombre: [(tipo_item, pk), ...]}`` de todo el inventario, con el nombre en casefold().
+
+        LOWER() de SQLite solo pasa a minúsculas ASCII, así que los nombres se
+        comparan en Python. El índice se arma una vez por ejecución, solo con pk
+        y nombre, y solo si algún registro nombra items.
+        """
+        if self._por_nombre is None:
+            self._por_nombre = {}
+            for tipo_item, modelo in MODELOS_ITEM.items():
+                for pk, nombre in modelo.objects.values_list("pk", "nombre").iterator():
+                    self._por_nombre.setdefault(nombre.casefold(), []).append((tipo_item, pk))
+        return self._por_nombre
+
+    def _armar_venta(self, datos, lineas, clientes, items, por_nombre):
+        cliente_id = clientes.get(datos["documento"])
+        if cliente_id is None:
+            raise ValueError(f"No existe un cliente con documento {datos['documento']}.")
+
+        venta = Venta(
+            cliente_id=cliente_id,
+            tipo_venta=datos["tipo_venta"],
+            fecha=datos["fecha"],
+            forma_pago=datos["forma_pago"],
+            mano_obra=datos["mano_obra"],
+            con_domicilio=datos["con_domicilio"],
+            direccion=datos["direccion"],
+            precio_envio=datos["precio_envio"],
+            descripcion=datos["descripcion"],
+        )
+
+        nuevos, requeridos = [], {}
+        for idx, linea in enumerate(lineas, start=1):
+            tipo, valor = linea["referencia"]
+            if tipo:
+                clave = (tipo, valor)
+                if clave not in items:
+                    raise ValueError(f"Item {idx}: no existe {'F' if tipo == 'FLOR' else 'P'}-{valor}.")
+            else:
+                candidatos = por_nombre.get(valor, [])
+                if not candidatos:
+                    raise ValueError(f"Item {idx}: no existe un item llamado '{valor}'.")
+                if len(candidatos) > 1:
+                    raise ValueError(f"Item {idx}: el nombre '{valor}' es ambiguo; usa el id F-/P-.")
+                clave = candidatos[0]
+
+            precio = linea["precio"] or items[clave]["precio"]
+            if not precio or precio <= 0:
+                raise ValueError(f"Item {idx}: el precio debe ser mayor a 0.")
+            detalle = DetalleVenta(
+                venta=venta,
+                tipo_item=clave[0],
+                cantidad=linea["cantidad"],
+                precio=precio,
+                costo_unitario=items[clave]["costo"],
+            )
+            if clave[0] == "FLOR":
+                detalle.flor_id = clave[1]
+            else:
+                detalle.producto_id = clave[1]
+            nuevos.append(detalle.preparar())
+            requeridos[clave] = requeridos.get(clave, 0) + linea["cantidad"]
+
+        venta.aplicar_detalles(nuevos)
+        return venta, nuevos, requeridos
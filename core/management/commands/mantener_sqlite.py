@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.sqlite import MODOS_CHECKPOINT, mantener
+
+
+class Command(BaseCommand):
+    help = (
+        "Mantenimiento de la base SQLite: PRAGMA optimize y checkpoint del WAL en cada ejecución; "
+        "ANALYZE completo y VACUUM a pedido. Pensado para ejecutarse periódicamente (cron), "
+        "VACUUM fuera del horario de atención porque bloquea la base."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--analyze", action="store_true", help="Recalcula las estadísticas de todas las tablas.")
+        parser.add_argument(
+            "--checkpoint",
+            choices=MODOS_CHECKPOINT,
+            default="passive",
+            help="Modo del checkpoint del WAL (por defecto passive, que no espera a los lectores).",
+        )
+        parser.add_argument("--vacuum", action="store_true", help="Reescribe el archivo para recuperar espacio.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("El mantenimiento solo aplica a bases SQLite.")
+
+        tareas = mantener(
+            analizar=options["analyze"],
+            modo_checkpoint=options["checkpoint"],
+            vacuum=options["vacuum"],
+        )
+        for tarea in tareas:
+            self.stdout.write(f"- {tarea}")
+        self.stdout.write(self.style.SUCCESS(f"Mantenimiento completado: {len(tareas)} tarea(s)."))
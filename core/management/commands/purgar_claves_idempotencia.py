@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core.idempotencia import VIGENCIA, purgar_claves
+
+
+class Command(BaseCommand):
+    help = (
+        "Elimina las claves de idempotencia vencidas de los formularios (por defecto las de más "
+        "de 24 horas). Pensado para ejecutarse de forma programada (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--horas",
+            type=int,
+            default=int(VIGENCIA.total_seconds() // 3600),
+            help="Antigüedad mínima, en horas, de las claves a eliminar.",
+        )
+
+    def handle(self, *args, **options):
+        borradas = purgar_claves(timedelta(hours=options["horas"]))
+        self.stdout.write(self.style.SUCCESS(f"Claves de idempotencia eliminadas: {borradas}."))
@@ -0,0 +1,90 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from compras.models import Compra, DetalleCompra, ResumenDiarioCompra
+from ventas.models import DetalleVenta, ResumenDiarioVenta, Venta
+
+
+def _suma_detalles(modelo_detalle, campo_padre, campo="subtotal"):
+    """Subconsulta con la suma de ``campo`` de los detalles del registro externo."""
+    suma = (
+        modelo_detalle.objects.filter(**{campo_padre: OuterRef("pk")})
+        .order_by()
+        .values(campo_padre)
+        .annotate(suma=Sum(campo))
+        .values("suma")
+    )
+    return Coalesce(
+        Subquery(suma),
+        Value(Decimal("0")),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula subtotal/total/costo de Venta y subtotal/total_compra de Compra a partir de sus "
+        "detalles con un UPDATE por tabla e informa los registros que estaban desfasados; si "
+        "corrige alguno, recalcula también el resumen diario correspondiente. "
+        "Pensado para ejecutarse de forma programada (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--solo-reportar",
+            action="store_true",
+            help="Muestra los registros desfasados sin corregirlos.",
+        )
+
+    def handle(self, *args, **options):
+        solo_reportar = options["solo_reportar"]
+
+        subtotal_venta = _suma_detalles(DetalleVenta, "venta")
+        total_venta = subtotal_venta + F("mano_obra") + Case(
+            When(con_domicilio=True, then=F("precio_envio")),
+            default=Value(Decimal("0")),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+        subtotal_compra = _suma_detalles(DetalleCompra, "compra")
+
+        tablas = [
+            (
+                "Venta",
+                Venta,
+                {"subtotal": subtotal_venta, "total": total_venta, "costo": _suma_detalles(DetalleVenta, "venta", "costo")},
+                ResumenDiarioVenta,
+            ),
+            ("Compra", Compra, {"subtotal": subtotal_compra, "total_compra": subtotal_compra}, ResumenDiarioCompra),
+        ]
+
+        with transaction.atomic():
+            for etiqueta, modelo, calculados, resumen in tablas:
+                corregidos = self._reconciliar(etiqueta, modelo, calculados, solo_reportar)
+                if corregidos:
+                    # Los UPDATE masivos no pasan por save(): el resumen diario se recalcula.
+                    resumen.reconstruir()
+
+    def _reconciliar(self, etiqueta, modelo, calculados, solo_reportar):
+        alias = {f"{campo}_calculado": expresion for campo, expresion in calculados.items()}
+        desfasados = list(
+            modelo.objects.annotate(**alias)
+            .exclude(**{campo: F(f"{campo}_calculado") for campo in calculados})
+            .values("pk", *calculados, *alias)
+        )
+
+        for fila in desfasados:
+            cambios = ", ".join(
+                f"{campo} {fila[campo]} -> {fila[f'{campo}_calculado']}" for campo in calculados
+            )
+            self.stdout.write(f"{etiqueta} #{fila['pk']}: {cambios}")
+
+        if desfasados and not solo_reportar:
+            modelo.objects.filter(pk__in=[fila["pk"] for fila in desfasados]).update(**calculados)
+
+        accion = "detectados" if solo_reportar else "corregidos"
+        self.stdout.write(self.style.SUCCESS(f"{etiqueta}: {len(desfasados)} registro(s) desfasado(s) {accion}."))
+        return 0 if solo_reportar else len(desfasados)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from compras.models import ResumenDiarioCompra
+from ventas.models import ResumenDiarioVenta, reconstruir_mas_vendidos
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye desde el historial las tablas de resumen diario de ventas y compras y los "
+        "contadores de más vendidos. "
+        "Normalmente se mantienen solas; sirve tras cargas o correcciones hechas por fuera "
+        "de los modelos."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            for etiqueta, modelo in (("Ventas", ResumenDiarioVenta), ("Compras", ResumenDiarioCompra)):
+                filas = modelo.reconstruir()
+                self.stdout.write(self.style.SUCCESS(f"{etiqueta}: resumen diario reconstruido con {filas} fila(s)."))
+            filas = reconstruir_mas_vendidos()
+            self.stdout.write(self.style.SUCCESS(f"Más vendidos: {filas} fila(s) diaria(s) por item."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.busqueda import indice_disponible, reconstruir_indice_catalogo
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice de búsqueda del catálogo público usado por la portada."
+
+    def handle(self, *args, **options):
+        if not indice_disponible():
+            self.stdout.write(self.style.WARNING("El índice FTS5 solo está disponible con SQLite; nada que hacer."))
+            return
+
+        total = reconstruir_indice_catalogo()
+        self.stdout.write(self.style.SUCCESS(f"Índice del catálogo reconstruido con {total} producto(s)."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.busqueda import indice_disponible, reconstruir_indice
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice de búsqueda de inventario (flores y productos) usado por el selector de items."
+
+    def handle(self, *args, **options):
+        if not indice_disponible():
+            self.stdout.write(self.style.WARNING("El índice FTS5 solo está disponible con SQLite; nada que hacer."))
+            return
+
+        total = reconstruir_indice()
+        self.stdout.write(self.style.SUCCESS(f"Índice de inventario reconstruido con {total} item(s)."))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.movimientos import diferencias_con_contadores, registrar_movimientos
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el stock de cada flor y producto con el libro de movimientos (última foto diaria "
+        "más los movimientos posteriores) e informa los items desfasados. Con --registrar-ajustes "
+        "agrega un movimiento AJUSTE por la diferencia para que el libro vuelva a cuadrar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--registrar-ajustes",
+            action="store_true",
+            help="Registra en el libro un ajuste por cada diferencia encontrada.",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            diferencias = diferencias_con_contadores()
+            for (tipo_item, pk), nombre, contador, libro in diferencias:
+                self.stdout.write(
+                    f"{tipo_item} #{pk} {nombre}: contador {contador}, libro {libro} "
+                    f"(diferencia {contador - libro:+d})"
+                )
+            if diferencias and options["registrar_ajustes"]:
+                registrar_movimientos(
+                    (clave, contador - libro, "AJUSTE", None) for clave, _, contador, libro in diferencias
+                )
+
+        accion = "ajustados" if options["registrar_ajustes"] else "detectados"
+        self.stdout.write(self.style.SUCCESS(f"Items desfasados {accion}: {len(diferencias)}."))
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+
+TABLA_INDICE = "core_inventario_fts"
+
+
+def crear_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_INDICE} USING fts5("
+        "nombre, descripcion, tipo_item UNINDEXED, item_id UNINDEXED, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+
+    for app_label, modelo, tipo_item, paridad in (("flor", "Flor", "FLOR", 0), ("producto", "Producto", "PRODUCTO", 1)):
+        Modelo = apps.get_model(app_label, modelo)
+        for pk, nombre, descripcion in Modelo.objects.values_list("pk", "nombre", "descripcion"):
+            schema_editor.execute(
+                f"INSERT INTO {TABLA_INDICE} (rowid, nombre, descripcion, tipo_item, item_id) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                [pk * 2 + paridad, nombre, descripcion or "", tipo_item, pk],
+            )
+
+
+def eliminar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {TABLA_INDICE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flor', '0002_alter_flor_descripcion'),
+        ('producto', '0002_alter_producto_descripcion'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.27 on 2026-10-18 08:43
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def saldo_inicial(apps, schema_editor):
+    # El libro arranca con el stock vigente de cada item como saldo inicial.
+    StockMovimiento = apps.get_model('core', 'StockMovimiento')
+    ahora = django.utils.timezone.now()
+    fecha = django.utils.timezone.localdate(ahora)
+    for tipo_item, app, modelo in (('FLOR', 'flor', 'Flor'), ('PRODUCTO', 'producto', 'Producto')):
+        Item = apps.get_model(app, modelo)
+        StockMovimiento.objects.bulk_create(
+            (
+                StockMovimiento(
+                    tipo_item=tipo_item, item_id=pk, delta=cantidad, motivo='INICIAL', fecha=fecha, created_at=ahora
+                )
+                for pk, cantidad in Item.objects.filter(cantidad__gt=0).values_list('pk', 'cantidad')
+            ),
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_clave_idempotencia'),
+        ('flor', '0003_costo_promedio'),
+        ('producto', '0003_costo_promedio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovimiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_item', models.CharField(choices=[('FLOR', 'Flor'), ('PRODUCTO', 'Producto')], max_length=20)),
+                ('item_id', models.BigIntegerField()),
+                ('delta', models.IntegerField()),
+                ('motivo', models.CharField(choices=[('INICIAL', 'Saldo inicial'), ('AJUSTE', 'Ajuste manual'), ('VENTA', 'Venta'), ('VENTA_EDITADA', 'Edición de venta'), ('VENTA_ELIMINADA', 'Eliminación de venta'), ('COMPRA', 'Compra'), ('COMPRA_EDITADA', 'Edición de compra'), ('COMPRA_ELIMINADA', 'Eliminación de compra')], max_length=20)),
+                ('documento_id', models.BigIntegerField(blank=True, null=True)),
+                ('fecha', models.DateField(default=django.utils.timezone.localdate)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Movimiento de stock',
+                'verbose_name_plural': 'Movimientos de stock',
+                'indexes': [models.Index(fields=['tipo_item', 'item_id', 'fecha'], name='core_movimiento_item_fecha'), models.Index(fields=['fecha'], name='core_movimiento_fecha')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo_item', models.CharField(choices=[('FLOR', 'Flor'), ('PRODUCTO', 'Producto')], max_length=20)),
+                ('item_id', models.BigIntegerField()),
+                ('cantidad', models.IntegerField()),
+            ],
+            options={
+                'verbose_name': 'Stock diario',
+                'verbose_name_plural': 'Stock diario',
+                'indexes': [models.Index(fields=['fecha'], name='core_stock_diario_fecha')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stockdiario',
+            constraint=models.UniqueConstraint(fields=('tipo_item', 'item_id', 'fecha'), name='core_stock_diario_unico'),
+        ),
+        migrations.RunPython(saldo_inicial, migrations.RunPython.noop),
+    ]
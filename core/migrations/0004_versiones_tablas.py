@@ -0,0 +1,45 @@
+# Generated by Django 4.2.27 on 2026-10-18 08:59
+
+from django.db import migrations, models
+import django.utils.timezone
+
+from core.versiones import asegurar_triggers, eliminar_triggers
+
+
+def crear_triggers(apps, schema_editor):
+    asegurar_triggers(schema_editor.connection)
+
+
+def quitar_triggers(apps, schema_editor):
+    eliminar_triggers(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_movimientos_stock'),
+        ('catalogo', '0003_updated_at'),
+        ('categoria', '0001_initial'),
+        ('clientes', '0003_cliente_busqueda_indice'),
+        ('flor', '0006_updated_at'),
+        ('producto', '0006_updated_at'),
+        ('proveedores', '0001_initial'),
+        ('usuarios', '0001_initial'),
+        ('ventas', '0006_indices_listado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionTabla',
+            fields=[
+                ('tabla', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Versión de tabla',
+                'verbose_name_plural': 'Versiones de tablas',
+            },
+        ),
+        migrations.RunPython(crear_triggers, quitar_triggers),
+    ]
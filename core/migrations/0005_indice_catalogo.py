@@ -0,0 +1,43 @@
+from django.db import migrations
+
+
+TABLA_INDICE = "core_catalogo_fts"
+
+
+def crear_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_INDICE} USING fts5("
+        "nombre, descripcion, categoria, tamano, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+
+    Producto = apps.get_model("catalogo", "Producto")
+    filas = Producto.objects.values_list("pk", "nombre", "descripcion", "categoria__nombre", "tamano")
+    for pk, nombre, descripcion, categoria, tamano in filas:
+        schema_editor.execute(
+            f"INSERT INTO {TABLA_INDICE} (rowid, nombre, descripcion, categoria, tamano) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            [pk, nombre, descripcion or "", categoria, tamano or ""],
+        )
+
+
+def eliminar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {TABLA_INDICE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_versiones_tablas'),
+        ('catalogo', '0003_updated_at'),
+        ('categoria', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
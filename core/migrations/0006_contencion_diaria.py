@@ -0,0 +1,30 @@
+# Generated by Django 4.2.27 on 2026-10-18 09:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_indice_catalogo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContencionDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('evento', models.CharField(max_length=20)),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Contención diaria de stock',
+                'verbose_name_plural': 'Contención diaria de stock',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='contenciondiaria',
+            constraint=models.UniqueConstraint(fields=('fecha', 'evento'), name='core_contencion_diaria_unica'),
+        ),
+    ]
@@ -1,3 +1,130 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class ClaveIdempotencia(models.Model):
+    """
+    Clave enviada por un formulario para que un reenvío no repita la operación.
+
+    Se registra en la misma transacción que la operación; ``resultado_id`` guarda
+    el id del registro creado (p. ej. la venta) para responder igual al reenvío.
+    """
+
+    ambito = models.CharField(max_length=30)
+    clave = models.CharField(max_length=64)
+    resultado_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["ambito", "clave"], name="core_clave_idempotencia_unica"),
+        ]
+        verbose_name = "Clave de idempotencia"
+        verbose_name_plural = "Claves de idempotencia"
+
+    def __str__(self):
+        return f"{self.ambito}:{self.clave}"
+
+
+TIPO_ITEM_CHOICES = [
+    ("FLOR", "Flor"),
+    ("PRODUCTO", "Producto"),
+]
+
+MOTIVO_MOVIMIENTO_CHOICES = [
+    ("INICIAL", "Saldo inicial"),
+    ("AJUSTE", "Ajuste manual"),
+    ("VENTA", "Venta"),
+    ("VENTA_EDITADA", "Edición de venta"),
+    ("VENTA_ELIMINADA", "Eliminación de venta"),
+    ("COMPRA", "Compra"),
+    ("COMPRA_EDITADA", "Edición de compra"),
+    ("COMPRA_ELIMINADA", "Eliminación de compra"),
+]
+
+
+class StockMovimiento(models.Model):
+    """
+    Libro de movimientos de stock (solo se agregan filas).
+
+    Cada cambio de ``Flor.cantidad`` o ``Producto.cantidad`` deja una fila con
+    el delta, el motivo y el documento que lo originó. ``fecha`` es el día
+    local del movimiento y agrupa las filas al compactarlas en ``StockDiario``.
+    """
+
+    tipo_item = models.CharField(max_length=20, choices=TIPO_ITEM_CHOICES)
+    item_id = models.BigIntegerField()
+    delta = models.IntegerField()
+    motivo = models.CharField(max_length=20, choices=MOTIVO_MOVIMIENTO_CHOICES)
+    documento_id = models.BigIntegerField(null=True, blank=True)
+    fecha = models.DateField(default=timezone.localdate)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["tipo_item", "item_id", "fecha"], name="core_movimiento_item_fecha"),
+            models.Index(fields=["fecha"], name="core_movimiento_fecha"),
+        ]
+        verbose_name = "Movimiento de stock"
+        verbose_name_plural = "Movimientos de stock"
+
+    def __str__(self):
+        return f"{self.tipo_item}-{self.item_id} {self.delta:+d} ({self.motivo})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Los movimientos de stock no se modifican; registra un ajuste.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Los movimientos de stock no se eliminan; registra un ajuste.")
+
+
+class StockDiario(models.Model):
+    """Stock de un item al cierre de ``fecha``, compactado desde ``StockMovimiento``."""
+
+    fecha = models.DateField()
+    tipo_item = models.CharField(max_length=20, choices=TIPO_ITEM_CHOICES)
+    item_id = models.BigIntegerField()
+    cantidad = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["tipo_item", "item_id", "fecha"], name="core_stock_diario_unico"),
+        ]
+        indexes = [models.Index(fields=["fecha"], name="core_stock_diario_fecha")]
+        verbose_name = "Stock diario"
+        verbose_name_plural = "Stock diario"
+
+
+class VersionTabla(models.Model):
+    """Contador de cambios de una tabla; lo suben triggers de SQLite (``core.versiones``)."""
+
+    tabla = models.CharField(max_length=100, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    actualizado = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Versión de tabla"
+        verbose_name_plural = "Versiones de tablas"
+
+    def __str__(self):
+        return f"{self.tabla} v{self.version}"
+
+
+class ContencionDiaria(models.Model):
+    """Reintentos y ajustes de stock abandonados por contención en un día (``core.concurrencia``)."""
+
+    fecha = models.DateField()
+    evento = models.CharField(max_length=20)
+    cantidad = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["fecha", "evento"], name="core_contencion_diaria_unica"),
+        ]
+        verbose_name = "Contención diaria de stock"
+        verbose_name_plural = "Contención diaria de stock"
+
+    def __str__(self):
+        return f"{self.fecha} {self.evento}: {self.cantidad}"
@@ -0,0 +1,72 @@
+"""
+Paginación por cursor (keyset) para listados ordenados por fecha de creación.
+
+En lugar de ``OFFSET`` se filtra por la última fila mostrada, así el costo de
+cada página no depende de cuántas filas haya antes.
+"""
+
+import base64
+from collections import namedtuple
+from datetime import datetime
+
+from django.db.models import Q
+
+
+PaginaCursor = namedtuple("PaginaCursor", ["objetos", "cursor_siguiente", "cursor_anterior"])
+
+
+def codificar_cursor(valor, pk):
+    crudo = f"{valor.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor):
+    """Devuelve ``(valor, pk)`` o ``None`` si el cursor no es válido."""
+    if not cursor:
+        return None
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        crudo = base64.urlsafe_b64decode(cursor + relleno).decode()
+        valor, pk = crudo.rsplit("|", 1)
+        return datetime.fromisoformat(valor), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def paginar_por_cursor(queryset, despues=None, antes=None, por_pagina=25, campo="created_at"):
+    """
+    Devuelve una ``PaginaCursor`` del queryset en orden descendente por ``(campo, id)``.
+
+    ``despues`` avanza a filas más antiguas que el cursor y ``antes`` retrocede
+    a filas más recientes. Los cursores inválidos se ignoran.
+    """
+    cursor_despues = decodificar_cursor(despues)
+    cursor_antes = None if cursor_despues else decodificar_cursor(antes)
+
+    if cursor_antes:
+        valor, pk = cursor_antes
+        filas = list(
+            queryset.filter(Q(**{f"{campo}__gt": valor}) | Q(**{campo: valor, "pk__gt": pk}))
+            .order_by(campo, "pk")[:por_pagina + 1]
+        )
+        hay_anterior = len(filas) > por_pagina
+        objetos = filas[:por_pagina][::-1]
+        hay_siguiente = True
+    else:
+        if cursor_despues:
+            valor, pk = cursor_despues
+            queryset = queryset.filter(Q(**{f"{campo}__lt": valor}) | Q(**{campo: valor, "pk__lt": pk}))
+        filas = list(queryset.order_by(f"-{campo}", "-pk")[:por_pagina + 1])
+        hay_siguiente = len(filas) > por_pagina
+        objetos = filas[:por_pagina]
+        hay_anterior = cursor_despues is not None
+
+    if not objetos:
+        return PaginaCursor(objetos, None, None)
+
+    ultimo, primero = objetos[-1], objetos[0]
+    return PaginaCursor(
+        objetos,
+        codificar_cursor(getattr(ultimo, campo), ultimo.pk) if hay_siguiente else None,
+        codificar_cursor(getattr(primero, campo), primero.pk) if hay_anterior else None,
+    )
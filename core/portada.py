@@ -0,0 +1,168 @@
+"""
+Caché de página completa para la portada pública (``core.views.index``).
+
+Cada variante ``(busqueda, categoria)`` se guarda ya renderizada para los GET
+de visitantes sin sesión ni mensajes pendientes. Las copias llevan la
+generación vigente al renderizarse. En SQLite la generación es la firma de
+versiones de ``MODELOS_PORTADA`` (``core.versiones``), que mantienen triggers
+en la propia base: un cambio confirmado por cualquier proceso invalida las
+copias de todos los procesos en su siguiente petición, aunque la caché sea
+local a cada uno. En otros motores la generación es un token en la caché que
+cambian las señales de ``catalogo.Producto`` y ``categoria.Categoria``; con
+LocMemCache eso solo alcanza al proceso que hizo el cambio, por lo que allí
+hace falta una caché compartida y una copia vence también a los ``FRESCURA``
+segundos.
+
+La generación sigue solo al catálogo. Lo que cambia con cada venta, como la
+sección de más vendidos, se guarda en la página como una marca y se rellena al
+servirla (``rellenos``), igual que el token CSRF; así una venta o un ajuste de
+stock no invalidan las copias.
+
+Cuando una copia está vencida o invalidada, solo la petición que consigue el
+candado la regenera; las demás siguen sirviendo la copia anterior mientras
+tanto. El candado y los contadores de aciertos, fallos y copias obsoletas
+viven en la caché: con una caché por proceso cada proceso regenera a lo sumo
+una vez por generación y cuenta solo lo suyo.
+"""
+
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils import timezone
+
+from .versiones import estado_tablas
+
+
+FRESCURA = 300
+# La copia se conserva más allá de su frescura para servirla mientras otra petición la regenera.
+RETENCION = 24 * 3600
+BLOQUEO = 30
+# El token CSRF es propio de cada visitante: se guarda esta marca y se reemplaza al servir.
+MARCA_CSRF = "__csrf_portada__"
+MARCA_MAS_VENDIDOS = "__mas_vendidos_portada__"
+EVENTOS_PORTADA = ("aciertos", "fallos", "obsoletas")
+
+_CLAVE_GENERACION = "portada:generacion"
+
+# Lo que lee la página guardada (core.versiones); los rellenos siguen sus propias versiones.
+MODELOS_PORTADA = ("catalogo.Producto", "categoria.Categoria")
+
+
+def es_cacheable(request):
+    """Solo los GET anónimos sin sesión ni mensajes ven la misma página que cualquier otro."""
+    return (
+        request.method == "GET"
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and CookieStorage.cookie_name not in request.COOKIES
+    )
+
+
+def firma_visitante(request):
+    """
+    Parte del ETag propia de cada visitante: su secreto CSRF (la página lo
+    lleva) y el día, porque la ventana de más vendidos avanza a diario.
+    """
+    get_token(request)
+    secreto = hashlib.sha1(request.META["CSRF_COOKIE"].encode()).hexdigest()
+    return f"{timezone.localdate().isoformat()}|{secreto}"
+
+
+def generacion_actual(request=None):
+    estado = estado_tablas(MODELOS_PORTADA, request)
+    if estado is not None:
+        return hashlib.sha1(estado.firma.encode()).hexdigest()
+    generacion = cache.get(_CLAVE_GENERACION)
+    if generacion is None:
+        cache.add(_CLAVE_GENERACION, uuid.uuid4().hex, timeout=None)
+        generacion = cache.get(_CLAVE_GENERACION)
+    return generacion
+
+
+def invalidar_portada():
+    """Deja obsoletas las variantes guardadas cuando no hay versiones de tablas (fuera de SQLite)."""
+    # Un valor aleatorio y no un contador: si la clave se pierde no puede volver a un valor ya usado.
+    cache.set(_CLAVE_GENERACION, uuid.uuid4().hex, timeout=None)
+
+
+def _clave_variante(variante):
+    crudo = "\x00".join(str(parte) for parte in variante)
+    return f"portada:pagina:{hashlib.sha1(crudo.encode()).hexdigest()}"
+
+
+def _clave_contador(evento, fecha):
+    return f"portada:{fecha.isoformat()}:{evento}"
+
+
+def _contar(evento):
+    clave = _clave_contador(evento, timezone.localdate())
+    cache.add(clave, 0, timeout=None)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, 1, timeout=None)
+
+
+def contadores_portada(fecha=None):
+    fecha = fecha or timezone.localdate()
+    return {evento: cache.get(_clave_contador(evento, fecha), 0) for evento in EVENTOS_PORTADA}
+
+
+def _respuesta(request, contenido, tipo, rellenos):
+    contenido = contenido.replace(MARCA_CSRF, get_token(request))
+    for marca, rellenar in (rellenos or {}).items():
+        contenido = contenido.replace(marca, rellenar(request))
+    return HttpResponse(contenido, content_type=tipo)
+
+
+def servir_portada(request, variante, generar, rellenos=None):
+    """
+    Devuelve la portada de ``variante`` desde la caché o llamando a ``generar()``.
+
+    ``generar`` debe renderizar la página con ``csrf_token=MARCA_CSRF`` y una
+    marca en lugar de cada sección de ``rellenos`` (``{marca: funcion(request)}``),
+    que se rellena en cada respuesta.
+    """
+    clave = _clave_variante(variante)
+    generacion = generacion_actual(request)
+    # Con versiones de tablas la generación ya sigue cada cambio; el vencimiento solo hace falta con el token.
+    frescura = RETENCION if estado_tablas(MODELOS_PORTADA, request) else FRESCURA
+    entrada = cache.get(clave)
+    if entrada and entrada["generacion"] == generacion and entrada["expira"] > time.time():
+        _contar("aciertos")
+        return _respuesta(request, entrada["contenido"], entrada["tipo"], rellenos)
+
+    clave_bloqueo = f"{clave}:regenerando"
+    tiene_bloqueo = cache.add(clave_bloqueo, 1, timeout=BLOQUEO)
+    if entrada and not tiene_bloqueo:
+        _contar("obsoletas")
+        return _respuesta(request, entrada["contenido"], entrada["tipo"], rellenos)
+
+    _contar("fallos")
+    try:
+        respuesta = generar()
+        contenido = respuesta.content.decode(respuesta.charset)
+        if tiene_bloqueo and respuesta.status_code == 200:
+            # Se guarda con la generación leída antes de renderizar: si hubo una
+            # invalidación entretanto, la próxima petición vuelve a generar.
+            cache.set(
+                clave,
+                {
+                    "contenido": contenido,
+                    "tipo": respuesta["Content-Type"],
+                    "generacion": generacion,
+                    "expira": time.time() + frescura,
+                },
+                timeout=RETENCION,
+            )
+    finally:
+        if tiene_bloqueo:
+            cache.delete(clave_bloqueo)
+    if respuesta.status_code != 200:
+        return respuesta
+    return _respuesta(request, contenido, respuesta["Content-Type"], rellenos)
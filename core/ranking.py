@@ -0,0 +1,93 @@
+"""
+Ranking de flores y productos más vendidos.
+
+Lee los contadores que ``ventas`` mantiene al registrar cada venta: el total
+histórico por item (con índice por unidades) y los cubos diarios para las
+ventanas de los últimos 7, 30 o 365 días. El costo no depende del tamaño del
+historial de DetalleVenta.
+
+``mas_vendidos_en_cache`` guarda el ranking ya resuelto con la firma de
+versiones de ``MODELOS_MAS_VENDIDOS`` (``core.versiones``): una venta o un
+cambio en los items lo deja sin uso, sin depender de lo que cachee cada página
+que lo muestra. Fuera de SQLite solo vence por tiempo.
+"""
+
+import hashlib
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils import timezone
+
+from ventas.models import VentaItemDiaria, VentaItemTotal
+
+from .stock import MODELOS_ITEM
+from .versiones import estado_tablas
+
+
+VENTANAS_DIAS = (7, 30, 365)
+DURACION_RANKING = 3600
+DURACION_SIN_VERSIONES = 60
+# Lo que lee el ranking; VentaItemTotal cambia siempre junto con los cubos diarios.
+MODELOS_MAS_VENDIDOS = ("ventas.VentaItemDiaria", "flor.Flor", "producto.Producto")
+
+
+def mas_vendidos(limite=5, dias=None, hoy=None):
+    """
+    Devuelve los ``limite`` items con más unidades vendidas.
+
+    Sin ``dias`` usa el acumulado histórico; con ``dias`` (7, 30, 365...) suma
+    los cubos diarios de esa ventana. Cada resultado es un dict con
+    ``tipo_item``, ``id``, ``nombre``, ``imagen``, ``unidades`` e ``ingresos``.
+    """
+    if dias is None:
+        filas = list(
+            VentaItemTotal.objects.filter(unidades__gt=0)
+            .order_by("-unidades", "tipo_item", "item_id")
+            .values("tipo_item", "item_id", "unidades", "ingresos")[:limite]
+        )
+    else:
+        desde = (hoy or timezone.localdate()) - timedelta(days=dias - 1)
+        filas = list(
+            VentaItemDiaria.objects.filter(fecha__gte=desde)
+            .values("tipo_item", "item_id")
+            .annotate(unidades=Sum("unidades"), ingresos=Sum("ingresos"))
+            .filter(unidades__gt=0)
+            .order_by("-unidades", "tipo_item", "item_id")[:limite]
+        )
+
+    items = {}
+    for tipo_item, modelo in MODELOS_ITEM.items():
+        pks = [fila["item_id"] for fila in filas if fila["tipo_item"] == tipo_item]
+        if pks:
+            items.update({(tipo_item, pk): item for pk, item in modelo.objects.in_bulk(pks).items()})
+
+    resultados = []
+    for fila in filas:
+        item = items.get((fila["tipo_item"], fila["item_id"]))
+        if item is None:
+            continue
+        resultados.append(
+            {
+                "tipo_item": fila["tipo_item"],
+                "id": fila["item_id"],
+                "nombre": item.nombre,
+                "imagen": item.imagen.url if item.imagen else "",
+                "unidades": fila["unidades"],
+                "ingresos": fila["ingresos"],
+            }
+        )
+    return resultados
+
+
+def mas_vendidos_en_cache(limite=5, dias=None, request=None):
+    """``mas_vendidos`` desde la caché mientras no cambien las ventas ni los items."""
+    estado = estado_tablas(MODELOS_MAS_VENDIDOS, request)
+    # La ventana avanza con los días: la fecha también va en la clave.
+    crudo = "|".join([str(limite), str(dias), timezone.localdate().isoformat(), estado.firma if estado else ""])
+    clave = f"ranking:mas_vendidos:{hashlib.sha1(crudo.encode()).hexdigest()}"
+    resultados = cache.get(clave)
+    if resultados is None:
+        resultados = mas_vendidos(limite=limite, dias=dias)
+        cache.set(clave, resultados, timeout=DURACION_RANKING if estado else DURACION_SIN_VERSIONES)
+    return resultados
@@ -0,0 +1,131 @@
+"""
+Tablas de resumen diario (ventas, compras) mantenidas por diferencias.
+
+Cada registro de origen "aporta" a una fila del resumen identificada por sus
+claves (fecha, forma de pago, proveedor...). Un aporte es ``(claves, valores)``;
+al crear, editar o borrar el registro se suma la diferencia entre el aporte
+anterior y el nuevo con un UPDATE F() en la misma transacción.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Q, Subquery, Sum, Value, When
+
+
+def acumular(modelo, claves, valores):
+    """Suma ``valores`` a la fila de ``modelo`` con ``claves``; la crea si no existe."""
+    valores = {campo: valor for campo, valor in valores.items() if valor}
+    if not valores:
+        return
+    incrementos = {campo: F(campo) + valor for campo, valor in valores.items()}
+    if modelo.objects.filter(**claves).update(**incrementos):
+        return
+    try:
+        with transaction.atomic():
+            modelo.objects.create(**claves, **valores)
+    except IntegrityError:
+        # Otra transacción creó la fila entre el UPDATE y el INSERT.
+        modelo.objects.filter(**claves).update(**incrementos)
+
+
+def acumular_lote(modelo, campos_clave, incrementos):
+    """
+    Suma varios incrementos en un número fijo de consultas.
+
+    ``incrementos`` es ``{tupla de valores de campos_clave: {campo: valor}}``.
+    Se leen las filas existentes (1 consulta), se actualizan con un UPDATE
+    ``CASE`` (1 consulta) y las que faltan se insertan con ``bulk_create``.
+    """
+    incrementos = {clave: valores for clave, valores in incrementos.items() if any(valores.values())}
+    if not incrementos:
+        return
+
+    def _condicion(claves):
+        condicion = Q()
+        for clave in claves:
+            condicion |= Q(**dict(zip(campos_clave, clave)))
+        return condicion
+
+    existentes = set(modelo.objects.filter(_condicion(incrementos)).values_list(*campos_clave))
+    if existentes:
+        campos = {campo for valores in incrementos.values() for campo in valores}
+        modelo.objects.filter(_condicion(existentes)).update(**{
+            campo: F(campo) + Case(
+                *[
+                    When(Q(**dict(zip(campos_clave, clave))), then=Value(incrementos.get(clave, {}).get(campo, 0)))
+                    for clave in existentes
+                ],
+                default=Value(0),
+                output_field=modelo._meta.get_field(campo),
+            )
+            for campo in campos
+        })
+
+    faltantes = {clave: valores for clave, valores in incrementos.items() if clave not in existentes}
+    if not faltantes:
+        return
+    try:
+        with transaction.atomic():
+            modelo.objects.bulk_create(
+                [modelo(**dict(zip(campos_clave, clave)), **valores) for clave, valores in faltantes.items()]
+            )
+    except IntegrityError:
+        for clave, valores in faltantes.items():
+            acumular(modelo, dict(zip(campos_clave, clave)), valores)
+
+
+def acumular_en_fila_de(modelo, origen, campos_clave, valores):
+    """
+    Suma ``valores`` a la fila del resumen del registro ``origen`` (queryset de una fila).
+
+    Las claves se leen de la base con subconsultas en el mismo UPDATE, así no
+    importa si la instancia en memoria está desactualizada. La fila ya existe
+    porque el registro se guardó antes.
+    """
+    valores = {campo: valor for campo, valor in valores.items() if valor}
+    if not valores:
+        return
+    filtro = {
+        campo_resumen: Subquery(origen.values(campo_origen)[:1])
+        for campo_resumen, campo_origen in campos_clave.items()
+    }
+    modelo.objects.filter(**filtro).update(**{campo: F(campo) + valor for campo, valor in valores.items()})
+
+
+def mover_aporte(modelo, anterior, nuevo):
+    """Reemplaza el aporte ``anterior`` por ``nuevo`` (cualquiera puede ser ``None``)."""
+    if anterior and nuevo and anterior[0] == nuevo[0]:
+        claves, valores = nuevo
+        acumular(modelo, claves, {campo: valor - anterior[1][campo] for campo, valor in valores.items()})
+        return
+    if anterior:
+        acumular(modelo, anterior[0], {campo: -valor for campo, valor in anterior[1].items()})
+    if nuevo:
+        acumular(modelo, *nuevo)
+
+
+def acumular_aportes(modelo, aportes):
+    """Suma varios aportes agrupándolos antes por claves (una escritura por fila del resumen)."""
+    agrupados = {}
+    for claves, valores in aportes:
+        clave = tuple(sorted(claves.items()))
+        acumulado = agrupados.setdefault(clave, dict.fromkeys(valores, 0))
+        for campo, valor in valores.items():
+            acumulado[campo] += valor
+    for clave, valores in agrupados.items():
+        acumular(modelo, dict(clave), valores)
+
+
+def reconstruir(modelo, filas):
+    """Reemplaza el contenido del resumen por ``filas`` (dicts con claves y valores)."""
+    with transaction.atomic():
+        modelo.objects.all().delete()
+        creadas = modelo.objects.bulk_create((modelo(**fila) for fila in filas), batch_size=500)
+    return len(creadas)
+
+
+def totales_periodo(modelo, desde, hasta, campos):
+    """Suma ``campos`` del resumen entre ``desde`` y ``hasta`` (inclusive) en una consulta."""
+    datos = modelo.objects.filter(fecha__gte=desde, fecha__lte=hasta).aggregate(
+        **{f"resumen_{campo}": Sum(campo) for campo in campos}
+    )
+    return {campo: datos[f"resumen_{campo}"] or 0 for campo in campos}
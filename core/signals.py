@@ -0,0 +1,95 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from catalogo.models import Producto as ProductoCatalogo
+from categoria.models import Categoria
+from flor.models import Flor
+from producto.models import Producto
+
+from .busqueda import (
+    desindexar_item,
+    desindexar_producto_catalogo,
+    indexar_item,
+    indexar_producto_catalogo,
+    renombrar_categoria_catalogo,
+)
+from .movimientos import registrar_movimientos
+from .portada import invalidar_portada
+from .sqlite import aplicar_perfil
+
+
+@receiver(connection_created)
+def perfil_sqlite(sender, connection, **kwargs):
+    aplicar_perfil(connection)
+
+
+@receiver(post_save, sender=Flor)
+def indexar_flor(sender, instance, **kwargs):
+    indexar_item("FLOR", instance)
+
+
+@receiver(post_delete, sender=Flor)
+def desindexar_flor(sender, instance, **kwargs):
+    desindexar_item("FLOR", instance.pk)
+
+
+@receiver(post_save, sender=Producto)
+def indexar_producto(sender, instance, **kwargs):
+    indexar_item("PRODUCTO", instance)
+
+
+@receiver(post_delete, sender=Producto)
+def desindexar_producto(sender, instance, **kwargs):
+    desindexar_item("PRODUCTO", instance.pk)
+
+
+@receiver(post_save, sender=ProductoCatalogo)
+def indexar_producto_catalogo_guardado(sender, instance, **kwargs):
+    indexar_producto_catalogo(instance)
+
+
+@receiver(post_delete, sender=ProductoCatalogo)
+def desindexar_producto_catalogo_eliminado(sender, instance, **kwargs):
+    desindexar_producto_catalogo(instance.pk)
+
+
+@receiver(post_save, sender=Categoria)
+def renombrar_categoria_indexada(sender, instance, created, **kwargs):
+    if not created:
+        renombrar_categoria_catalogo(instance)
+
+
+# Los formularios de flores y productos guardan ``cantidad`` con save(); las
+# ventas y compras la cambian con UPDATE y registran su propio movimiento.
+
+@receiver(pre_save, sender=Flor)
+@receiver(pre_save, sender=Producto)
+def leer_cantidad_anterior(sender, instance, **kwargs):
+    instance._cantidad_anterior = None
+    if instance.pk and not instance._state.adding:
+        instance._cantidad_anterior = sender.objects.filter(pk=instance.pk).values_list("cantidad", flat=True).first()
+
+
+@receiver(post_save, sender=Flor)
+@receiver(post_save, sender=Producto)
+def registrar_ajuste_manual(sender, instance, created, **kwargs):
+    anterior = getattr(instance, "_cantidad_anterior", None)
+    tipo_item = "FLOR" if sender is Flor else "PRODUCTO"
+    if created or anterior is None:
+        registrar_movimientos([((tipo_item, instance.pk), instance.cantidad, "INICIAL", None)])
+    else:
+        registrar_movimientos([((tipo_item, instance.pk), instance.cantidad - anterior, "AJUSTE", None)])
+
+
+# Fuera de SQLite la portada se invalida con estas señales (en SQLite bastan las
+# versiones de tablas). Se invalida al confirmar: invalidarla antes permitiría
+# que otra petición la regenere con los datos previos al commit.
+
+@receiver(post_save, sender=ProductoCatalogo)
+@receiver(post_delete, sender=ProductoCatalogo)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_cache_portada(sender, **kwargs):
+    transaction.on_commit(invalidar_portada)
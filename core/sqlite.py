@@ -0,0 +1,115 @@
+"""
+Perfil de rendimiento de SQLite y tareas de mantenimiento.
+
+``aplicar_perfil`` se ejecuta en cada conexión nueva (señal
+``connection_created``) con los pragmas de ``settings.SQLITE_PRAGMAS``: en
+modo WAL los lectores del panel no bloquean a las cajas ni al revés, y con
+``synchronous=NORMAL`` cada commit ya no espera un fsync. ``mantener`` agrupa
+lo que conviene correr periódicamente: ``PRAGMA optimize``, ANALYZE, el
+checkpoint del WAL y VACUUM.
+
+Los valores llegan del entorno y terminan dentro de un ``PRAGMA``: solo se
+aceptan los pragmas de ``VALORES_PERMITIDOS`` con sus valores conocidos (o
+enteros donde corresponde). ``pragmas()`` lanza ``ImproperlyConfigured`` con
+cualquier otro, y ``CoreConfig.ready`` la llama para fallar al arrancar.
+"""
+
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+
+
+# Orden de aplicación: journal_mode primero, el resto depende de la conexión.
+PRAGMAS_POR_DEFECTO = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "busy_timeout": 5000,
+    "cache_size": -20000,
+    "mmap_size": 134217728,
+    "temp_store": "memory",
+}
+# ``int`` admite cualquier entero; el resto, solo los valores listados.
+VALORES_PERMITIDOS = {
+    "journal_mode": {"delete", "truncate", "persist", "memory", "wal", "off"},
+    "synchronous": {"off", "normal", "full", "extra"},
+    "busy_timeout": int,
+    "cache_size": int,
+    "mmap_size": int,
+    "temp_store": {"default", "file", "memory"},
+}
+MODOS_CHECKPOINT = ("passive", "full", "restart", "truncate")
+
+Checkpoint = namedtuple("Checkpoint", "bloqueado paginas_wal paginas_copiadas")
+
+
+def _validar(nombre, valor):
+    permitidos = VALORES_PERMITIDOS.get(nombre)
+    if permitidos is None:
+        raise ImproperlyConfigured(f"SQLITE_PRAGMAS: pragma no permitido: {nombre!r}.")
+    if valor is None:
+        return None
+    if permitidos is int:
+        if isinstance(valor, bool) or not isinstance(valor, int):
+            raise ImproperlyConfigured(f"SQLITE_PRAGMAS: {nombre} debe ser un entero, no {valor!r}.")
+        return valor
+    texto = str(valor).strip().lower()
+    if texto not in permitidos:
+        raise ImproperlyConfigured(
+            f"SQLITE_PRAGMAS: valor inválido para {nombre}: {valor!r}. Permitidos: {', '.join(sorted(permitidos))}."
+        )
+    return texto
+
+
+def pragmas():
+    """Pragmas configurados y validados; ``None`` deja el valor por defecto de SQLite."""
+    configurados = {**PRAGMAS_POR_DEFECTO, **getattr(settings, "SQLITE_PRAGMAS", {})}
+    return {nombre: _validar(nombre, valor) for nombre, valor in configurados.items()}
+
+
+def aplicar_perfil(conexion):
+    """Aplica los pragmas configurados a una conexión SQLite de Django."""
+    if conexion.vendor != "sqlite":
+        return
+    perfil = pragmas()
+    with conexion.cursor() as cursor:
+        for nombre, valor in perfil.items():
+            if valor is None:
+                continue
+            if nombre == "journal_mode" and conexion.is_in_memory_db():
+                # Las bases en memoria (tests) no admiten WAL.
+                continue
+            cursor.execute(f"PRAGMA {nombre} = {valor}")
+
+
+def checkpoint(modo="passive"):
+    """Copia el WAL al archivo principal; ``truncate`` además lo deja en cero bytes."""
+    if modo not in MODOS_CHECKPOINT:
+        raise ValueError(f"Modo de checkpoint inválido: {modo}.")
+    with connection.cursor() as cursor:
+        cursor.execute(f"PRAGMA wal_checkpoint({modo.upper()})")
+        return Checkpoint(*cursor.fetchone())
+
+
+def mantener(analizar=False, modo_checkpoint="passive", vacuum=False):
+    """
+    Mantenimiento periódico de la base. Devuelve las tareas ejecutadas en orden.
+
+    ``PRAGMA optimize`` siempre se ejecuta: solo analiza las tablas cuyas
+    estadísticas lo necesitan. ANALYZE completo y VACUUM son opcionales porque
+    bloquean la base mientras duran.
+    """
+    tareas = []
+    with connection.cursor() as cursor:
+        if analizar:
+            cursor.execute("ANALYZE")
+            tareas.append("ANALYZE")
+        cursor.execute("PRAGMA optimize")
+        tareas.append("PRAGMA optimize")
+        if vacuum:
+            cursor.execute("VACUUM")
+            tareas.append("VACUUM")
+    if modo_checkpoint:
+        tareas.append(f"wal_checkpoint({modo_checkpoint}): {checkpoint(modo_checkpoint)}")
+    return tareas
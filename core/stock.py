@@ -0,0 +1,184 @@
+"""
+Operaciones de inventario compartidas por los módulos de ventas y compras.
+
+Los items (flores y productos) se identifican con la clave ``(tipo_item, item_pk)``
+usada por los formularios de venta y compra.
+"""
+
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from flor.models import Flor
+from producto.models import Producto
+
+from .concurrencia import MAX_INTENTOS, ContencionStock, registrar_contencion
+
+
+MODELOS_ITEM = {
+    "FLOR": Flor,
+    "PRODUCTO": Producto,
+}
+
+ResultadoStock = namedtuple("ResultadoStock", ["clave", "delta", "suficiente", "nombre", "disponible"])
+
+
+class StockInsuficiente(ValueError):
+    """No se pudo aplicar el ajuste de stock de uno o más items."""
+
+    def __init__(self, resultados, contexto=None):
+        self.resultados = resultados
+        fallido = next((r for r in resultados.values() if not r.suficiente), None)
+        if fallido is None:
+            mensaje = "El stock cambió durante la operación. Intenta nuevamente."
+        elif fallido.disponible is None:
+            mensaje = "Uno de los items seleccionados ya no existe."
+        elif contexto:
+            mensaje = (
+                f"No hay stock suficiente para ajustar {fallido.nombre} en {contexto}. "
+                f"Disponible: {fallido.disponible}, requerido: {-fallido.delta}."
+            )
+        else:
+            mensaje = (
+                f"Stock insuficiente para {fallido.nombre}. "
+                f"Disponible: {fallido.disponible}, solicitado: {-fallido.delta}."
+            )
+        super().__init__(mensaje)
+
+
+def agrupar_cantidades(detalles, signo=1):
+    """Suma las cantidades de los detalles por ``(tipo_item, item_pk)``."""
+    cantidades = {}
+    for data in detalles:
+        clave = (data["tipo_item"], data["item_pk"])
+        cantidades[clave] = cantidades.get(clave, 0) + signo * data["cantidad"]
+    return cantidades
+
+
+def verificar_disponible(deltas, items, contexto=None):
+    """
+    Comprueba ``deltas`` contra el stock de instancias ya cargadas, sin consultar la base.
+
+    ``items`` es ``{(tipo_item, item_pk): instancia}``. Sirve para rechazar antes
+    de abrir la transacción; ``ajustar_stock`` sigue siendo la comprobación final.
+    """
+    resultados = {}
+    for clave, delta in deltas.items():
+        item = items.get(clave)
+        disponible = item.cantidad if item is not None else None
+        suficiente = disponible is not None and disponible + delta >= 0
+        resultados[clave] = ResultadoStock(clave, delta, suficiente, getattr(item, "nombre", None), disponible)
+    if not all(r.suficiente for r in resultados.values()):
+        raise StockInsuficiente(resultados, contexto)
+    return resultados
+
+
+def _caso_por_pk(valores):
+    return Case(
+        *[When(pk=pk, then=Value(valor)) for pk, valor in valores.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _aplicar_ajuste(modelo, por_pk):
+    """
+    Un solo UPDATE por tipo, condicionado a que ningún item quede en negativo.
+
+    Equivale a ``UPDATE ... SET cantidad = cantidad + delta, version = version + 1
+    WHERE id IN (...) AND cantidad >= -delta``. Devuelve las filas afectadas.
+    """
+    requeridos = {pk: -delta for pk, delta in por_pk.items() if delta < 0}
+    consulta = modelo.objects.filter(pk__in=sorted(por_pk))
+    if requeridos:
+        consulta = consulta.filter(cantidad__gte=_caso_por_pk(requeridos))
+    # ``version`` sube para que un save() de un formulario abierto antes no pise el stock.
+    return consulta.update(
+        cantidad=F("cantidad") + _caso_por_pk(por_pk),
+        version=F("version") + 1,
+        updated_at=timezone.now(),
+    )
+
+
+def _leer_stock(modelo, pks):
+    return {
+        pk: (nombre, cantidad)
+        for pk, nombre, cantidad in modelo.objects.filter(pk__in=pks).values_list("pk", "nombre", "cantidad")
+    }
+
+
+def _marcar_resultados(resultados, tipo_item, modelo, por_pk):
+    """Lee el stock vigente de ``por_pk`` y marca cada item. Devuelve ``True`` si a alguno le falta."""
+    encontrados = _leer_stock(modelo, list(por_pk))
+    faltante = False
+    for pk, delta in por_pk.items():
+        clave = (tipo_item, pk)
+        nombre, disponible = encontrados.get(pk, (None, None))
+        suficiente = disponible is not None and disponible + delta >= 0
+        resultados[clave] = ResultadoStock(clave, delta, suficiente, nombre, disponible)
+        faltante = faltante or not suficiente
+    return faltante
+
+
+def _intentos():
+    # En SQLite, dentro de una transacción (``escritura()``), el UPDATE ya tomó
+    # el candado de escritura de toda la base y lo conserva aunque se deshaga el
+    # savepoint: ninguna escritura puede colarse antes de la lectura y reintentar
+    # no cambiaría nada. Fuera de una transacción, o en motores con candados por
+    # fila, otra operación sí puede cambiar las filas entre el UPDATE y la lectura.
+    if connection.vendor == "sqlite" and connection.in_atomic_block:
+        return 1
+    return MAX_INTENTOS
+
+
+def ajustar_stock(deltas, contexto=None):
+    """
+    Aplica ``{(tipo_item, item_pk): delta}`` al stock con un UPDATE condicional por tipo.
+
+    Si cada UPDATE afecta todas sus filas basta una consulta por tipo, sin
+    lecturas previas. Si no, se deshace todo el ajuste y recién entonces se lee
+    el stock: si algún item no alcanza o no existe se lanza
+    ``StockInsuficiente`` con el resultado de cada item; si todos alcanzan, otra
+    transacción cambió las filas entre el UPDATE y la lectura y se repite hasta
+    ``MAX_INTENTOS`` veces antes de lanzar ``ContencionStock``. Dentro de una
+    transacción de SQLite eso no puede pasar y no se reintenta.
+    """
+    resultados = {
+        clave: ResultadoStock(clave, delta, True, None, None)
+        for clave, delta in deltas.items()
+        if delta
+    }
+    # Siempre el mismo orden (tipo según MODELOS_ITEM, luego pk ascendente): dos
+    # operaciones con items en común toman las filas en igual orden y no se
+    # bloquean mutuamente en motores con candados por fila.
+    por_tipo = {}
+    for (tipo_item, pk), delta in sorted(deltas.items()):
+        if delta:
+            por_tipo.setdefault(tipo_item, {})[pk] = delta
+
+    intentos = _intentos()
+    for intento in range(1, intentos + 1):
+        fallidos = {}
+        with transaction.atomic():
+            for tipo_item, modelo in MODELOS_ITEM.items():
+                por_pk = por_tipo.get(tipo_item)
+                if por_pk and _aplicar_ajuste(modelo, por_pk) != len(por_pk):
+                    fallidos[tipo_item] = por_pk
+                    transaction.set_rollback(True)
+                    break
+        if not fallidos:
+            return resultados
+
+        # Ya deshecho el ajuste, se lee el stock vigente para informar cada item.
+        for tipo_item, por_pk in fallidos.items():
+            if _marcar_resultados(resultados, tipo_item, MODELOS_ITEM[tipo_item], por_pk):
+                raise StockInsuficiente(resultados, contexto)
+        if intento < intentos:
+            registrar_contencion("reintentos")
+
+    registrar_contencion("agotados")
+    raise ContencionStock(
+        [resultados[(tipo_item, pk)].nombre or str(pk) for tipo_item, por_pk in fallidos.items() for pk in por_pk]
+    )
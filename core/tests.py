@@ -1,3 +1,820 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+from django.http import QueryDict
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from catalogo.models import Producto as ProductoCatalogo
+from categoria.models import Categoria
+from clientes.models import Cliente
+from compras.views import _filtrar_compras
+from flor.models import Flor
+from flor.views import FlorListView
+from producto.models import Producto
+from producto.views import ProductoListView
+from usuarios.models import Usuario
+from ventas.models import DetalleVenta, ResumenDiarioVenta, Venta
+
+from . import portada, stock, transacciones
+from .management.commands import importar_ventas
+from .busqueda import buscar_en_catalogo
+from .concurrencia import MAX_INTENTOS, ContencionStock, VersionDesactualizada, contadores_contencion, volcar_contencion
+from .idempotencia import SolicitudRepetida, completar_clave, registrar_clave
+from .models import ClaveIdempotencia, StockDiario, StockMovimiento
+from .movimientos import compactar, diferencias_con_contadores, stock_al
+from .portada import MARCA_CSRF, MARCA_MAS_VENDIDOS, contadores_portada
+from .ranking import mas_vendidos, mas_vendidos_en_cache
+from .sqlite import aplicar_perfil
+from .stock import StockInsuficiente, ajustar_stock
+from .transacciones import escritura
+
+
+class AjustarStockTests(TestCase):
+	def setUp(self):
+		self.flor = Flor.objects.create(nombre="Rosa Stock", precio=1000, cantidad=5, tipo_flor="rosa")
+		self.producto = Producto.objects.create(nombre="Globo Stock", precio=2000, cantidad=2, tipo_producto="globos")
+
+	def test_aplica_deltas_de_ambos_tipos(self):
+		resultados = ajustar_stock({("FLOR", self.flor.pk): -3, ("PRODUCTO", self.producto.pk): 4})
+
+		self.assertTrue(all(r.suficiente for r in resultados.values()))
+		self.flor.refresh_from_db()
+		self.producto.refresh_from_db()
+		self.assertEqual(self.flor.cantidad, 2)
+		self.assertEqual(self.producto.cantidad, 6)
+
+	def test_faltante_no_aplica_ningun_ajuste(self):
+		with self.assertRaises(StockInsuficiente) as ctx:
+			ajustar_stock({("FLOR", self.flor.pk): -1, ("PRODUCTO", self.producto.pk): -3})
+
+		resultados = ctx.exception.resultados
+		self.assertTrue(resultados[("FLOR", self.flor.pk)].suficiente)
+		self.assertFalse(resultados[("PRODUCTO", self.producto.pk)].suficiente)
+		self.assertEqual(resultados[("PRODUCTO", self.producto.pk)].disponible, 2)
+		self.assertIn("Globo Stock", str(ctx.exception))
+
+		self.flor.refresh_from_db()
+		self.producto.refresh_from_db()
+		self.assertEqual(self.flor.cantidad, 5)
+		self.assertEqual(self.producto.cantidad, 2)
+
+	def test_actualiza_en_orden_de_pk(self):
+		otra = Flor.objects.create(nombre="Clavel Stock", precio=500, cantidad=4, tipo_flor="clavel")
+		with CaptureQueriesContext(connection) as consultas:
+			ajustar_stock({("PRODUCTO", self.producto.pk): 1, ("FLOR", otra.pk): -1, ("FLOR", self.flor.pk): -1})
+
+		updates = [q["sql"] for q in consultas.captured_queries if q["sql"].startswith("UPDATE")]
+		self.assertEqual(len(updates), 2)
+		self.assertIn(f"IN ({self.flor.pk}, {otra.pk})", updates[0])
+		self.assertTrue(updates[1].startswith('UPDATE "producto_producto"'))
+
+	def test_item_inexistente(self):
+		with self.assertRaises(StockInsuficiente) as ctx:
+			ajustar_stock({("FLOR", self.flor.pk + 100): -1})
+
+		self.assertEqual(str(ctx.exception), "Uno de los items seleccionados ya no existe.")
+
+
+def _escritura_concurrente(veces):
+	"""Simula que otra transacción deja la fila sin stock al momento del UPDATE y lo repone antes de la lectura."""
+	aplicar = stock._aplicar_ajuste
+	llamadas = []
+
+	def _aplicar(modelo, por_pk):
+		llamadas.append(por_pk)
+		if len(llamadas) <= veces:
+			return 0
+		return aplicar(modelo, por_pk)
+
+	return mock.patch.object(stock, "_aplicar_ajuste", _aplicar), llamadas
+
+
+class ConcurrenciaStockTests(TestCase):
+	def setUp(self):
+		self.flor = Flor.objects.create(nombre="Rosa Version", precio=1000, cantidad=5, tipo_flor="rosa")
+		self.clave = ("FLOR", self.flor.pk)
+
+	def test_un_solo_update_sin_lecturas(self):
+		with CaptureQueriesContext(connection) as consultas:
+			ajustar_stock({self.clave: -2})
+
+		sentencias = [q["sql"].split()[0] for q in consultas.captured_queries]
+		self.assertEqual([s for s in sentencias if s in ("SELECT", "UPDATE")], ["UPDATE"])
+
+	def test_dentro_de_una_transaccion_sqlite_no_reintenta(self):
+		# El UPDATE ya tiene el candado de la base: reintentar no cambiaría la lectura.
+		simulacion, llamadas = _escritura_concurrente(veces=1)
+		with simulacion, self.assertRaises(ContencionStock), self.assertLogs("core.concurrencia", "WARNING"):
+			ajustar_stock({self.clave: -2})
+
+		self.assertEqual(len(llamadas), 1)
+		volcar_contencion()
+		self.assertEqual(contadores_contencion(), {"reintentos": 0, "agotados": 1})
+
+	def test_guardar_item_desactualizado_no_pisa_el_stock(self):
+		editado = Flor.objects.get(pk=self.flor.pk)
+		ajustar_stock({self.clave: -1})
+
+		editado.precio = 1200
+		with self.assertRaises(VersionDesactualizada), transaction.atomic():
+			editado.save()
+
+		self.flor.refresh_from_db()
+		self.assertEqual((self.flor.cantidad, self.flor.precio), (4, 1000))
+
+
+class ReintentosStockTests(TransactionTestCase):
+	"""Sin transacción abierta, otra escritura puede colarse entre el UPDATE y la lectura."""
+
+	def setUp(self):
+		self.flor = Flor.objects.create(nombre="Rosa Reintento", precio=1000, cantidad=5, tipo_flor="rosa")
+		self.clave = ("FLOR", self.flor.pk)
+
+	def test_reintenta_si_el_stock_alcanzaba_al_leer(self):
+		simulacion, llamadas = _escritura_concurrente(veces=1)
+		with simulacion:
+			ajustar_stock({self.clave: -2})
+
+		self.assertEqual(len(llamadas), 2)
+		self.flor.refresh_from_db()
+		self.assertEqual((self.flor.cantidad, self.flor.version), (3, 1))
+		self.assertEqual(contadores_contencion(), {"reintentos": 1, "agotados": 0})
+
+	def test_contencion_persistente_no_aplica_el_ajuste(self):
+		simulacion, llamadas = _escritura_concurrente(veces=10)
+		with simulacion, self.assertRaises(ContencionStock) as ctx:
+			with self.assertLogs("core.concurrencia", "WARNING") as logs:
+				ajustar_stock({self.clave: -2})
+
+		self.assertEqual(len(llamadas), MAX_INTENTOS)
+		self.assertIn("abandonado por contención", logs.output[0])
+		self.assertIn("Rosa Reintento", str(ctx.exception))
+		self.flor.refresh_from_db()
+		self.assertEqual(self.flor.cantidad, 5)
+		self.assertEqual(contadores_contencion(), {"reintentos": MAX_INTENTOS - 1, "agotados": 1})
+
+
+class TransaccionEscrituraTests(TransactionTestCase):
+	def setUp(self):
+		self.flor = Flor.objects.create(nombre="Rosa Escritura", precio=1000, cantidad=5, tipo_flor="rosa")
+
+	def _ocupada(self, veces):
+		abrir = transacciones._begin_inmediato
+		intentos = []
+
+		@contextmanager
+		def _abrir(conexion):
+			intentos.append(conexion)
+			if len(intentos) <= veces:
+				raise OperationalError("database is locked")
+			with abrir(conexion):
+				yield
+
+		return mock.patch.object(transacciones, "_begin_inmediato", _abrir)
+
+	def test_abre_con_begin_immediate_y_reintenta_si_la_base_esta_ocupada(self):
+		with self._ocupada(veces=2), mock.patch.object(transacciones.time, "sleep") as dormir:
+			with self.assertLogs("core.transacciones", "WARNING") as logs, CaptureQueriesContext(connection) as consultas:
+				with escritura():
+					ajustar_stock({("FLOR", self.flor.pk): -2})
+
+		self.assertEqual(dormir.call_count, 2)
+		self.assertEqual(len(logs.records), 2)
+		self.assertIn("reintento 2", logs.output[1])
+		self.assertEqual(consultas[0]["sql"], "BEGIN IMMEDIATE")
+		self.flor.refresh_from_db()
+		self.assertEqual(self.flor.cantidad, 3)
+
+	def test_contadores_de_contencion_sobreviven_al_rollback(self):
+		with mock.patch.object(stock, "_aplicar_ajuste", return_value=0), self.assertLogs("core.concurrencia", "WARNING"):
+			with self.assertRaises(ContencionStock), escritura():
+				ajustar_stock({("FLOR", self.flor.pk): -2})
+
+		self.assertEqual(contadores_contencion(), {"reintentos": 0, "agotados": 1})
+
+	def test_se_rinde_al_agotar_el_plazo(self):
+		with self._ocupada(veces=10), self.assertLogs("core.transacciones", "ERROR"), self.assertRaises(OperationalError):
+			with escritura(plazo=0):
+				ajustar_stock({("FLOR", self.flor.pk): -2})
+
+		self.assertFalse(connection.in_atomic_block)
+		self.flor.refresh_from_db()
+		self.assertEqual(self.flor.cantidad, 5)
+
+
+class PerfilSqliteTests(TransactionTestCase):
+	def _pragma(self, nombre):
+		with connection.cursor() as cursor:
+			cursor.execute(f"PRAGMA {nombre}")
+			return cursor.fetchone()[0]
+
+	def test_la_conexion_recibe_el_perfil(self):
+		valores = {nombre: self._pragma(nombre) for nombre in ("synchronous", "busy_timeout", "temp_store", "cache_size")}
+		self.assertEqual(valores, {"synchronous": 1, "busy_timeout": 5000, "temp_store": 2, "cache_size": -20000})
+
+	def test_perfil_configurable(self):
+		with self.settings(SQLITE_PRAGMAS={"busy_timeout": 1234, "cache_size": None}):
+			aplicar_perfil(connection)
+			self.assertEqual(self._pragma("busy_timeout"), 1234)
+		aplicar_perfil(connection)
+		self.assertEqual(self._pragma("busy_timeout"), 5000)
+
+	def test_rechaza_pragmas_o_valores_no_permitidos(self):
+		for configuracion in (
+			{"journal_mode": "wal; DROP TABLE flor_flor"},
+			{"synchronous": "rapido"},
+			{"busy_timeout": "5000"},
+			{"locking_mode": "exclusive"},
+		):
+			with self.subTest(configuracion=configuracion), self.settings(SQLITE_PRAGMAS=configuracion):
+				with self.assertRaises(ImproperlyConfigured):
+					aplicar_perfil(connection)
+
+	def test_comando_de_mantenimiento(self):
+		salida = StringIO()
+		call_command("mantener_sqlite", "--analyze", "--checkpoint", "truncate", stdout=salida)
+
+		texto = salida.getvalue()
+		self.assertIn("ANALYZE", texto)
+		self.assertIn("PRAGMA optimize", texto)
+		self.assertIn("wal_checkpoint(truncate)", texto)
+		self.assertIn("Mantenimiento completado: 3 tarea(s).", texto)
+
+
+class PlanesConsultaTests(TestCase):
+	"""Las consultas principales de los listados no deben recorrer la tabla completa."""
+
+	def assertSinRecorridoCompleto(self, plan, tabla):
+		completos = [linea for linea in plan.splitlines() if re.search(rf"\bSCAN (TABLE )?{tabla}$", linea)]
+		self.assertFalse(completos, f"Recorrido completo de {tabla}:\n{plan}")
+
+	def assertUsaIndice(self, queryset, tabla):
+		plan = queryset.explain()
+		self.assertSinRecorridoCompleto(plan, tabla)
+		self.assertIn(tabla, plan)
+
+	def _lista(self, vista, params):
+		instancia = vista()
+		instancia.request = RequestFactory().get("/", params)
+		return instancia.get_queryset()
+
+	def _consultas_listado_ventas(self, params):
+		with CaptureQueriesContext(connection) as consultas:
+			response = self.client.get(reverse("ventas:listar_venta"), params)
+		self.assertEqual(response.status_code, 200)
+		return response, [q["sql"] for q in consultas.captured_queries if q["sql"].startswith("SELECT") and "ventas_venta" in q["sql"]]
+
+	@mock.patch("ventas.views.VENTAS_POR_PAGINA", 1)
+	def test_listado_de_ventas(self):
+		# Se revisan las consultas que hace la vista (KPI, página con num_items y
+		# cursor), no una reconstrucción del queryset.
+		usuario = Usuario.objects.create_user(
+			username="planes_tester", password="test12345", documento="1234591", email="planes@example.com", is_staff=True
+		)
+		self.client.force_login(usuario)
+		cliente = Cliente.objects.create(documento="7654800", tipo_documento="CC", nombre="Ana", apellido="Planes")
+		for dias in (0, 1):
+			Venta.objects.create(cliente=cliente, tipo_venta="EI", fecha=date.today() - timedelta(days=dias), forma_pago="efectivo")
+
+		for params in (
+			{},
+			{"q": "ana"},
+			{"q": "7654800"},
+			{"cliente_nombre": "ana plan"},
+			{"fecha_desde": "2024-01-01", "fecha_hasta": "2030-01-31"},
+			{"fecha_desde": "2024-01-01", "precio_min": "0"},
+			{"precio_max": "5000"},
+		):
+			primera, consultas = self._consultas_listado_ventas(params)
+			siguiente, consultas_cursor = self._consultas_listado_ventas({**params, "despues": primera.context["cursor_siguiente"]})
+			self.assertEqual(len(siguiente.context["ventas"]), 1, params)
+			self.assertTrue(consultas and consultas_cursor, params)
+			for sql in consultas + consultas_cursor:
+				with self.subTest(params=params, sql=sql[:80]):
+					with connection.cursor() as cursor:
+						cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+						plan = "\n".join(fila[-1] for fila in cursor.fetchall())
+					self.assertSinRecorridoCompleto(plan, "ventas_venta")
+
+	def test_listado_de_compras(self):
+		for params in ("fecha_desde=2024-01-01", "fecha_desde=2024-01-01&precio_max=1000", "precio_min=1000"):
+			with self.subTest(params=params):
+				compras, _ = _filtrar_compras(QueryDict(params))
+				self.assertUsaIndice(compras, "compras_compra")
+
+	def test_listados_de_inventario(self):
+		for vista, tabla, tipo in ((FlorListView, "flor_flor", "rosa"), (ProductoListView, "producto_producto", "otros")):
+			for params in ({"tipo": tipo}, {"tipo": tipo, "nivel_stock": "alto"}, {"nivel_stock": "bajo"}, {"nivel_stock": "medio"}):
+				with self.subTest(tabla=tabla, params=params):
+					self.assertUsaIndice(self._lista(vista, params), tabla)
+
+	def test_stock_bajo_usa_su_indice_parcial(self):
+		for vista, app in ((FlorListView, "flor"), (ProductoListView, "producto")):
+			with self.subTest(app=app):
+				self.assertIn(f"USING INDEX {app}_stock_bajo", self._lista(vista, {"nivel_stock": "bajo"}).explain())
+
+	def test_catalogo_activo_por_categoria(self):
+		productos = ProductoCatalogo.objects.select_related("categoria").filter(categoria_id=1, activo=True).order_by("-id")
+		self.assertUsaIndice(productos, "catalogo_producto")
+
+
+class CachePortadaTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.url = reverse("core:landing")
+		categoria = Categoria.objects.create(nombre="Ramos Portada")
+		self.producto = ProductoCatalogo.objects.create(nombre="Ramo Primavera", categoria=categoria, precio=1000, tamano="M")
+
+	def _renombrar(self, nombre):
+		with self.captureOnCommitCallbacks(execute=True):
+			self.producto.nombre = nombre
+			self.producto.save()
+
+	def test_segunda_visita_sale_de_la_cache_sin_consultas(self):
+		self.client.get(self.url)
+		# Solo se leen las versiones de las tablas para el ETag.
+		with self.assertNumQueries(1):
+			response = self.client.get(self.url)
+
+		self.assertContains(response, "Ramo Primavera")
+		self.assertNotContains(response, MARCA_CSRF)
+		self.assertIn("csrftoken", response.cookies)
+		self.assertEqual(contadores_portada(), {"aciertos": 1, "fallos": 1, "obsoletas": 0})
+
+	def test_cambio_en_el_catalogo_invalida_la_portada(self):
+		self.client.get(self.url)
+		self._renombrar("Ramo Otoño")
+
+		self.assertContains(self.client.get(self.url), "Ramo Otoño")
+		self.assertEqual(contadores_portada()["fallos"], 2)
+
+	def test_cambio_sin_senales_tambien_invalida(self):
+		# Como lo vería otro proceso: su caché local no recibe la señal, pero la
+		# generación sale de las versiones de tablas que mantienen los triggers.
+		self.client.get(self.url)
+		ProductoCatalogo.objects.filter(pk=self.producto.pk).update(nombre="Ramo Invierno")
+
+		self.assertContains(self.client.get(self.url), "Ramo Invierno")
+
+	def test_ventas_no_invalidan_la_portada_pero_si_los_mas_vendidos(self):
+		cliente = Cliente.objects.create(documento="7654702", tipo_documento="CC", nombre="Cliente", apellido="Portada")
+		rosa = Flor.objects.create(nombre="Rosa Portada", precio=1000, cantidad=5, tipo_flor="rosa")
+		self.assertNotContains(self.client.get(self.url), "Rosa Portada")
+
+		ajustar_stock({("FLOR", rosa.pk): -1})
+		venta = Venta.objects.create(cliente=cliente, tipo_venta="EI", fecha=timezone.localdate(), forma_pago="efectivo")
+		DetalleVenta.objects.create(venta=venta, tipo_item="FLOR", flor=rosa, cantidad=1, precio=1000)
+
+		response = self.client.get(self.url)
+		self.assertContains(response, "Rosa Portada")
+		self.assertNotContains(response, MARCA_MAS_VENDIDOS)
+		self.assertEqual(contadores_portada(), {"aciertos": 1, "fallos": 1, "obsoletas": 0})
+
+	def test_copia_obsoleta_se_sirve_mientras_otra_peticion_regenera(self):
+		self.client.get(self.url)
+		self._renombrar("Ramo Otoño")
+		cache.add(f"{portada._clave_variante(('', ''))}:regenerando", 1)
+
+		self.assertContains(self.client.get(self.url), "Ramo Primavera")
+		self.assertEqual(contadores_portada(), {"aciertos": 0, "fallos": 1, "obsoletas": 1})
+
+	def test_variantes_y_visitantes_con_sesion(self):
+		self.client.get(self.url)
+		self.assertNotContains(self.client.get(self.url, {"busqueda": "Otoño"}), "Ramo Primavera")
+
+		usuario = Usuario.objects.create_user(
+			username="portada_tester", password="test12345", documento="1234590", email="portada@example.com"
+		)
+		self.client.force_login(usuario)
+		self.client.get(self.url)
+		self.assertEqual(contadores_portada(), {"aciertos": 0, "fallos": 2, "obsoletas": 0})
+
+
+class RespuestasCondicionalesTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.flor = Flor.objects.create(nombre="Rosa Condicional", precio=1000, cantidad=5, tipo_flor="rosa")
+		self.url = reverse("ventas:buscar_arreglo")
+
+	def test_buscar_arreglo_responde_304_hasta_que_cambia_el_stock(self):
+		primera = self.client.get(self.url, {"q": "rosa"})
+		etag = primera["ETag"]
+		self.assertTrue(etag.startswith('"'))
+		self.assertIn("Last-Modified", primera)
+		self.assertIn("no-cache", primera["Cache-Control"])
+
+		with self.assertNumQueries(1):
+			repetida = self.client.get(self.url, {"q": "rosa"}, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(repetida.status_code, 304)
+		self.assertNotEqual(self.client.get(self.url, {"q": "tulipan"}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+		antes = Flor.objects.get(pk=self.flor.pk).updated_at
+		ajustar_stock({("FLOR", self.flor.pk): -1})
+		cambiada = self.client.get(self.url, {"q": "rosa"}, HTTP_IF_NONE_MATCH=etag)
+
+		self.assertEqual(cambiada.status_code, 200)
+		self.assertNotEqual(cambiada["ETag"], etag)
+		self.assertEqual(json.loads(cambiada.content)["arreglos"][0]["stock"], 4)
+		self.assertGreater(Flor.objects.get(pk=self.flor.pk).updated_at, antes)
+
+	def test_verificar_documento_es_privado(self):
+		respuesta = self.client.get(reverse("clientes:verificar_documento"), {"documento": "123"})
+		self.assertIn("private", respuesta["Cache-Control"])
+		repetida = self.client.get(reverse("clientes:verificar_documento"), {"documento": "123"}, HTTP_IF_NONE_MATCH=respuesta["ETag"])
+		self.assertEqual(repetida.status_code, 304)
+
+	def test_portada_responde_304_al_mismo_visitante(self):
+		url = reverse("core:landing")
+		primera = self.client.get(url)
+		self.assertTrue(primera["ETag"].startswith('W/"'))
+
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=primera["ETag"]).status_code, 304)
+		self.client.cookies.clear()
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=primera["ETag"]).status_code, 200)
+
+
+class ReconciliarTotalesTests(TestCase):
+	def setUp(self):
+		cliente = Cliente.objects.create(documento="7654400", tipo_documento="CC", nombre="Cliente", apellido="Totales")
+		flor = Flor.objects.create(nombre="Rosa Totales", precio=1000, cantidad=5, tipo_flor="rosa")
+		self.venta = Venta.objects.create(
+			cliente=cliente,
+			tipo_venta="EI",
+			fecha=date.today(),
+			forma_pago="efectivo",
+			mano_obra=500,
+			con_domicilio=True,
+			precio_envio=300,
+		)
+		DetalleVenta.objects.create(venta=self.venta, tipo_item="FLOR", flor=flor, cantidad=2, precio=1000)
+		Venta.objects.filter(pk=self.venta.pk).update(subtotal=1, total=1)
+
+	def test_corrige_y_reporta_desfasados(self):
+		salida = StringIO()
+		call_command("reconciliar_totales", stdout=salida)
+
+		self.assertIn(f"Venta #{self.venta.pk}", salida.getvalue())
+		self.venta.refresh_from_db()
+		self.assertEqual(float(self.venta.subtotal), 2000.0)
+		self.assertEqual(float(self.venta.total), 2800.0)
+		self.assertEqual(float(ResumenDiarioVenta.objects.get().total), 2800.0)
+
+		salida = StringIO()
+		call_command("reconciliar_totales", stdout=salida)
+		self.assertIn("Venta: 0 registro(s)", salida.getvalue())
+
+	def test_solo_reportar_no_modifica(self):
+		call_command("reconciliar_totales", "--solo-reportar", stdout=StringIO())
+
+		self.venta.refresh_from_db()
+		self.assertEqual(float(self.venta.total), 1.0)
+
+
+class ReindexarInventarioTests(TestCase):
+	def test_reconstruye_indice(self):
+		Flor.objects.create(nombre="Girasol", precio=1000, cantidad=1, tipo_flor="girasol")
+		salida = StringIO()
+		call_command("reindexar_inventario", stdout=salida)
+
+		self.assertIn("1 item(s)", salida.getvalue())
+
+
+class BusquedaCatalogoTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.url = reverse("core:landing")
+		self.categoria = Categoria.objects.create(nombre="Orquídeas")
+		self.ramo = ProductoCatalogo.objects.create(
+			nombre="Ramo Tropical", categoria=self.categoria, precio=1000, tamano="Grande",
+			descripcion="Incluye una orquídea blanca",
+		)
+		self.orquidea = ProductoCatalogo.objects.create(
+			nombre="Orquídea Phalaenopsis", categoria=self.categoria, precio=2000, tamano="Mediano",
+		)
+
+	def _buscar(self, texto):
+		return list(self.client.get(self.url, {"busqueda": texto}).context["productos"])
+
+	def test_busca_sin_tildes_por_prefijo_y_ordena_por_relevancia(self):
+		self.assertEqual(self._buscar("orqui"), [self.orquidea, self.ramo])
+		self.assertEqual(self._buscar("blanca"), [self.ramo])
+		self.assertEqual(self._buscar("grand"), [self.ramo])
+
+	def test_una_sola_consulta_al_indice(self):
+		with CaptureQueriesContext(connection) as consultas:
+			self._buscar("orqui")
+
+		self.assertEqual(sum("MATCH" in q["sql"] for q in consultas.captured_queries), 1)
+
+	def test_corta_en_el_limite_despues_de_filtrar(self):
+		inactivos = [
+			ProductoCatalogo.objects.create(nombre=f"Orquídea Inactiva {i}", categoria=self.categoria, precio=1000, tamano="M", activo=False)
+			for i in range(3)
+		]
+		productos = ProductoCatalogo.objects.filter(activo=True)
+
+		# Los inactivos coinciden mejor por nombre, pero no ocupan lugares del límite.
+		self.assertEqual(list(buscar_en_catalogo(productos, "orqui", limite=2)), [self.orquidea, self.ramo])
+		self.assertEqual(list(buscar_en_catalogo(productos, "orqui", limite=1)), [self.orquidea])
+		self.assertEqual(len(buscar_en_catalogo(ProductoCatalogo.objects.all(), "inactiva")), len(inactivos))
+
+	def test_sigue_la_categoria_renombrada(self):
+		self.categoria.nombre = "Suculentas"
+		self.categoria.save()
+
+		self.assertEqual(self._buscar("suculen"), [self.orquidea, self.ramo])
+
+	def test_excluye_inactivos_y_eliminados(self):
+		self.ramo.activo = False
+		self.ramo.save()
+		self.orquidea.delete()
+
+		self.assertEqual(self._buscar("orquidea"), [])
+
+	def test_comando_reconstruye_indice(self):
+		salida = StringIO()
+		call_command("reindexar_catalogo", stdout=salida)
+
+		self.assertIn("2 producto(s)", salida.getvalue())
+		self.assertEqual(self._buscar("phalaen"), [self.orquidea])
+
+
+class ImportarVentasTests(TestCase):
+	def setUp(self):
+		self.cliente = Cliente.objects.create(documento="7654500", tipo_documento="CC", nombre="Cliente", apellido="Importado")
+		self.flor = Flor.objects.create(nombre="Rosa Importada", precio=1000, cantidad=5, tipo_flor="rosa")
+		self.producto = Producto.objects.create(nombre="Globo Importado", precio=2000, cantidad=10, tipo_producto="globos")
+		self.directorio = tempfile.TemporaryDirectory()
+		self.addCleanup(self.directorio.cleanup)
+
+	def _archivo(self, nombre, contenido):
+		ruta = os.path.join(self.directorio.name, nombre)
+		with open(ruta, "w", encoding="utf-8") as archivo:
+			archivo.write(contenido)
+		return ruta
+
+	def test_importa_csv_y_rechaza_filas_con_error(self):
+		ruta = self._archivo(
+			"ventas.csv",
+			"referencia,documento_cliente,fecha,tipo_venta,forma_pago,item,cantidad,precio\n"
+			f"A1,7654500,2024-05-01,EI,efectivo,F-{self.flor.pk},2,\n"
+			"A1,7654500,2024-05-01,EI,efectivo,globo importado,1,2500\n"
+			f"A2,1111111,2024-05-01,EI,efectivo,F-{self.flor.pk},1,\n"
+			f"A3,7654500,02/05/2024,Bajo Pedido,Nequi,F-{self.flor.pk},4,\n",
+		)
+		salida = StringIO()
+		call_command("importar_ventas", ruta, stdout=salida)
+
+		venta = Venta.objects.get()
+		self.assertEqual(venta.detalles.count(), 2)
+		self.assertEqual(float(venta.total), 4500.0)
+		self.flor.refresh_from_db()
+		self.producto.refresh_from_db()
+		self.assertEqual(self.flor.cantidad, 3)
+		self.assertEqual(self.producto.cantidad, 9)
+		self.assertEqual(diferencias_con_contadores(), [])
+
+		with open(os.path.join(self.directorio.name, "ventas.rechazos.csv"), encoding="utf-8") as archivo:
+			rechazos = list(csv.DictReader(archivo))
+		self.assertEqual([fila["referencia"] for fila in rechazos], ["A2", "A3"])
+		self.assertIn("1111111", rechazos[0]["error"])
+		self.assertIn("Stock insuficiente", rechazos[1]["error"])
+		self.assertIn("Ventas rechazadas: 2", salida.getvalue())
+
+	def test_importa_ndjson_en_lotes(self):
+		lineas = [
+			{
+				"documento_cliente": "7654500",
+				"fecha": "2024-05-01",
+				"items": [{"item": f"P-{self.producto.pk}", "cantidad": 2}],
+			}
+			for _ in range(3)
+		]
+		ruta = self._archivo("ventas.ndjson", "\n".join(json.dumps(linea) for linea in lineas) + "\n{roto\n")
+
+		call_command("importar_ventas", ruta, "--lote", "2", stdout=StringIO())
+
+		self.assertEqual(Venta.objects.count(), 3)
+		self.producto.refresh_from_db()
+		self.assertEqual(self.producto.cantidad, 4)
+		with open(os.path.join(self.directorio.name, "ventas.rechazos.ndjson"), encoding="utf-8") as archivo:
+			rechazo = json.loads(archivo.readline())
+		self.assertEqual(rechazo["_error"], "JSON inválido.")
+
+	def test_resuelve_nombres_con_mayusculas_acentuadas(self):
+		peluche = Producto.objects.create(nombre="ÑANDÚ DE PELUCHE", precio=3000, cantidad=2, tipo_producto="peluches")
+		ruta = self._archivo(
+			"ventas.csv",
+			"documento_cliente,fecha,item,cantidad\n"
+			"7654500,2024-05-01,ñandú de peluche,1\n",
+		)
+		call_command("importar_ventas", ruta, stdout=StringIO())
+
+		self.assertEqual(Venta.objects.get().detalles.get().producto, peluche)
+
+	def test_indice_de_nombres_se_arma_una_vez_por_ejecucion(self):
+		ruta = self._archivo(
+			"ventas.csv",
+			"documento_cliente,fecha,item,cantidad\n"
+			"7654500,2024-05-01,rosa importada,1\n"
+			"7654500,2024-05-02,ROSA IMPORTADA,1\n",
+		)
+		with CaptureQueriesContext(connection) as consultas:
+			call_command("importar_ventas", ruta, "--lote", "1", stdout=StringIO())
+
+		self.assertEqual(Venta.objects.count(), 2)
+		# Los lotes solo leen por pk; el recorrido de nombres (sin WHERE) se hace una vez por tabla.
+		completas = [q["sql"] for q in consultas.captured_queries if q["sql"].startswith("SELECT") and "flor_flor" in q["sql"] and "WHERE" not in q["sql"]]
+		self.assertEqual(len(completas), 1)
+
+	def test_stock_agotado_al_guardar_rechaza_solo_las_ventas_afectadas(self):
+		ruta = self._archivo(
+			"ventas.csv",
+			"referencia,documento_cliente,fecha,item,cantidad\n"
+			f"A1,7654500,2024-05-01,F-{self.flor.pk},3\n"
+			f"A2,7654500,2024-05-01,P-{self.producto.pk},1\n",
+		)
+		buscar = importar_ventas.Command._buscar_referencias
+		llamadas = []
+
+		def _buscar(comando, validas):
+			referencias = buscar(comando, validas)
+			if not llamadas:
+				# Otra venta se lleva las flores entre la lectura y el ajuste.
+				Flor.objects.filter(pk=self.flor.pk).update(cantidad=1)
+			llamadas.append(validas)
+			return referencias
+
+		with mock.patch.object(importar_ventas.Command, "_buscar_referencias", _buscar):
+			call_command("importar_ventas", ruta, stdout=StringIO())
+
+		self.assertEqual(Venta.objects.get().detalles.get().producto, self.producto)
+		with open(os.path.join(self.directorio.name, "ventas.rechazos.csv"), encoding="utf-8") as archivo:
+			rechazos = list(csv.DictReader(archivo))
+		self.assertEqual([fila["referencia"] for fila in rechazos], ["A1"])
+		self.assertIn("Rosa Importada al guardar el lote. Disponible: 1, solicitado: 3", rechazos[0]["error"])
+
+	def test_simular_no_guarda(self):
+		ruta = self._archivo(
+			"ventas.csv",
+			"documento_cliente,fecha,item,cantidad\n"
+			f"7654500,2024-05-01,F-{self.flor.pk},1\n",
+		)
+		salida = StringIO()
+		call_command("importar_ventas", ruta, "--simular", stdout=salida)
+
+		self.assertIn("Ventas validadas: 1", salida.getvalue())
+		self.assertFalse(Venta.objects.exists())
+		self.flor.refresh_from_db()
+		self.assertEqual(self.flor.cantidad, 5)
+
+
+class StockMovimientoTests(TestCase):
+	def setUp(self):
+		self.flor = Flor.objects.create(nombre="Rosa Libro", precio=1000, cantidad=10, tipo_flor="rosa")
+		self.clave = ("FLOR", self.flor.pk)
+
+	def _movimiento(self, fecha, delta):
+		StockMovimiento.objects.create(tipo_item="FLOR", item_id=self.flor.pk, delta=delta, motivo="AJUSTE", fecha=fecha)
+
+	def test_stock_a_una_fecha_lee_foto_y_cola(self):
+		hoy = timezone.localdate()
+		StockMovimiento.objects.update(fecha=hoy - timedelta(days=10))
+		self._movimiento(hoy - timedelta(days=5), -4)
+		self._movimiento(hoy - timedelta(days=2), 3)
+
+		self.assertEqual(compactar(hasta=hoy - timedelta(days=3)), 2)
+		self.assertEqual(
+			list(StockDiario.objects.order_by("fecha").values_list("cantidad", flat=True)), [10, 6]
+		)
+		self._movimiento(hoy, -1)
+
+		with self.assertNumQueries(3):
+			self.assertEqual(stock_al(hoy - timedelta(days=7), {self.clave}), {self.clave: 10})
+		self.assertEqual(stock_al(hoy - timedelta(days=4))[self.clave], 6)
+		self.assertEqual(stock_al(hoy - timedelta(days=1))[self.clave], 9)
+		self.assertEqual(stock_al(hoy)[self.clave], 8)
+
+		# Compactar de nuevo solo agrega los días pendientes.
+		self.assertEqual(compactar(hasta=hoy - timedelta(days=1)), 1)
+		self.assertEqual(stock_al(hoy)[self.clave], 8)
+
+	def test_no_compacta_el_dia_en_curso(self):
+		hoy = timezone.localdate()
+		with self.assertRaises(CommandError):
+			call_command("compactar_stock", "--hasta", hoy.isoformat(), stdout=StringIO())
+		with self.assertRaises(ValueError):
+			compactar(hasta=hoy + timedelta(days=1))
+
+		self.assertFalse(StockDiario.objects.exists())
+
+	def test_verificar_stock_informa_y_ajusta_desfases(self):
+		ajustar_stock({self.clave: -3})
+		salida = StringIO()
+		call_command("verificar_stock", stdout=salida)
+		self.assertIn("contador 7, libro 10 (diferencia -3)", salida.getvalue())
+
+		call_command("verificar_stock", "--registrar-ajustes", stdout=StringIO())
+		self.assertEqual(diferencias_con_contadores(), [])
+		self.assertEqual(
+			list(StockMovimiento.objects.order_by("pk").values_list("motivo", "delta")), [("INICIAL", 10), ("AJUSTE", -3)]
+		)
+
+	def test_edicion_manual_del_item_queda_en_el_libro(self):
+		self.flor.cantidad = 12
+		self.flor.save()
+		self.assertEqual(stock_al(timezone.localdate())[self.clave], 12)
+
+		with self.assertRaises(ValueError):
+			StockMovimiento.objects.first().delete()
+
+
+class ClaveIdempotenciaTests(TestCase):
+	def test_clave_repetida_y_purga(self):
+		with transaction.atomic():
+			registro = registrar_clave("prueba", "clave-0001")
+			completar_clave(registro, 42)
+
+		with self.assertRaises(SolicitudRepetida) as ctx:
+			with transaction.atomic():
+				registrar_clave("prueba", "clave-0001")
+		self.assertEqual(ctx.exception.resultado_id, 42)
+
+		ClaveIdempotencia.objects.filter(pk=registro.pk).update(created_at=timezone.now() - timedelta(days=2))
+		registrar_clave("prueba", "clave-0002")
+		salida = StringIO()
+		call_command("purgar_claves_idempotencia", stdout=salida)
+
+		self.assertIn("eliminadas: 1", salida.getvalue())
+		self.assertEqual(list(ClaveIdempotencia.objects.values_list("clave", flat=True)), ["clave-0002"])
+
+
+class DashboardResumenTests(TestCase):
+	def test_dashboard_lee_resumen_diario(self):
+		usuario = Usuario.objects.create_user(
+			username="dashboard_tester", password="test12345", documento="1234580", email="dashboard@example.com"
+		)
+		usuario.is_staff = True
+		usuario.save(update_fields=["is_staff"])
+		self.client.force_login(usuario)
+		cliente = Cliente.objects.create(documento="7654600", tipo_documento="CC", nombre="Cliente", apellido="Panel")
+		Venta.objects.create(cliente=cliente, tipo_venta="EI", fecha=timezone.localdate(), forma_pago="efectivo", mano_obra=1500)
+
+		response = self.client.get(reverse("core:dashboard"))
+
+		self.assertEqual(response.context["ventas_mes"], {"num_ventas": 1, "total": Decimal("1500.00"), "subtotal": 0, "costo": 0})
+		self.assertEqual(response.context["margen_mes"], 0)
+		self.assertEqual(response.context["compras_mes"], {"num_compras": 0, "total": 0})
+
+
+class MasVendidosTests(TestCase):
+	def test_ranking_por_ventana(self):
+		cliente = Cliente.objects.create(documento="7654700", tipo_documento="CC", nombre="Cliente", apellido="Ranking")
+		rosa = Flor.objects.create(nombre="Rosa Ranking", precio=1000, cantidad=50, tipo_flor="rosa")
+		globo = Producto.objects.create(nombre="Globo Ranking", precio=2000, cantidad=50, tipo_producto="globos")
+		hoy = date.today()
+		antigua = Venta.objects.create(cliente=cliente, tipo_venta="EI", fecha=hoy - timedelta(days=60), forma_pago="efectivo")
+		reciente = Venta.objects.create(cliente=cliente, tipo_venta="EI", fecha=hoy, forma_pago="efectivo")
+		DetalleVenta.objects.create(venta=antigua, tipo_item="FLOR", flor=rosa, cantidad=10, precio=1000)
+		DetalleVenta.objects.create(venta=reciente, tipo_item="FLOR", flor=rosa, cantidad=1, precio=1000)
+		DetalleVenta.objects.create(venta=reciente, tipo_item="PRODUCTO", producto=globo, cantidad=3, precio=2000)
+
+		historico = mas_vendidos()
+		self.assertEqual([(r["nombre"], r["unidades"]) for r in historico], [("Rosa Ranking", 11), ("Globo Ranking", 3)])
+
+		with self.assertNumQueries(3):
+			semana = mas_vendidos(dias=7, hoy=hoy)
+		self.assertEqual([(r["nombre"], r["unidades"]) for r in semana], [("Globo Ranking", 3), ("Rosa Ranking", 1)])
+		self.assertEqual(semana[0]["ingresos"], Decimal("6000.00"))
+
+	def test_ranking_en_cache_sigue_las_ventas(self):
+		cache.clear()
+		cliente = Cliente.objects.create(documento="7654701", tipo_documento="CC", nombre="Cliente", apellido="Ranking")
+		rosa = Flor.objects.create(nombre="Rosa Cache", precio=1000, cantidad=50, tipo_flor="rosa")
+		venta = Venta.objects.create(cliente=cliente, tipo_venta="EI", fecha=date.today(), forma_pago="efectivo")
+		DetalleVenta.objects.create(venta=venta, tipo_item="FLOR", flor=rosa, cantidad=2, precio=1000)
+		self.assertEqual([r["unidades"] for r in mas_vendidos_en_cache(dias=30)], [2])
+
+		# Solo se leen las versiones de las tablas.
+		with self.assertNumQueries(1):
+			self.assertEqual([r["unidades"] for r in mas_vendidos_en_cache(dias=30)], [2])
+
+		DetalleVenta.objects.create(venta=venta, tipo_item="FLOR", flor=rosa, cantidad=3, precio=1000)
+		self.assertEqual([r["unidades"] for r in mas_vendidos_en_cache(dias=30)], [5])
@@ -0,0 +1,109 @@
+"""
+Transacciones de escritura para las rutas que mueven stock.
+
+En SQLite ``transaction.atomic()`` abre la transacción con un ``BEGIN``
+diferido: toma el candado de escritura recién en el primer UPDATE, a mitad de
+la operación, y si otra caja ya lo tiene falla con "database is locked" sin
+poder esperar. ``escritura()`` abre la transacción con ``BEGIN IMMEDIATE``,
+de modo que el candado se pide al entrar, antes de leer nada. Si la base está
+ocupada el ``BEGIN`` se reintenta con una espera exponencial con jitter hasta
+agotar el plazo; cada reintento queda en el log con su espera.
+
+El cuerpo del bloque se ejecuta una sola vez: solo se reintenta la apertura,
+así que no hace falta que la operación sea repetible. En otros motores, o
+dentro de una transacción ya abierta, ``escritura()`` equivale a ``atomic()``.
+"""
+
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+from .concurrencia import volcar_contencion
+
+
+logger = logging.getLogger(__name__)
+
+PLAZO_ESCRITURA = 10.0
+ESPERA_INICIAL = 0.05
+ESPERA_MAXIMA = 1.0
+
+
+def _base_ocupada(exc):
+    mensaje = str(exc).lower()
+    return "locked" in mensaje or "busy" in mensaje
+
+
+@contextmanager
+def _begin_inmediato(conexion):
+    # Django 4.2 no permite elegir el modo del BEGIN (``transaction_mode`` llega
+    # en 5.1); se reemplaza el método que lo emite solo mientras se abre el bloque.
+    conexion._start_transaction_under_autocommit = lambda: conexion.cursor().execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    finally:
+        del conexion._start_transaction_under_autocommit
+
+
+def _espera(intento):
+    return min(ESPERA_MAXIMA, ESPERA_INICIAL * 2 ** (intento - 1)) * random.uniform(0.5, 1.5)
+
+
+@contextmanager
+def escritura(using=None, plazo=PLAZO_ESCRITURA):
+    """Como ``transaction.atomic()``, pero tomando el candado de escritura al entrar."""
+    alias = using or DEFAULT_DB_ALIAS
+    conexion = connections[alias]
+    externa = not conexion.in_atomic_block
+    try:
+        if conexion.vendor != "sqlite" or not externa:
+            with transaction.atomic(using=alias):
+                yield
+        else:
+            with _escritura_inmediata(conexion, alias, plazo):
+                yield
+    finally:
+        if externa:
+            # Tras un rollback los contadores de contención no se volcaron al confirmar.
+            volcar_contencion(conexion)
+
+
+@contextmanager
+def _escritura_inmediata(conexion, alias, plazo):
+    limite = time.monotonic() + plazo
+    intento = 0
+    with ExitStack() as pila:
+        while True:
+            try:
+                with _begin_inmediato(conexion):
+                    pila.enter_context(transaction.atomic(using=alias))
+                break
+            except OperationalError as exc:
+                if not _base_ocupada(exc):
+                    raise
+                intento += 1
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    logger.error("Base ocupada: se abandona la transacción de escritura tras %s intentos.", intento)
+                    raise
+                espera = min(_espera(intento), restante)
+                logger.warning("Base ocupada; reintento %s de la transacción de escritura en %.3f s.", intento, espera)
+                time.sleep(espera)
+        yield
+
+
+def transaccion_escritura(funcion=None, *, using=None, plazo=PLAZO_ESCRITURA):
+    """Decorador equivalente a ejecutar ``funcion`` dentro de ``escritura()``."""
+
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with escritura(using=using, plazo=plazo):
+                return funcion(*args, **kwargs)
+
+        return envoltura
+
+    return decorador(funcion) if funcion else decorador
@@ -0,0 +1,149 @@
+"""
+Versiones por tabla para respuestas condicionales (ETag / Last-Modified).
+
+Cada tabla de ``MODELOS_VERSIONADOS`` tiene triggers de SQLite que en cada
+INSERT, UPDATE o DELETE suben su contador en ``VersionTabla`` y guardan la
+hora del cambio; así también cuentan los UPDATE masivos de stock, que no pasan
+por señales. Las vistas firman la respuesta con las versiones de las tablas
+que leen antes de consultarlas: si el navegador ya tiene esa versión se
+responde 304 sin tocar los datos.
+
+SQLite descarta los triggers cuando una migración reconstruye la tabla; por
+eso ``asegurar_triggers`` se llama también tras cada ``migrate``. En otros
+motores no hay triggers y las vistas responden siempre completo.
+"""
+
+import hashlib
+from collections import namedtuple
+
+from django.apps import apps
+from django.db import connection
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from .models import VersionTabla
+
+
+MODELOS_VERSIONADOS = (
+    "catalogo.Producto",
+    "categoria.Categoria",
+    "flor.Flor",
+    "producto.Producto",
+    "clientes.Cliente",
+    "proveedores.Proveedor",
+    "usuarios.Usuario",
+    "ventas.VentaItemDiaria",
+)
+EVENTOS_TRIGGER = (("ai", "INSERT"), ("au", "UPDATE"), ("ad", "DELETE"))
+
+EstadoTablas = namedtuple("EstadoTablas", ["firma", "actualizado"])
+
+
+def _tabla(etiqueta):
+    return apps.get_model(etiqueta)._meta.db_table
+
+
+def _nombre_trigger(tabla, sufijo):
+    return f"core_version_{tabla}_{sufijo}"
+
+
+def _sql_trigger(tabla, sufijo, evento):
+    return (
+        f"CREATE TRIGGER IF NOT EXISTS {_nombre_trigger(tabla, sufijo)} AFTER {evento} ON {tabla} BEGIN "
+        f"INSERT INTO {VersionTabla._meta.db_table} (tabla, version, actualizado) "
+        f"VALUES ('{tabla}', 1, strftime('%Y-%m-%d %H:%M:%f', 'now')) "
+        "ON CONFLICT (tabla) DO UPDATE SET version = version + 1, actualizado = excluded.actualizado; END"
+    )
+
+
+def asegurar_triggers(conexion):
+    """Crea los triggers que falten en las tablas versionadas ya existentes."""
+    if conexion.vendor != "sqlite":
+        return
+    existentes = set(conexion.introspection.table_names())
+    if VersionTabla._meta.db_table not in existentes:
+        return
+    with conexion.cursor() as cursor:
+        for etiqueta in MODELOS_VERSIONADOS:
+            tabla = _tabla(etiqueta)
+            if tabla not in existentes:
+                continue
+            for sufijo, evento in EVENTOS_TRIGGER:
+                cursor.execute(_sql_trigger(tabla, sufijo, evento))
+
+
+def eliminar_triggers(conexion):
+    if conexion.vendor != "sqlite":
+        return
+    with conexion.cursor() as cursor:
+        for etiqueta in MODELOS_VERSIONADOS:
+            for sufijo, _ in EVENTOS_TRIGGER:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {_nombre_trigger(_tabla(etiqueta), sufijo)}")
+
+
+def estado_tablas(etiquetas, request=None):
+    """
+    ``EstadoTablas`` de los modelos ``etiquetas`` o ``None`` fuera de SQLite.
+
+    La firma incluye la hora del último cambio además del contador: si la base
+    se restaura desde un respaldo los contadores retroceden, pero la hora no se
+    repite. Las filas leídas se guardan en ``request``: otra llamada con las
+    mismas tablas, o con parte de ellas, no vuelve a consultar.
+    """
+    if connection.vendor != "sqlite":
+        return None
+    tablas = [_tabla(etiqueta) for etiqueta in sorted(etiquetas)]
+    memo = getattr(request, "_estado_tablas", {})
+    faltantes = [tabla for tabla in tablas if tabla not in memo]
+    if faltantes:
+        memo.update(dict.fromkeys(faltantes))
+        memo.update(
+            (tabla, (version, actualizado))
+            for tabla, version, actualizado in VersionTabla.objects.filter(tabla__in=faltantes).values_list(
+                "tabla", "version", "actualizado"
+            )
+        )
+        if request is not None:
+            request._estado_tablas = memo
+    filas = {tabla: memo[tabla] for tabla in tablas if memo[tabla] is not None}
+    firma = "|".join(
+        f"{tabla}:{filas[tabla][0]}:{filas[tabla][1].isoformat()}" if tabla in filas else f"{tabla}:0"
+        for tabla in tablas
+    )
+    actualizado = max((actualizado for _, actualizado in filas.values()), default=None)
+    return EstadoTablas(firma, actualizado)
+
+
+def respuesta_condicional(*etiquetas, privado=False, debil=False, extra=None):
+    """
+    Decorador de vistas GET de solo lectura: ETag y Last-Modified según las versiones de ``etiquetas``.
+
+    El ETag cubre la URL completa; ``extra(request)`` agrega a la firma lo que
+    además cambie la respuesta. ``privado`` impide que la guarden cachés
+    compartidas; ``debil`` marca el ETag como débil cuando el cuerpo no es
+    idéntico byte a byte entre respuestas equivalentes.
+    """
+
+    def etag(request, *args, **kwargs):
+        estado = estado_tablas(etiquetas, request)
+        if estado is None:
+            return None
+        partes = [estado.firma, request.get_full_path()]
+        if extra:
+            partes.append(extra(request))
+        firma = hashlib.sha1("\n".join(partes).encode()).hexdigest()
+        valor = f'"{firma}"'
+        return f"W/{valor}" if debil else valor
+
+    def ultima_modificacion(request, *args, **kwargs):
+        estado = estado_tablas(etiquetas, request)
+        return estado.actualizado if estado else None
+
+    control = {"private": True} if privado else {}
+
+    def decorador(vista):
+        return cache_control(no_cache=True, **control)(
+            condition(etag_func=etag, last_modified_func=ultima_modificacion)(vista)
+        )
+
+    return decorador
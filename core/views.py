@@ -10,29 +10,62 @@ from .forms import ContactoForm
 from django.template.loader import render_to_string
 
 from categoria.models import Categoria
+from compras.models import ResumenDiarioCompra
+from ventas.models import ResumenDiarioVenta
+
+from .busqueda import buscar_en_catalogo
+from .concurrencia import contadores_contencion
+from .costos import margen
+from .portada import (
+    MARCA_CSRF,
+    MARCA_MAS_VENDIDOS,
+    MODELOS_PORTADA,
+    contadores_portada,
+    es_cacheable,
+    firma_visitante,
+    servir_portada,
+)
+from .ranking import MODELOS_MAS_VENDIDOS, mas_vendidos, mas_vendidos_en_cache
+from .resumenes import totales_periodo
+from .versiones import respuesta_condicional
 
 # Create your views here.
 
-def index(request):
-    busqueda = request.GET.get('busqueda', '')
-    categoria_id = (request.GET.get('categoria') or '').strip()
+def _mas_vendidos_portada(request):
+    ranking = mas_vendidos_en_cache(limite=4, dias=30, request=request)
+    return render_to_string('core/mas_vendidos.html', {'mas_vendidos': ranking}, request=request)
+
 
+def _render_portada(request, busqueda, categoria_id, form, **extra):
     categorias = Categoria.objects.filter(activo=True).order_by('nombre')
     categoria_seleccionada = None
     if categoria_id.isdigit():
         categoria_seleccionada = categorias.filter(pk=int(categoria_id)).first()
 
-    if busqueda:
-        productos = Producto.objects.filter(
-            activo=True,
-            categoria__activo=True,
-            nombre__icontains=busqueda,
-        )
-    else:
-        productos = Producto.objects.filter(activo=True, categoria__activo=True)
-
+    productos = Producto.objects.filter(activo=True, categoria__activo=True)
     if categoria_seleccionada:
         productos = productos.filter(categoria=categoria_seleccionada)
+    if busqueda:
+        productos = buscar_en_catalogo(productos, busqueda)
+
+    if 'mas_vendidos' not in extra:
+        extra['mas_vendidos'] = _mas_vendidos_portada(request)
+
+    context = {
+        'productos': productos,
+        'busqueda': busqueda,
+        'categorias': categorias,
+        'categoria_seleccionada': categoria_seleccionada,
+        'form': form,
+        **extra,
+    }
+
+    return render(request, 'core/index.html', context)
+
+
+def index(request):
+    busqueda = request.GET.get('busqueda', '')
+    categoria_id = (request.GET.get('categoria') or '').strip()
 
     if request.method == "POST":
         form = ContactoForm(request.POST)
@@ -66,16 +99,26 @@ def index(request):
             return redirect('core:landing')
     else:
         form = ContactoForm()
+        if es_cacheable(request):
+            return _portada_anonima(request, busqueda, categoria_id, form)
 
-    context = {
-        'productos': productos,
-        'busqueda': busqueda,
-		'categorias': categorias,
-		'categoria_seleccionada': categoria_seleccionada,
-        'form': form
-    }
+    return _render_portada(request, busqueda, categoria_id, form)
 
-    return render(request, 'core/index.html', context)
+
+# El token CSRF enmascarado cambia en cada respuesta: el ETag es débil.
+@respuesta_condicional(*MODELOS_PORTADA, *MODELOS_MAS_VENDIDOS, privado=True, debil=True, extra=firma_visitante)
+def _portada_anonima(request, busqueda, categoria_id, form):
+    # Las categorías no numéricas se ignoran: comparten la variante sin categoría.
+    variante = (busqueda, categoria_id if categoria_id.isdigit() else '')
+    # Los más vendidos cambian con cada venta: no forman parte de la página guardada.
+    return servir_portada(
+        request,
+        variante,
+        lambda: _render_portada(
+            request, busqueda, categoria_id, form, csrf_token=MARCA_CSRF, mas_vendidos=MARCA_MAS_VENDIDOS
+        ),
+        rellenos={MARCA_MAS_VENDIDOS: _mas_vendidos_portada},
+    )
 
 
 def PanelAdmin_base(request):
@@ -101,6 +144,13 @@ def dashboard_view(request):
     # Últimos usuarios registrados
     ultimos_usuarios = User.objects.order_by('-date_joined')[:5]
 
+    # Ventas y compras del mes desde los resúmenes diarios (unas pocas filas por día)
+    hoy = timezone.localdate()
+    inicio_mes = hoy.replace(day=1)
+    ventas_mes = totales_periodo(ResumenDiarioVenta, inicio_mes, hoy, ["num_ventas", "total", "subtotal", "costo"])
+    margen_mes, margen_mes_porcentaje = margen(ventas_mes["subtotal"], ventas_mes["costo"])
+    compras_mes = totales_periodo(ResumenDiarioCompra, inicio_mes, hoy, ["num_compras", "total"])
+
     context = {
         'titulo': 'Panel de Administración',
         'total_usuarios': total_usuarios,
@@ -108,6 +158,13 @@ def dashboard_view(request):
         'usuarios_staff': usuarios_staff,
         'nuevos_usuarios_mes': nuevos_usuarios_mes,
         'ultimos_usuarios': ultimos_usuarios,
+        'ventas_mes': ventas_mes,
+        'compras_mes': compras_mes,
+        'margen_mes': margen_mes,
+        'margen_mes_porcentaje': margen_mes_porcentaje,
+        'mas_vendidos': mas_vendidos(limite=5, dias=30),
+        'contencion_stock': contadores_contencion(),
+        'cache_portada': contadores_portada(),
     }
     return render(request, 'admin/dashboard.html', context)
 
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-18 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flor', '0002_alter_flor_descripcion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flor',
+            name='costo_promedio',
+            field=models.DecimalField(decimal_places=4, default=0, editable=False, max_digits=12),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-18 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flor', '0003_costo_promedio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flor',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
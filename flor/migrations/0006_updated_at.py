@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-18 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flor', '0005_indices_listado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flor',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.27 on 2026-10-18 09:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flor', '0006_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flor',
+            index=models.Index(condition=models.Q(('cantidad__lte', 10)), fields=['id'], name='flor_stock_bajo'),
+        ),
+    ]
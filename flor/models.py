@@ -1,4 +1,11 @@
 from django.db import models
+from django.db.models import Q
+
+from core.concurrencia import ModeloVersionado
+
+
+# Límite del filtro "stock bajo" del listado.
+STOCK_BAJO = 10
 
 
 TIPO_FLORES = [
@@ -15,13 +22,17 @@ TIPO_FLORES = [
 ]
 
 
-class Flor(models.Model):
+class Flor(ModeloVersionado):
     nombre = models.CharField(max_length=100)
     descripcion = models.TextField(max_length=500, blank=True, default="Sin descripcion")
     precio = models.DecimalField(max_digits=10, decimal_places=2)
     cantidad = models.PositiveIntegerField(default=0)
+    # Promedio ponderado de las compras; lo mantiene core.costos.
+    costo_promedio = models.DecimalField(max_digits=12, decimal_places=4, default=0, editable=False)
     tipo_flor = models.CharField(max_length=20, choices=TIPO_FLORES, default="otras")
     imagen = models.ImageField(upload_to='flores_fotos/', blank=True, null=True)
+    # Los UPDATE masivos de stock y costo lo actualizan explícitamente.
+    updated_at = models.DateTimeField(auto_now=True)
 
     def save(self, *args, **kwargs):
         if not (self.descripcion or "").strip():
@@ -31,4 +42,15 @@ class Flor(models.Model):
     def __str__(self):
         return self.nombre
 
+    class Meta:
+        # Filtros del listado: tipo con o sin nivel de stock, y nivel de stock solo.
+        # El stock bajo tiene un índice parcial propio: sin STAT4, con un solo
+        # límite sobre cantidad SQLite prefiere recorrer la tabla en orden de id;
+        # este índice contiene solo esas filas y ya en orden de id.
+        indexes = [
+            models.Index(fields=["tipo_flor", "cantidad"], name="flor_tipo_cantidad"),
+            models.Index(fields=["cantidad"], name="flor_cantidad"),
+            models.Index(fields=["id"], condition=Q(cantidad__lte=STOCK_BAJO), name="flor_stock_bajo"),
+        ]
+
 # Create your models here.
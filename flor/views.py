@@ -5,11 +5,15 @@ from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.core.files.base import ContentFile
 from django.db.models import Q, Sum
+from django.shortcuts import redirect
 from django.urls import reverse_lazy
 from django.views import generic
 
+from core.concurrencia import VersionDesactualizada
+from core.transacciones import escritura
+
 from .forms import FlorForm
-from .models import Flor
+from .models import STOCK_BAJO, Flor
 
 
 def _parse_decimal(valor):
@@ -72,7 +76,7 @@ class FlorListView(LoginRequiredMixin, UserPassesTestMixin, generic.ListView):
             queryset = queryset.filter(tipo_flor=self.tipo)
 
         if self.nivel_stock == 'bajo':
-            queryset = queryset.filter(cantidad__lte=10)
+            queryset = queryset.filter(cantidad__lte=STOCK_BAJO)
         elif self.nivel_stock == 'medio':
             queryset = queryset.filter(cantidad__gte=11, cantidad__lte=30)
         elif self.nivel_stock == 'alto':
@@ -157,8 +161,15 @@ class FlorUpdateView(LoginRequiredMixin, UserPassesTestMixin, generic.UpdateView
         imagen = _procesar_imagen(self.request, form.cleaned_data.get('nombre') or 'flor')
         if imagen:
             form.instance.imagen = imagen
+        try:
+            with escritura():
+                respuesta = super().form_valid(form)
+        except VersionDesactualizada as exc:
+            # Se recarga el formulario con los datos y la versión vigentes.
+            messages.error(self.request, str(exc))
+            return redirect(self.request.path)
         messages.success(self.request, "Flor actualizada correctamente.")
-        return super().form_valid(form)
+        return respuesta
 
 
 class FlorDetailView(LoginRequiredMixin, UserPassesTestMixin, generic.DetailView):
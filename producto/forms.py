@@ -6,6 +6,8 @@ from .models import Producto
 
 
 class ProductoForm(forms.ModelForm):
+    version = forms.IntegerField(widget=forms.HiddenInput, required=False)
+
     class Meta:
         model = Producto
         fields = ["nombre", "tipo_producto", "descripcion", "precio", "cantidad", "imagen"]
@@ -48,6 +50,17 @@ class ProductoForm(forms.ModelForm):
             raise forms.ValidationError("El precio debe ser mayor a 0.")
         return valor
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["version"].initial = self.instance.version
+
     def clean_descripcion(self):
         descripcion = (self.cleaned_data.get("descripcion") or "").strip()
         return descripcion or "Sin descripcion"
+
+    def save(self, commit=True):
+        # Se guarda sobre la versión que se mostró: si una venta o compra cambió
+        # el item mientras tanto, save() lanza VersionDesactualizada.
+        if self.cleaned_data.get("version") is not None:
+            self.instance.version = self.cleaned_data["version"]
+        return super().save(commit)
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.27 on 2026-10-18 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0004_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['tipo_producto', 'cantidad'], name='producto_tipo_cantidad'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['cantidad'], name='producto_cantidad'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.27 on 2026-10-18 09:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0006_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('cantidad__lte', 10)), fields=['id'], name='producto_stock_bajo'),
+        ),
+    ]
@@ -9,6 +9,7 @@ from .models import Proveedor
 from .forms import ProveedorForm
 from django.utils import timezone
 from .utils import render_to_pdf
+from core.versiones import respuesta_condicional
 
 
 @login_required
@@ -152,6 +153,7 @@ class ReporteProveedoresPDF(View):
         return render_to_pdf('proveedores/reporte.html', data)
 
 @login_required
+@respuesta_condicional('proveedores.Proveedor', privado=True)
 def verificar_documento(request):
     """Vista AJAX para verificar si un documento de proveedor ya existe."""
     documento = request.GET.get('documento', '')
@@ -1,9 +1,15 @@
+import sqlite3
+import tempfile
+from pathlib import Path
+
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
 from django.urls import reverse
 
 from django.contrib.auth import get_user_model
 
+from .views import SQLITE_TIMEOUT_POR_DEFECTO, _sqlite_backup_to_file, _sqlite_restore_from_file, _sqlite_timeout
+
 
 class BackupModuloTests(TestCase):
 	def setUp(self):
@@ -47,3 +53,56 @@ class BackupModuloTests(TestCase):
 
 		self.assertEqual(response.status_code, 302)
 		self.assertRedirects(response, reverse('usuarios:perfil'))
+
+
+class BackupWalTests(TestCase):
+	def setUp(self):
+		directorio = tempfile.TemporaryDirectory()
+		self.addCleanup(directorio.cleanup)
+		self.dir = Path(directorio.name)
+		self.base = self.dir / 'base.sqlite3'
+		# Conexion abierta sin checkpoint automatico: las filas quedan solo en el WAL.
+		self.conn = sqlite3.connect(str(self.base))
+		self.addCleanup(self.conn.close)
+		self.conn.execute('PRAGMA journal_mode=WAL;')
+		self.conn.execute('PRAGMA wal_autocheckpoint=0;')
+		self.conn.execute('CREATE TABLE nota (texto TEXT);')
+		self.conn.execute("INSERT INTO nota VALUES ('original');")
+		self.conn.commit()
+
+	def _leer(self, path):
+		conn = sqlite3.connect(str(path))
+		try:
+			return conn.execute('SELECT texto FROM nota;').fetchall(), conn.execute('PRAGMA journal_mode;').fetchone()[0]
+		finally:
+			conn.close()
+
+	def test_backup_incluye_lo_que_esta_en_el_wal(self):
+		respaldo = self.dir / 'respaldo.sqlite3'
+		_sqlite_backup_to_file(self.base, respaldo)
+
+		self.assertEqual(self._leer(respaldo), ([('original',)], 'delete'))
+		self.assertFalse(Path(f'{respaldo}-wal').exists())
+
+	def test_restaurar_reemplaza_la_base_aunque_tenga_wal_pendiente(self):
+		respaldo = self.dir / 'respaldo.sqlite3'
+		conn = sqlite3.connect(str(respaldo))
+		conn.execute('CREATE TABLE nota (texto TEXT);')
+		conn.execute("INSERT INTO nota VALUES ('restaurada');")
+		conn.commit()
+		conn.close()
+
+		_sqlite_restore_from_file(respaldo, self.base)
+
+		self.assertEqual(self.conn.execute('SELECT texto FROM nota;').fetchall(), [('restaurada',)])
+		self.assertEqual(self._leer(self.base), ([('restaurada',)], 'wal'))
+
+	def test_backup_sin_busy_timeout_usa_la_espera_por_defecto(self):
+		with self.settings(SQLITE_PRAGMAS={'busy_timeout': None}):
+			self.assertEqual(_sqlite_timeout(), SQLITE_TIMEOUT_POR_DEFECTO)
+			respaldo = self.dir / 'respaldo.sqlite3'
+			_sqlite_backup_to_file(self.base, respaldo)
+
+		self.assertEqual(self._leer(respaldo), ([('original',)], 'delete'))
+		with self.settings(SQLITE_PRAGMAS={'busy_timeout': 2500}):
+			self.assertEqual(_sqlite_timeout(), 2.5)
@@ -1,4 +1,3 @@
-import shutil
 import sqlite3
 from datetime import datetime
 from pathlib import Path
@@ -16,6 +15,9 @@ from django.conf import settings
 from django.template.loader import render_to_string
 from django.db import connections
 
+from core.sqlite import pragmas
+from core.versiones import respuesta_condicional
+
 from .forms import RegistroForm, LoginForm, EditarPerfilForm
 from .utils import build_login_message, build_form_messages
 from .decorators import panel_login_required, superadmin_required
@@ -42,12 +44,42 @@ def _backup_directory():
     return backup_dir
 
 
+# Espera por defecto de sqlite3.connect() y de Django cuando el perfil no fija busy_timeout.
+SQLITE_TIMEOUT_POR_DEFECTO = 5.0
+
+
+def _sqlite_timeout():
+    busy_timeout = pragmas().get('busy_timeout')
+    if busy_timeout is None:
+        return SQLITE_TIMEOUT_POR_DEFECTO
+    return busy_timeout / 1000
+
+
 def _sqlite_backup_to_file(source_path: Path, destination_path: Path):
-    source_conn = sqlite3.connect(str(source_path))
+    # La API de backup lee una instantanea consistente que incluye el WAL;
+    # copiar el archivo principal dejaria fuera lo que aun no paso por checkpoint.
+    source_conn = sqlite3.connect(str(source_path), timeout=_sqlite_timeout())
+    try:
+        destination_conn = sqlite3.connect(str(destination_path), timeout=_sqlite_timeout())
+        try:
+            source_conn.backup(destination_conn)
+            # El respaldo queda en un solo archivo aunque la base original use WAL.
+            destination_conn.execute('PRAGMA journal_mode=DELETE;')
+        finally:
+            destination_conn.close()
+    finally:
+        source_conn.close()
+
+
+def _sqlite_restore_from_file(source_path: Path, destination_path: Path):
+    # Restaurar con la API de backup y no sobrescribiendo el archivo: los -wal/-shm
+    # de la base actual se aplicarian sobre el archivo restaurado y lo corromperian.
+    source_conn = sqlite3.connect(str(source_path), timeout=_sqlite_timeout())
     try:
-        destination_conn = sqlite3.connect(str(destination_path))
+        destination_conn = sqlite3.connect(str(destination_path), timeout=_sqlite_timeout())
         try:
             source_conn.backup(destination_conn)
+            destination_conn.execute('PRAGMA wal_checkpoint(TRUNCATE);')
         finally:
             destination_conn.close()
     finally:
@@ -208,6 +240,7 @@ def panel_inactivo_view(request):
     return render(request, 'usuarios/panel_inactivo.html')
 
 
+@respuesta_condicional('usuarios.Usuario', privado=True)
 def validar_usuario_documento_view(request):
     valor = (request.GET.get('q') or '').strip()
 
@@ -359,7 +392,7 @@ def restaurar_backup_db_view(request):
         _sqlite_backup_to_file(db_path, emergency_path)
 
         connections.close_all()
-        shutil.copy2(tmp_path, db_path)
+        _sqlite_restore_from_file(tmp_path, db_path)
 
         messages.success(
             request,
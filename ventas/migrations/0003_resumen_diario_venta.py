@@ -0,0 +1,74 @@
+# Generated by Django 4.2.27 on 2026-10-18 08:29
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def poblar_resumen(apps, schema_editor):
+    Venta = apps.get_model('ventas', 'Venta')
+    ResumenDiarioVenta = apps.get_model('ventas', 'ResumenDiarioVenta')
+    filas = (
+        Venta.objects.order_by()
+        .values('fecha', 'forma_pago', 'tipo_venta')
+        .annotate(
+            r_num_ventas=models.Count('pk'),
+            r_subtotal=models.Sum('subtotal'),
+            r_total=models.Sum('total'),
+            r_mano_obra=models.Sum('mano_obra'),
+            r_precio_envio=models.Sum(models.Case(
+                models.When(con_domicilio=True, then=models.F('precio_envio')),
+                default=models.Value(Decimal('0')),
+                output_field=models.DecimalField(max_digits=14, decimal_places=2),
+            )),
+        )
+    )
+    ResumenDiarioVenta.objects.bulk_create(
+        (
+            ResumenDiarioVenta(
+                fecha=fila['fecha'],
+                forma_pago=fila['forma_pago'],
+                tipo_venta=fila['tipo_venta'],
+                num_ventas=fila['r_num_ventas'],
+                subtotal=fila['r_subtotal'],
+                total=fila['r_total'],
+                mano_obra=fila['r_mano_obra'],
+                precio_envio=fila['r_precio_envio'],
+            )
+            for fila in filas
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0002_venta_nombre_domiciliario_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiarioVenta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('forma_pago', models.CharField(choices=[('efectivo', 'Efectivo'), ('tarjeta', 'Tarjeta'), ('transferencia', 'Transferencia'), ('nequi', 'Nequi'), ('daviplata', 'Daviplata')], max_length=30)),
+                ('tipo_venta', models.CharField(choices=[('BP', 'Bajo Pedido'), ('EI', 'Entrega Inmediata')], max_length=20)),
+                ('num_ventas', models.IntegerField(default=0)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('mano_obra', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('precio_envio', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Resumen diario de ventas',
+                'verbose_name_plural': 'Resúmenes diarios de ventas',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='resumendiarioventa',
+            constraint=models.UniqueConstraint(fields=('fecha', 'forma_pago', 'tipo_venta'), name='ventas_resumen_diario_unico'),
+        ),
+        migrations.RunPython(poblar_resumen, migrations.RunPython.noop),
+    ]
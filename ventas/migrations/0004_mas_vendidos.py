@@ -0,0 +1,90 @@
+# Generated by Django 4.2.27 on 2026-10-18 08:33
+
+from django.db import migrations, models
+
+
+def poblar_mas_vendidos(apps, schema_editor):
+    DetalleVenta = apps.get_model('ventas', 'DetalleVenta')
+    VentaItemDiaria = apps.get_model('ventas', 'VentaItemDiaria')
+    VentaItemTotal = apps.get_model('ventas', 'VentaItemTotal')
+    filas = (
+        DetalleVenta.objects.order_by()
+        .values('venta__fecha', 'tipo_item', 'flor_id', 'producto_id')
+        .annotate(r_unidades=models.Sum('cantidad'), r_ingresos=models.Sum('subtotal'))
+    )
+    diario, total = [], {}
+    for fila in filas:
+        item_pk = fila['flor_id'] if fila['tipo_item'] == 'FLOR' else fila['producto_id']
+        if not item_pk:
+            continue
+        diario.append(VentaItemDiaria(
+            fecha=fila['venta__fecha'],
+            tipo_item=fila['tipo_item'],
+            item_id=item_pk,
+            unidades=fila['r_unidades'],
+            ingresos=fila['r_ingresos'],
+        ))
+        acumulado = total.setdefault(
+            (fila['tipo_item'], item_pk),
+            VentaItemTotal(tipo_item=fila['tipo_item'], item_id=item_pk, unidades=0, ingresos=0),
+        )
+        acumulado.unidades += fila['r_unidades']
+        acumulado.ingresos += fila['r_ingresos']
+        if acumulado.ultima_venta is None or fila['venta__fecha'] > acumulado.ultima_venta:
+            acumulado.ultima_venta = fila['venta__fecha']
+    VentaItemDiaria.objects.bulk_create(diario, batch_size=500)
+    VentaItemTotal.objects.bulk_create(total.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0003_resumen_diario_venta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaItemDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo_item', models.CharField(choices=[('FLOR', 'Flor'), ('PRODUCTO', 'Producto')], max_length=20)),
+                ('item_id', models.BigIntegerField()),
+                ('unidades', models.IntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Venta diaria por item',
+                'verbose_name_plural': 'Ventas diarias por item',
+            },
+        ),
+        migrations.CreateModel(
+            name='VentaItemTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_item', models.CharField(choices=[('FLOR', 'Flor'), ('PRODUCTO', 'Producto')], max_length=20)),
+                ('item_id', models.BigIntegerField()),
+                ('unidades', models.IntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('ultima_venta', models.DateField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Total vendido por item',
+                'verbose_name_plural': 'Totales vendidos por item',
+                'indexes': [models.Index(fields=['-unidades'], name='ventas_item_total_unidades')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='ventaitemtotal',
+            constraint=models.UniqueConstraint(fields=('tipo_item', 'item_id'), name='ventas_item_total_unico'),
+        ),
+        migrations.AddIndex(
+            model_name='ventaitemdiaria',
+            index=models.Index(fields=['fecha'], name='ventas_item_diaria_fecha'),
+        ),
+        migrations.AddConstraint(
+            model_name='ventaitemdiaria',
+            constraint=models.UniqueConstraint(fields=('tipo_item', 'item_id', 'fecha'), name='ventas_item_diaria_unica'),
+        ),
+        migrations.RunPython(poblar_mas_vendidos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 4.2.27 on 2026-10-18 08:38
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def poblar_costos(apps, schema_editor):
+    # Las ventas anteriores no guardaron costo: se toma el costo promedio inicial del item.
+    DetalleVenta = apps.get_model('ventas', 'DetalleVenta')
+    Venta = apps.get_model('ventas', 'Venta')
+    ResumenDiarioVenta = apps.get_model('ventas', 'ResumenDiarioVenta')
+    VentaItemDiaria = apps.get_model('ventas', 'VentaItemDiaria')
+    VentaItemTotal = apps.get_model('ventas', 'VentaItemTotal')
+    costos = {
+        'FLOR': dict(apps.get_model('flor', 'Flor').objects.values_list('pk', 'costo_promedio')),
+        'PRODUCTO': dict(apps.get_model('producto', 'Producto').objects.values_list('pk', 'costo_promedio')),
+    }
+
+    por_venta, por_resumen, por_dia, por_item = (defaultdict(Decimal) for _ in range(4))
+    detalles = list(DetalleVenta.objects.select_related('venta'))
+    for detalle in detalles:
+        item_pk = detalle.flor_id if detalle.tipo_item == 'FLOR' else detalle.producto_id
+        detalle.costo_unitario = costos[detalle.tipo_item].get(item_pk, Decimal('0'))
+        detalle.costo = (detalle.cantidad * detalle.costo_unitario).quantize(Decimal('0.01'))
+        venta = detalle.venta
+        por_venta[venta.pk] += detalle.costo
+        por_resumen[(venta.fecha, venta.forma_pago, venta.tipo_venta)] += detalle.costo
+        if item_pk:
+            por_dia[(venta.fecha, detalle.tipo_item, item_pk)] += detalle.costo
+            por_item[(detalle.tipo_item, item_pk)] += detalle.costo
+    DetalleVenta.objects.bulk_update(detalles, ['costo_unitario', 'costo'], batch_size=500)
+
+    for pk, costo in por_venta.items():
+        Venta.objects.filter(pk=pk).update(costo=costo)
+    for (fecha, forma_pago, tipo_venta), costo in por_resumen.items():
+        ResumenDiarioVenta.objects.filter(fecha=fecha, forma_pago=forma_pago, tipo_venta=tipo_venta).update(costo=costo)
+    for (fecha, tipo_item, item_id), costo in por_dia.items():
+        VentaItemDiaria.objects.filter(fecha=fecha, tipo_item=tipo_item, item_id=item_id).update(costo=costo)
+    for (tipo_item, item_id), costo in por_item.items():
+        VentaItemTotal.objects.filter(tipo_item=tipo_item, item_id=item_id).update(costo=costo)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('compras', '0005_costo_promedio_inicial'),
+        ('ventas', '0004_mas_vendidos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detalleventa',
+            name='costo',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='detalleventa',
+            name='costo_unitario',
+            field=models.DecimalField(blank=True, decimal_places=4, editable=False, help_text='Costo promedio del item en el momento de la venta', max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='resumendiarioventa',
+            name='costo',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='costo',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Costo de los items al momento de la venta', max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='ventaitemdiaria',
+            name='costo',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='ventaitemtotal',
+            name='costo',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.RunPython(poblar_costos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.27 on 2026-10-18 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0005_costo_venta'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['created_at', 'id'], name='ventas_venta_creada'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['fecha', 'total'], name='ventas_venta_fecha_total'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['total'], name='ventas_venta_total'),
+        ),
+    ]
@@ -1,8 +1,11 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from decimal import Decimal
 
+from core.resumenes import acumular_en_fila_de, acumular_lote, mover_aporte, reconstruir
+
 
 TIPO_VENTA_CHOICES = [
     ('BP', 'Bajo Pedido'),
@@ -51,13 +54,31 @@ class Venta(models.Model):
     total = models.DecimalField(
         max_digits=12, decimal_places=2, default=0, editable=False
     )
+    costo = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, editable=False,
+        help_text='Costo de los items al momento de la venta'
+    )
 
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
     def recalcular_totales(self):
-        """Recalcula subtotal (solo items) y total (items + adicionales)."""
-        subtotal_items = sum((d.subtotal for d in self.detalles.all()), Decimal('0'))
+        """Recalcula subtotal (solo items) y total (items + adicionales) leyendo los detalles."""
+        self.aplicar_detalles(self.detalles.all())
+
+    def aplicar_detalles(self, detalles):
+        """Fija subtotal, costo y total a partir de los detalles (guardados o por guardar)."""
+        detalles = list(detalles)
+        self.costo = sum((d.costo for d in detalles), Decimal('0'))
+        self.aplicar_subtotal(sum((d.subtotal for d in detalles), Decimal('0')))
+
+    @property
+    def margen(self):
+        """Margen bruto de los items (sin mano de obra ni envío)."""
+        return (self.subtotal or Decimal('0')) - (self.costo or Decimal('0'))
+
+    def aplicar_subtotal(self, subtotal_items):
+        """Fija subtotal y total a partir de la suma ya calculada de los items."""
         total = subtotal_items + (self.mano_obra or Decimal('0'))
 
         if self.con_domicilio:
@@ -66,10 +87,102 @@ class Venta(models.Model):
         self.subtotal = subtotal_items
         self.total = total
 
+    def sumar_a_totales(self, delta, costo=Decimal('0')):
+        """Suma ``delta`` (cambio en los items) a subtotal y total, y ``costo`` al costo, con un UPDATE F()."""
+        Venta.objects.filter(pk=self.pk).update(
+            subtotal=F('subtotal') + delta,
+            total=F('total') + delta,
+            costo=F('costo') + costo,
+        )
+        self.subtotal += delta
+        self.total += delta
+        self.costo += costo
+
+        acumular_en_fila_de(
+            ResumenDiarioVenta,
+            Venta.objects.filter(pk=self.pk),
+            {'fecha': 'fecha', 'forma_pago': 'forma_pago', 'tipo_venta': 'tipo_venta'},
+            {'subtotal': delta, 'total': delta, 'costo': costo},
+        )
+
+    def aporte_resumen(self):
+        """Claves y valores con que la venta suma a ``ResumenDiarioVenta``."""
+        claves = {'fecha': self.fecha, 'forma_pago': self.forma_pago, 'tipo_venta': self.tipo_venta}
+        valores = {
+            'num_ventas': 1,
+            'subtotal': self.subtotal or Decimal('0'),
+            'total': self.total or Decimal('0'),
+            'mano_obra': self.mano_obra or Decimal('0'),
+            'precio_envio': (self.precio_envio or Decimal('0')) if self.con_domicilio else Decimal('0'),
+            'costo': self.costo or Decimal('0'),
+        }
+        return claves, valores
+
+    def _aporte_anterior(self):
+        """
+        Aporte de la fila guardada, leída con bloqueo dentro de la transacción.
+
+        Subtotal y costo los mantienen los detalles por delta, así que se toman
+        de la fila: una instancia cargada antes de editar las líneas no los pisa.
+        """
+        if self._state.adding or self.pk is None:
+            return None
+        guardada = Venta.objects.select_for_update().filter(pk=self.pk).first()
+        if guardada is None:
+            return None
+        self.subtotal = guardada.subtotal
+        self.costo = guardada.costo
+        return guardada.aporte_resumen()
+
+    def sumar_a_lineas(self, cambios):
+        """Registra en los contadores de más vendidos ``{(tipo_item, item_pk): (unidades, ingresos, costo)}``."""
+        registrar_lineas_vendidas(
+            (self.fecha, tipo_item, item_pk, *cambio)
+            for (tipo_item, item_pk), cambio in cambios.items()
+        )
+
+    def _lineas_agrupadas(self, fecha, signo):
+        filas = (
+            self.detalles.order_by()
+            .values('tipo_item', 'flor_id', 'producto_id')
+            .annotate(unidades=Sum('cantidad'), ingresos=Sum('subtotal'), costo_items=Sum('costo'))
+        )
+        return [
+            (
+                fecha,
+                fila['tipo_item'],
+                fila['flor_id'] if fila['tipo_item'] == 'FLOR' else fila['producto_id'],
+                signo * fila['unidades'],
+                signo * fila['ingresos'],
+                signo * fila['costo_items'],
+            )
+            for fila in filas
+        ]
+
     def save(self, *args, **kwargs):
-        if self.pk:
-            self.recalcular_totales()
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            # El subtotal se mantiene por delta desde DetalleVenta; aquí solo se
+            # recalculan los adicionales sin releer los detalles.
+            anterior = self._aporte_anterior()
+            self.aplicar_subtotal(self.subtotal or Decimal('0'))
+            super().save(*args, **kwargs)
+            nuevo = self.aporte_resumen()
+            mover_aporte(ResumenDiarioVenta, anterior, nuevo)
+            fecha_anterior = anterior[0]['fecha'] if anterior else None
+            if fecha_anterior and fecha_anterior != self.fecha:
+                # Las unidades vendidas pasan del día anterior al nuevo.
+                registrar_lineas_vendidas(
+                    self._lineas_agrupadas(fecha_anterior, -1) + self._lineas_agrupadas(self.fecha, 1)
+                )
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            anterior = self._aporte_anterior()
+            if anterior:
+                registrar_lineas_vendidas(self._lineas_agrupadas(anterior[0]['fecha'], -1))
+            resultado = super().delete(*args, **kwargs)
+            mover_aporte(ResumenDiarioVenta, anterior, None)
+        return resultado
 
     def __str__(self):
         return f"Venta #{self.id} - {self.cliente}"
@@ -78,6 +191,14 @@ class Venta(models.Model):
         ordering  = ['-created_at']
         verbose_name       = 'Venta'
         verbose_name_plural = 'Ventas'
+        # Rutas del listado: página por cursor (created_at, id), rango de fechas
+        # con o sin rango de total y rango de total solo. El filtro por cliente
+        # ya usa el índice de la llave foránea.
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='ventas_venta_creada'),
+            models.Index(fields=['fecha', 'total'], name='ventas_venta_fecha_total'),
+            models.Index(fields=['total'], name='ventas_venta_total'),
+        ]
 
 
 class DetalleVenta(models.Model):
@@ -102,17 +223,107 @@ class DetalleVenta(models.Model):
     subtotal = models.DecimalField(
         max_digits=12, decimal_places=2, editable=False
     )
+    costo_unitario = models.DecimalField(
+        max_digits=12, decimal_places=4, null=True, blank=True, editable=False,
+        help_text='Costo promedio del item en el momento de la venta'
+    )
+    costo = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, editable=False
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
-    def save(self, *args, **kwargs):
+    # Importes que la línea suma a la venta (ver core.detalles).
+    CAMPOS_IMPORTE = ('subtotal', 'costo')
+
+    def preparar(self):
+        """Normaliza FK, subtotal y costo; bulk_create/bulk_update no pasan por save()."""
         # Coherencia mínima entre tipo_item y FK
         if self.tipo_item == 'FLOR':
             self.producto = None
         elif self.tipo_item == 'PRODUCTO':
             self.flor = None
 
+        if self.costo_unitario is None:
+            # El costo se copia una sola vez: las compras posteriores no cambian el margen de esta venta.
+            item = self.item
+            self.costo_unitario = item.costo_promedio if item else Decimal('0')
+
         self.subtotal = self.cantidad * self.precio
-        super().save(*args, **kwargs)
+        self.costo = (self.cantidad * Decimal(self.costo_unitario)).quantize(Decimal('0.01'))
+        return self
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._subtotal_guardado = instancia.__dict__.get('subtotal')
+        if not instancia.get_deferred_fields():
+            instancia._linea_guardada = instancia._linea()
+        return instancia
+
+    def clave_item(self):
+        return self.tipo_item, self.flor_id if self.tipo_item == 'FLOR' else self.producto_id
+
+    def _linea(self):
+        return (*self.clave_item(), self.cantidad, self.subtotal, self.costo)
+
+    def linea_vendida(self, signo=1):
+        """Tupla para ``registrar_lineas_vendidas`` con la fecha de la venta."""
+        tipo_item, item_pk = self.clave_item()
+        return (
+            self.venta.fecha, tipo_item, item_pk,
+            signo * self.cantidad, signo * self.subtotal, signo * self.costo,
+        )
+
+    def _subtotal_anterior(self):
+        if self._state.adding:
+            return Decimal('0')
+        anterior = getattr(self, '_subtotal_guardado', None)
+        if anterior is None:
+            anterior = DetalleVenta.objects.filter(pk=self.pk).values_list('subtotal', flat=True).first()
+        return anterior or Decimal('0')
+
+    def _linea_anterior(self):
+        if self._state.adding:
+            return None
+        linea = getattr(self, '_linea_guardada', None)
+        if linea is None:
+            guardado = DetalleVenta.objects.filter(pk=self.pk).first()
+            linea = guardado._linea() if guardado else None
+        return linea
+
+    def save(self, *args, **kwargs):
+        self.preparar()
+        delta = self.subtotal - self._subtotal_anterior()
+        anterior = self._linea_anterior()
+        delta_costo = self.costo - (anterior[4] if anterior else Decimal('0'))
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            lineas = [self.linea_vendida()]
+            if anterior:
+                tipo_item, item_pk, cantidad, subtotal, costo = anterior
+                lineas.append((self.venta.fecha, tipo_item, item_pk, -cantidad, -subtotal, -costo))
+            registrar_lineas_vendidas(lineas)
+            if delta or delta_costo:
+                self.venta.sumar_a_totales(delta, delta_costo)
+        self._subtotal_guardado = self.subtotal
+        self._linea_guardada = self._linea()
+
+    def delete(self, *args, **kwargs):
+        anterior = self._subtotal_anterior()
+        linea = self._linea_anterior()
+        costo = Decimal('0')
+        with transaction.atomic():
+            resultado = super().delete(*args, **kwargs)
+            if linea:
+                tipo_item, item_pk, cantidad, subtotal, costo = linea
+                registrar_lineas_vendidas([(self.venta.fecha, tipo_item, item_pk, -cantidad, -subtotal, -costo)])
+            if anterior or costo:
+                self.venta.sumar_a_totales(-anterior, -costo)
+        return resultado
+
+    @property
+    def margen(self):
+        return (self.subtotal or Decimal('0')) - (self.costo or Decimal('0'))
 
     @property
     def item(self):
@@ -128,4 +339,165 @@ class DetalleVenta(models.Model):
     class Meta:
         ordering = ['-created_at']
         verbose_name        = 'Detalle de venta'
-        verbose_name_plural = 'Detalles de venta'
\ No newline at end of file
+        verbose_name_plural = 'Detalles de venta'
+
+
+class ResumenDiarioVenta(models.Model):
+    """Totales de ventas por día, forma de pago y tipo de venta, mantenidos por diferencias."""
+
+    fecha = models.DateField()
+    forma_pago = models.CharField(max_length=30, choices=FORMA_PAGO_CHOICES)
+    tipo_venta = models.CharField(max_length=20, choices=TIPO_VENTA_CHOICES)
+    num_ventas = models.IntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    mano_obra = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    precio_envio = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    costo = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'forma_pago', 'tipo_venta'],
+                name='ventas_resumen_diario_unico',
+            ),
+        ]
+        verbose_name        = 'Resumen diario de ventas'
+        verbose_name_plural = 'Resúmenes diarios de ventas'
+
+    @classmethod
+    def reconstruir(cls):
+        """Recalcula el resumen completo desde Venta con un GROUP BY. Devuelve las filas creadas."""
+        decimal = DecimalField(max_digits=14, decimal_places=2)
+        filas = (
+            Venta.objects.order_by()
+            .values('fecha', 'forma_pago', 'tipo_venta')
+            .annotate(
+                r_num_ventas=Count('pk'),
+                r_subtotal=Sum('subtotal'),
+                r_total=Sum('total'),
+                r_mano_obra=Sum('mano_obra'),
+                r_precio_envio=Sum(Case(
+                    When(con_domicilio=True, then=F('precio_envio')),
+                    default=Value(Decimal('0')),
+                    output_field=decimal,
+                )),
+                r_costo=Sum('costo'),
+            )
+        )
+        return reconstruir(cls, (
+            {campo[2:] if campo.startswith('r_') else campo: valor for campo, valor in fila.items()}
+            for fila in filas
+        ))
+
+
+class VentaItemDiaria(models.Model):
+    """Unidades e ingresos vendidos de un item en un día (base de las ventanas de 7/30/365 días)."""
+
+    fecha = models.DateField()
+    tipo_item = models.CharField(max_length=20, choices=DetalleVenta.TIPO_ITEM_CHOICES)
+    item_id = models.BigIntegerField()
+    unidades = models.IntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    costo = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tipo_item', 'item_id', 'fecha'], name='ventas_item_diaria_unica'),
+        ]
+        indexes = [models.Index(fields=['fecha'], name='ventas_item_diaria_fecha')]
+        verbose_name        = 'Venta diaria por item'
+        verbose_name_plural = 'Ventas diarias por item'
+
+
+class VentaItemTotal(models.Model):
+    """Acumulado histórico por item para el ranking de más vendidos."""
+
+    tipo_item = models.CharField(max_length=20, choices=DetalleVenta.TIPO_ITEM_CHOICES)
+    item_id = models.BigIntegerField()
+    unidades = models.IntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    costo = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    ultima_venta = models.DateField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tipo_item', 'item_id'], name='ventas_item_total_unico'),
+        ]
+        indexes = [models.Index(fields=['-unidades'], name='ventas_item_total_unidades')]
+        verbose_name        = 'Total vendido por item'
+        verbose_name_plural = 'Totales vendidos por item'
+
+
+def registrar_lineas_vendidas(lineas):
+    """
+    Suma ``lineas`` a los contadores de más vendidos en un número fijo de consultas.
+
+    Cada línea es ``(fecha, tipo_item, item_pk, unidades, ingresos, costo)``; los
+    valores negativos restan (ediciones y eliminaciones).
+    """
+    diario, total = {}, {}
+    for fecha, tipo_item, item_pk, unidades, ingresos, costo in lineas:
+        if not item_pk:
+            continue
+        for destino, clave in ((diario, (fecha, tipo_item, item_pk)), (total, (tipo_item, item_pk))):
+            valores = destino.setdefault(clave, {'unidades': 0, 'ingresos': Decimal('0'), 'costo': Decimal('0')})
+            valores['unidades'] += unidades
+            valores['ingresos'] += ingresos
+            valores['costo'] += costo
+
+    total = {clave: valores for clave, valores in total.items() if any(valores.values())}
+    acumular_lote(VentaItemDiaria, ('fecha', 'tipo_item', 'item_id'), diario)
+    if not total:
+        return
+    acumular_lote(VentaItemTotal, ('tipo_item', 'item_id'), total)
+
+    # La última venta es el último día con unidades, así también se corrige al borrar.
+    condicion = Q()
+    for tipo_item, item_pk in total:
+        condicion |= Q(tipo_item=tipo_item, item_id=item_pk)
+    ultimo_dia = (
+        VentaItemDiaria.objects.filter(
+            tipo_item=OuterRef('tipo_item'), item_id=OuterRef('item_id'), unidades__gt=0
+        )
+        .order_by('-fecha')
+        .values('fecha')[:1]
+    )
+    VentaItemTotal.objects.filter(condicion).update(ultima_venta=Subquery(ultimo_dia))
+
+
+def reconstruir_mas_vendidos():
+    """Recalcula los contadores de más vendidos desde DetalleVenta. Devuelve las filas diarias."""
+    filas = (
+        DetalleVenta.objects.order_by()
+        .values('venta__fecha', 'tipo_item', 'flor_id', 'producto_id')
+        .annotate(r_unidades=Sum('cantidad'), r_ingresos=Sum('subtotal'), r_costo=Sum('costo'))
+    )
+    diario, total = [], {}
+    for fila in filas:
+        item_pk = fila['flor_id'] if fila['tipo_item'] == 'FLOR' else fila['producto_id']
+        if not item_pk:
+            continue
+        diario.append({
+            'fecha': fila['venta__fecha'],
+            'tipo_item': fila['tipo_item'],
+            'item_id': item_pk,
+            'unidades': fila['r_unidades'],
+            'ingresos': fila['r_ingresos'],
+            'costo': fila['r_costo'],
+        })
+        acumulado = total.setdefault(
+            (fila['tipo_item'], item_pk),
+            {
+                'tipo_item': fila['tipo_item'], 'item_id': item_pk,
+                'unidades': 0, 'ingresos': 0, 'costo': 0, 'ultima_venta': None,
+            },
+        )
+        acumulado['unidades'] += fila['r_unidades']
+        acumulado['ingresos'] += fila['r_ingresos']
+        acumulado['costo'] += fila['r_costo']
+        if fila['r_unidades'] > 0 and (acumulado['ultima_venta'] is None or fila['venta__fecha'] > acumulado['ultima_venta']):
+            acumulado['ultima_venta'] = fila['venta__fecha']
+
+    reconstruir(VentaItemTotal, total.values())
+    return reconstruir(VentaItemDiaria, diario)
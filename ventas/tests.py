@@ -1,14 +1,25 @@
+import io
+import zipfile
 from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-from django.test import TestCase
+from django.contrib.messages import get_messages
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from clientes.models import Cliente
+from core.kpis import resumir_kpis
+from core.models import StockMovimiento
+from core.movimientos import diferencias_con_contadores
 from flor.models import Flor
 from producto.models import Producto
 from usuarios.models import Usuario
 
-from .models import Venta
+from .models import DetalleVenta, ResumenDiarioVenta, Venta, VentaItemDiaria, VentaItemTotal, reconstruir_mas_vendidos
+from .views import _parse_detalles_venta
 
 
 class VentaStockTests(TestCase):
@@ -46,7 +57,7 @@ class VentaStockTests(TestCase):
 			tipo_producto="globos",
 		)
 
-	def _crear_venta(self, cant_flor=3, cant_producto=2):
+	def _crear_venta(self, cant_flor=3, cant_producto=2, **extra):
 		return self.client.post(
 			reverse("ventas:crear"),
 			{
@@ -60,6 +71,7 @@ class VentaStockTests(TestCase):
 				"arreglo_id[]": [f"F-{self.flor.id}", f"P-{self.producto.id}"],
 				"cantidad[]": [str(cant_flor), str(cant_producto)],
 				"precio[]": ["10000", "5000"],
+				**extra,
 			},
 		)
 
@@ -72,6 +84,26 @@ class VentaStockTests(TestCase):
 		self.assertEqual(self.flor.cantidad, 7)
 		self.assertEqual(self.producto.cantidad, 4)
 
+	def test_crear_venta_repetida_no_duplica(self):
+		clave = self.client.get(reverse("ventas:crear")).context["clave_idempotencia"]
+
+		primera = self._crear_venta(clave_idempotencia=clave)
+		segunda = self._crear_venta(clave_idempotencia=clave)
+
+		self.assertEqual(primera.status_code, 302)
+		self.assertEqual(segunda.status_code, 302)
+		venta = Venta.objects.get()
+		mensajes = [str(m) for m in get_messages(segunda.wsgi_request)]
+		self.assertIn(f"La venta #{venta.pk} ya estaba registrada.", mensajes)
+
+		self.flor.refresh_from_db()
+		self.producto.refresh_from_db()
+		self.assertEqual(self.flor.cantidad, 7)
+		self.assertEqual(self.producto.cantidad, 4)
+
+		self._crear_venta(clave_idempotencia=self.client.get(reverse("ventas:crear")).context["clave_idempotencia"])
+		self.assertEqual(Venta.objects.count(), 2)
+
 	def test_crear_venta_stock_insuficiente(self):
 		response = self.client.post(
 			reverse("ventas:crear"),
@@ -95,6 +127,73 @@ class VentaStockTests(TestCase):
 		self.flor.refresh_from_db()
 		self.assertEqual(self.flor.cantidad, 10)
 
+	def test_crear_venta_consultas_constantes(self):
+		flores = [
+			Flor.objects.create(nombre=f"Flor Lote {i}", precio=1000, cantidad=50, tipo_flor="rosa")
+			for i in range(8)
+		]
+
+		def _post(items):
+			datos = {
+				"tipo_venta": "EI",
+				"cliente": self.cliente.id,
+				"fecha": date.today().isoformat(),
+				"forma_pago": "efectivo",
+				"mano_obra": "0",
+				"precio_envio": "0",
+				"arreglo_id[]": [f"F-{f.id}" for f in items] + [f"P-{self.producto.id}"],
+				"cantidad[]": ["1"] * (len(items) + 1),
+				"precio[]": ["1000"] * len(items) + ["5000"],
+			}
+			with CaptureQueriesContext(connection) as ctx:
+				response = self.client.post(reverse("ventas:crear"), datos)
+			self.assertEqual(response.status_code, 302)
+			return len(ctx.captured_queries)
+
+		_post(flores)  # crea las filas de resumen y más vendidos del día
+		consultas_corta = _post(flores[:1])
+		consultas_larga = _post(flores)
+
+		self.assertEqual(consultas_corta, consultas_larga)
+		self.assertEqual(DetalleVenta.objects.count(), 9 + 2 + 9)
+		self.assertEqual(Flor.objects.get(pk=flores[0].pk).cantidad, 47)
+
+	def test_parse_detalles_resuelve_items_en_lote(self):
+		otra = Flor.objects.create(nombre="Clavel Lote", precio=1500, cantidad=3, tipo_flor="clavel")
+		request = RequestFactory().post(
+			reverse("ventas:crear"),
+			{
+				"arreglo_id[]": [f"F-{self.flor.id}", f"F-{otra.id}", f"P-{self.producto.id}"],
+				"cantidad[]": ["1", "2", "1"],
+				"precio[]": ["", "", "4000"],
+			},
+		)
+
+		with self.assertNumQueries(2):
+			detalles = _parse_detalles_venta(request)
+
+		self.assertEqual([d["precio"] for d in detalles], [10000, 1500, 4000])
+		self.assertEqual(detalles[1]["item"].cantidad, 3)
+
+	def test_crear_venta_sin_stock_no_intenta_update(self):
+		with CaptureQueriesContext(connection) as ctx:
+			response = self._crear_venta(cant_flor=50)
+
+		self.assertEqual(response.status_code, 200)
+		self.assertFalse([q for q in ctx.captured_queries if q["sql"].startswith('UPDATE "flor_')])
+		self.assertContains(response, "Stock insuficiente para Rosa Venta Test")
+
+	def test_detalle_venta_no_escribe(self):
+		self._crear_venta()
+		venta = Venta.objects.latest("id")
+
+		with CaptureQueriesContext(connection) as ctx:
+			response = self.client.get(reverse("ventas:detalle", args=[venta.id]))
+
+		self.assertEqual(response.status_code, 200)
+		escrituras = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith("UPDATE \"ventas_")]
+		self.assertEqual(escrituras, [])
+
 	def test_editar_venta_ajusta_stock(self):
 		self._crear_venta(cant_flor=3, cant_producto=2)
 		venta = Venta.objects.latest("id")
@@ -122,6 +221,111 @@ class VentaStockTests(TestCase):
 		self.assertEqual(self.flor.cantidad, 5)
 		self.assertEqual(self.producto.cantidad, 5)
 
+	def test_editar_venta_solo_reescribe_lineas_cambiadas(self):
+		self._crear_venta(cant_flor=3, cant_producto=2)
+		venta = Venta.objects.latest("id")
+		detalle_flor = venta.detalles.get(tipo_item="FLOR")
+		detalle_producto = venta.detalles.get(tipo_item="PRODUCTO")
+
+		response = self.client.post(
+			reverse("ventas:editar", args=[venta.id]),
+			{
+				"tipo_venta": "EI",
+				"cliente": self.cliente.id,
+				"fecha": date.today().isoformat(),
+				"forma_pago": "efectivo",
+				"mano_obra": "0",
+				"precio_envio": "0",
+				"arreglo_id[]": [f"F-{self.flor.id}"],
+				"cantidad[]": ["4"],
+				"precio[]": ["10000"],
+			},
+		)
+
+		self.assertEqual(response.status_code, 302)
+		detalles = list(venta.detalles.all())
+		self.assertEqual(len(detalles), 1)
+		self.assertEqual(detalles[0].pk, detalle_flor.pk)
+		self.assertEqual(detalles[0].cantidad, 4)
+		self.assertFalse(DetalleVenta.objects.filter(pk=detalle_producto.pk).exists())
+
+		self.flor.refresh_from_db()
+		self.producto.refresh_from_db()
+		self.assertEqual(self.flor.cantidad, 6)
+		self.assertEqual(self.producto.cantidad, 6)
+
+		venta.refresh_from_db()
+		self.assertEqual(float(venta.total), 40000.0)
+
+	def test_contadores_mas_vendidos_siguen_las_vistas(self):
+		def _contadores():
+			total = list(VentaItemTotal.objects.filter(unidades__gt=0).order_by("tipo_item").values_list("tipo_item", "unidades", "ingresos", "ultima_venta"))
+			diario = list(VentaItemDiaria.objects.exclude(unidades=0).order_by("fecha", "tipo_item").values_list("fecha", "tipo_item", "unidades"))
+			return total, diario
+
+		self._crear_venta(cant_flor=3, cant_producto=2)
+		venta = Venta.objects.latest("id")
+		ayer = date.today() - timedelta(days=1)
+		self.client.post(
+			reverse("ventas:editar", args=[venta.id]),
+			{
+				"tipo_venta": "EI",
+				"cliente": self.cliente.id,
+				"fecha": ayer.isoformat(),
+				"forma_pago": "efectivo",
+				"mano_obra": "0",
+				"precio_envio": "0",
+				"arreglo_id[]": [f"F-{self.flor.id}"],
+				"cantidad[]": ["4"],
+				"precio[]": ["10000"],
+			},
+		)
+
+		incremental = _contadores()
+		self.assertEqual(incremental[0], [("FLOR", 4, 40000, ayer)])
+		self.assertEqual(incremental[1], [(ayer, "FLOR", 4)])
+		reconstruir_mas_vendidos()
+		self.assertEqual(_contadores(), incremental)
+
+		self.client.post(reverse("ventas:eliminar", args=[venta.id]))
+		self.assertEqual(_contadores(), ([], []))
+
+	def test_costo_se_copia_al_vender_y_da_el_margen(self):
+		Flor.objects.filter(pk=self.flor.pk).update(costo_promedio=Decimal("4000"))
+		Producto.objects.filter(pk=self.producto.pk).update(costo_promedio=Decimal("2500"))
+		self._crear_venta(cant_flor=3, cant_producto=2)
+		venta = Venta.objects.latest("id")
+		self.assertEqual((venta.costo, venta.margen), (Decimal("17000"), Decimal("23000")))
+
+		# Un nuevo costo promedio no cambia las ventas ya registradas, solo las líneas nuevas.
+		Flor.objects.filter(pk=self.flor.pk).update(costo_promedio=Decimal("6000"))
+		self.client.post(
+			reverse("ventas:editar", args=[venta.id]),
+			{
+				"tipo_venta": "EI",
+				"cliente": self.cliente.id,
+				"fecha": date.today().isoformat(),
+				"forma_pago": "efectivo",
+				"mano_obra": "0",
+				"precio_envio": "0",
+				"arreglo_id[]": [f"F-{self.flor.id}", f"P-{self.producto.id}"],
+				"cantidad[]": ["1", "2"],
+				"precio[]": ["10000", "5000"],
+			},
+		)
+		venta.refresh_from_db()
+		self.assertEqual(venta.costo, Decimal("9000"))
+		self.assertEqual(
+			list(DetalleVenta.objects.filter(venta=venta).order_by("tipo_item").values_list("costo_unitario", "costo")),
+			[(Decimal("4000"), Decimal("4000")), (Decimal("2500"), Decimal("5000"))],
+		)
+		self.assertEqual(ResumenDiarioVenta.objects.get().costo, Decimal("9000"))
+		self.assertEqual(VentaItemTotal.objects.get(tipo_item="FLOR").costo, Decimal("4000"))
+
+		self.client.post(reverse("ventas:eliminar", args=[venta.id]))
+		self.assertEqual(ResumenDiarioVenta.objects.get().costo, 0)
+		self.assertEqual(VentaItemTotal.objects.get(tipo_item="FLOR").costo, 0)
+
 	def test_eliminar_venta_devuelve_stock(self):
 		self._crear_venta(cant_flor=4, cant_producto=3)
 		venta = Venta.objects.latest("id")
@@ -133,6 +337,11 @@ class VentaStockTests(TestCase):
 		self.producto.refresh_from_db()
 		self.assertEqual(self.flor.cantidad, 10)
 		self.assertEqual(self.producto.cantidad, 6)
+		self.assertEqual(diferencias_con_contadores(), [])
+		self.assertEqual(
+			list(StockMovimiento.objects.filter(tipo_item="FLOR").order_by("pk").values_list("motivo", "delta", "documento_id")),
+			[("INICIAL", 10, None), ("VENTA", -4, venta.id), ("VENTA_ELIMINADA", 4, venta.id)],
+		)
 
 	def test_subtotal_y_total_se_guardan_correctamente(self):
 		response = self.client.post(
@@ -162,6 +371,99 @@ class VentaStockTests(TestCase):
 		self.assertEqual(float(venta.total), 47000.0)
 
 
+class VentaTotalesIncrementalesTests(TestCase):
+	def setUp(self):
+		cliente = Cliente.objects.create(documento="7654323", tipo_documento="CC", nombre="Cliente", apellido="Totales")
+		self.flor = Flor.objects.create(nombre="Rosa Totales", precio=1000, cantidad=10, tipo_flor="rosa")
+		self.venta = Venta.objects.create(
+			cliente=cliente,
+			tipo_venta="EI",
+			fecha=date.today(),
+			forma_pago="efectivo",
+			mano_obra=500,
+		)
+
+	def test_detalle_ajusta_totales_por_delta(self):
+		detalle = DetalleVenta.objects.create(venta=self.venta, tipo_item="FLOR", flor=self.flor, cantidad=2, precio=1000)
+		self.venta.refresh_from_db()
+		self.assertEqual(float(self.venta.subtotal), 2000.0)
+		self.assertEqual(float(self.venta.total), 2500.0)
+
+		detalle = DetalleVenta.objects.get(pk=detalle.pk)
+		detalle.cantidad = 3
+		detalle.save()
+		self.venta.refresh_from_db()
+		self.assertEqual(float(self.venta.total), 3500.0)
+
+		detalle.delete()
+		self.venta.refresh_from_db()
+		self.assertEqual(float(self.venta.subtotal), 0.0)
+		self.assertEqual(float(self.venta.total), 500.0)
+
+	def test_guardar_venta_no_lee_detalles(self):
+		DetalleVenta.objects.create(venta=self.venta, tipo_item="FLOR", flor=self.flor, cantidad=1, precio=1000)
+		venta = Venta.objects.get(pk=self.venta.pk)
+		venta.mano_obra = 700
+
+		with CaptureQueriesContext(connection) as ctx:
+			venta.save()
+
+		# Relee solo la fila de la venta y escribe su resumen diario; no lee los detalles.
+		self.assertFalse([q for q in ctx.captured_queries if "ventas_detalleventa" in q["sql"]])
+		venta.refresh_from_db()
+		self.assertEqual(float(venta.total), 1700.0)
+
+	def test_instancia_desactualizada_no_pisa_totales(self):
+		DetalleVenta.objects.create(venta=self.venta, tipo_item="FLOR", flor=self.flor, cantidad=2, precio=1000)
+		venta = Venta.objects.get(pk=self.venta.pk)
+
+		# Otra edición cambia las líneas después de cargar ``venta``.
+		detalle = DetalleVenta.objects.get()
+		detalle.cantidad = 5
+		detalle.save()
+
+		venta.mano_obra = 700
+		venta.save()
+		venta.refresh_from_db()
+		self.assertEqual((float(venta.subtotal), float(venta.total)), (5000.0, 5700.0))
+		fila = ResumenDiarioVenta.objects.get()
+		self.assertEqual((float(fila.subtotal), float(fila.total), float(fila.mano_obra)), (5000.0, 5700.0, 700.0))
+
+		venta.delete()
+		fila.refresh_from_db()
+		self.assertEqual((fila.num_ventas, float(fila.subtotal), float(fila.total)), (0, 0.0, 0.0))
+
+
+	def _resumen(self):
+		return list(
+			ResumenDiarioVenta.objects.filter(num_ventas__gt=0)
+			.order_by("fecha", "forma_pago", "tipo_venta")
+			.values("fecha", "forma_pago", "tipo_venta", "num_ventas", "subtotal", "total", "mano_obra", "precio_envio")
+		)
+
+	def test_resumen_diario_sigue_altas_ediciones_y_bajas(self):
+		detalle = DetalleVenta.objects.create(venta=self.venta, tipo_item="FLOR", flor=self.flor, cantidad=2, precio=1000)
+		fila = ResumenDiarioVenta.objects.get()
+		self.assertEqual((fila.num_ventas, float(fila.subtotal), float(fila.total)), (1, 2000.0, 2500.0))
+
+		venta = Venta.objects.get(pk=self.venta.pk)
+		venta.forma_pago = "nequi"
+		venta.con_domicilio = True
+		venta.precio_envio = 300
+		venta.save()
+		detalle.cantidad = 3
+		detalle.save()
+
+		incremental = self._resumen()
+		ResumenDiarioVenta.reconstruir()
+		self.assertEqual(incremental, self._resumen())
+		self.assertEqual(incremental[0]["forma_pago"], "nequi")
+		self.assertEqual(float(incremental[0]["total"]), 3800.0)
+
+		Venta.objects.get(pk=self.venta.pk).delete()
+		self.assertEqual(self._resumen(), [])
+
+
 class VentaFiltroListadoTests(TestCase):
 	def setUp(self):
 		self.user = Usuario.objects.create_user(
@@ -213,6 +515,22 @@ class VentaFiltroListadoTests(TestCase):
 		self.assertEqual(len(ventas), 1)
 		self.assertEqual(ventas[0].cliente_id, self.cliente_1.id)
 
+	def test_filtra_cliente_sin_tildes_y_por_prefijo(self):
+		cliente = Cliente.objects.create(documento="8001003", tipo_documento="CC", nombre="José", apellido="Muñoz")
+		Venta.objects.create(cliente=cliente, tipo_venta="EI", fecha=date.today(), forma_pago="efectivo")
+
+		for texto in ("jose munoz", "Muñoz", "mun jo"):
+			response = self.client.get(reverse("ventas:listar_venta"), {"cliente_nombre": texto})
+			self.assertEqual([v.cliente_id for v in response.context["ventas"]], [cliente.id], texto)
+
+		response = self.client.get(reverse("ventas:buscar_cliente"), {"q": "munoz"})
+		self.assertEqual([c["id"] for c in response.json()["clientes"]], [cliente.id])
+
+		cliente.apellido = "Ramírez"
+		cliente.save()
+		response = self.client.get(reverse("ventas:buscar_cliente"), {"q": "munoz"})
+		self.assertEqual(response.json()["clientes"], [])
+
 	def test_filtra_por_fecha_desde(self):
 		fecha_filtro = (date.today() - timedelta(days=2)).isoformat()
 		response = self.client.get(reverse("ventas:listar_venta"), {"fecha_desde": fecha_filtro})
@@ -240,3 +558,92 @@ class VentaFiltroListadoTests(TestCase):
 		ventas = list(response.context["ventas"])
 		self.assertEqual(len(ventas), 1)
 		self.assertEqual(ventas[0].cliente_id, self.cliente_1.id)
+
+	@mock.patch("ventas.views.VENTAS_POR_PAGINA", 1)
+	def test_pagina_por_cursor_respetando_filtros(self):
+		response = self.client.get(reverse("ventas:listar_venta"), {"precio_min": "5000"})
+		ventas = response.context["ventas"]
+		self.assertEqual([v.cliente_id for v in ventas], [self.cliente_2.id])
+		self.assertIsNone(response.context["cursor_anterior"])
+		self.assertEqual(ventas[0].num_items, 0)
+
+		response = self.client.get(
+			reverse("ventas:listar_venta"),
+			{"precio_min": "5000", "despues": response.context["cursor_siguiente"]},
+		)
+		ventas = response.context["ventas"]
+		self.assertEqual([v.cliente_id for v in ventas], [self.cliente_1.id])
+		self.assertIsNone(response.context["cursor_siguiente"])
+
+		response = self.client.get(
+			reverse("ventas:listar_venta"),
+			{"precio_min": "5000", "antes": response.context["cursor_anterior"]},
+		)
+		self.assertEqual([v.cliente_id for v in response.context["ventas"]], [self.cliente_2.id])
+
+	@mock.patch("ventas.views.VENTAS_POR_PAGINA", 1)
+	def test_kpis_sin_filtros_desde_el_resumen_y_solo_en_la_primera_pagina(self):
+		url = reverse("ventas:listar_venta")
+		with CaptureQueriesContext(connection) as ctx:
+			response = self.client.get(url)
+
+		esperados = resumir_kpis(Venta.objects.all(), campo_monto="total", campo_relacion="cliente", campo_fecha="fecha")
+		self.assertEqual(response.context["kpis"], esperados)
+		self.assertEqual(response.context["kpis"].total, 2)
+		# No se agregan las ventas: el total sale de ResumenDiarioVenta.
+		self.assertFalse([q for q in ctx.captured_queries if "kpi_relacionados" in q["sql"]])
+		self.assertTrue([q for q in ctx.captured_queries if "ventas_resumendiarioventa" in q["sql"]])
+
+		with CaptureQueriesContext(connection) as ctx:
+			response = self.client.get(url, {"despues": response.context["cursor_siguiente"]})
+		self.assertIsNone(response.context["kpis"])
+		self.assertFalse([q for q in ctx.captured_queries if "kpi_" in q["sql"]])
+		self.assertEqual([v.cliente_id for v in response.context["ventas"]], [self.cliente_1.id])
+
+	def test_exporta_csv_y_xlsx_con_filtros(self):
+		flor = Flor.objects.create(nombre="Tulipán", precio=5000, cantidad=10, tipo_flor="rosa")
+		venta = Venta.objects.get(cliente=self.cliente_1)
+		DetalleVenta.objects.create(venta=venta, tipo_item="FLOR", flor=flor, cantidad=2, precio=5000)
+
+		response = self.client.get(reverse("ventas:exportar"), {"cliente_nombre": "Ana"})
+		self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+		contenido = b"".join(response.streaming_content).decode("utf-8-sig")
+		filas = [fila for fila in contenido.splitlines() if fila]
+		self.assertEqual(len(filas), 2)
+		self.assertIn("Tulipán", filas[1])
+		self.assertIn("Ana Garcia", filas[1])
+
+		response = self.client.get(reverse("ventas:exportar"), {"formato": "xlsx"})
+		archivo = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+		hoja = archivo.read("xl/worksheets/sheet1.xml").decode()
+		self.assertEqual(hoja.count("<row "), 3)
+		self.assertIn("Luis Perez", hoja)
+
+
+class BuscarArregloTests(TestCase):
+	def setUp(self):
+		Flor.objects.create(nombre="Orquídea Blanca", descripcion="Flor tropical", precio=15000, cantidad=4, tipo_flor="orquidea")
+		Flor.objects.create(nombre="Rosa Roja", descripcion="Ideal con orquídeas", precio=8000, cantidad=9, tipo_flor="rosa")
+		self.producto = Producto.objects.create(nombre="Orquidario Decorativo", precio=30000, cantidad=1, tipo_producto="decoraciones")
+
+	def _buscar(self, q):
+		response = self.client.get(reverse("ventas:buscar_arreglo"), {"q": q})
+		self.assertEqual(response.status_code, 200)
+		return response.json()["arreglos"]
+
+	def test_busqueda_sin_tildes_y_por_prefijo(self):
+		nombres = [a["nombre_flor"] for a in self._buscar("orquidea")]
+		self.assertEqual(nombres[0], "Orquídea Blanca")
+		self.assertIn("Rosa Roja", nombres)
+
+		nombres = [a["nombre_flor"] for a in self._buscar("orq")]
+		self.assertIn("Orquidario Decorativo", nombres)
+		self.assertEqual(self._buscar("orq")[0]["precio"].count("."), 1)
+
+	def test_indice_sigue_cambios_de_los_items(self):
+		self.producto.nombre = "Jarrón Decorativo"
+		self.producto.save()
+		self.assertEqual([a["id"] for a in self._buscar("jarron")], [f"P-{self.producto.id}"])
+
+		self.producto.delete()
+		self.assertEqual(self._buscar("jarron"), [])
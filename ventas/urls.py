@@ -5,6 +5,7 @@ app_name = 'ventas'
 
 urlpatterns = [
     path('listar',           views.listar_ventas,  name='listar_venta'),
+    path('exportar/',        views.exportar_ventas, name='exportar'),
     path('crear/',           views.crear_venta,    name='crear'),
     path('<int:pk>/',        views.detalle_venta,  name='detalle'),
     path('<int:pk>/editar/', views.editar_venta,   name='editar'),
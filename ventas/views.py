@@ -1,18 +1,36 @@
 from decimal import Decimal, InvalidOperation
 from datetime import date, datetime
+from urllib.parse import urlencode
 
 from django.contrib import messages
-from django.db import transaction
-from django.db.models import Q, Sum
+from django.db.models import Count, Exists, OuterRef, Prefetch, Q, Subquery, prefetch_related_objects
+from django.db.models.functions import Coalesce
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.text import Truncator
 
 from clientes.models import Cliente
+from clientes.utils import q_busqueda_cliente
+from core.busqueda import buscar_items, url_imagen
+from core.detalles import conciliar_detalles
+from core.exportacion import respuesta_csv, respuesta_xlsx
+from core.idempotencia import SolicitudRepetida, completar_clave, normalizar_clave, nueva_clave, registrar_clave
+from core.kpis import resumir_kpis, resumir_kpis_sin_filtros
+from core.paginacion import paginar_por_cursor
+from core.movimientos import movimientos_de, registrar_movimientos
+from core.stock import MODELOS_ITEM, agrupar_cantidades, ajustar_stock, verificar_disponible
+from core.transacciones import escritura
+from core.versiones import respuesta_condicional
 from flor.models import Flor
 from producto.models import Producto
 
 from .forms import VentaForm
-from .models import DetalleVenta, Venta
+from .models import DetalleVenta, ResumenDiarioVenta, Venta, registrar_lineas_vendidas
+
+
+VENTAS_POR_PAGINA = 25
+ARREGLOS_POR_BUSQUEDA = 20
+EXPORTACION_CHUNK = 500
 
 
 def _parse_item_id(raw_item_id):
@@ -26,6 +44,12 @@ def _parse_item_id(raw_item_id):
 
 
 def _parse_detalles_venta(request):
+    """
+    Lee las líneas del POST y resuelve sus items con un ``in_bulk`` por tipo.
+
+    Cada detalle incluye ``item``: la instancia de Flor o Producto con su precio
+    y stock actuales.
+    """
     arreglo_ids = request.POST.getlist("arreglo_id[]")
     cantidades = request.POST.getlist("cantidad[]")
     precios = request.POST.getlist("precio[]")
@@ -59,23 +83,12 @@ def _parse_detalles_venta(request):
             except InvalidOperation:
                 raise ValueError(f"Item {idx}: Formato invalido en precio.")
 
-        if not precio or precio <= 0:
-            # Fallback: si no llega precio en el POST, tomar el precio actual del item.
-            try:
-                if tipo_item == "FLOR":
-                    precio = Flor.objects.get(pk=item_pk).precio
-                else:
-                    precio = Producto.objects.get(pk=item_pk).precio
-            except (Flor.DoesNotExist, Producto.DoesNotExist):
-                raise ValueError(f"Item {idx}: El item seleccionado ya no existe.")
-
         if cantidad <= 0:
             raise ValueError(f"Item {idx}: La cantidad debe ser mayor a 0.")
-        if precio <= 0:
-            raise ValueError(f"Item {idx}: El precio debe ser mayor a 0.")
 
         detalles.append(
             {
+                "idx": idx,
                 "tipo_item": tipo_item,
                 "item_pk": item_pk,
                 "cantidad": cantidad,
@@ -86,136 +99,239 @@ def _parse_detalles_venta(request):
     if not detalles:
         raise ValueError("Debes agregar al menos un item a la venta.")
 
-    return detalles
+    items = _cargar_items(detalles)
+    for data in detalles:
+        item = items.get((data["tipo_item"], data["item_pk"]))
+        if item is None:
+            raise ValueError(f"Item {data['idx']}: El item seleccionado ya no existe.")
+        data["item"] = item
 
+        if not data["precio"] or data["precio"] <= 0:
+            # Fallback: si no llega precio en el POST, tomar el precio actual del item.
+            data["precio"] = item.precio
+        if data["precio"] <= 0:
+            raise ValueError(f"Item {data['idx']}: El precio debe ser mayor a 0.")
 
-def _lock_item(tipo_item, item_pk):
-    if tipo_item == "FLOR":
-        return Flor.objects.select_for_update().get(pk=item_pk)
-    return Producto.objects.select_for_update().get(pk=item_pk)
+    return detalles
 
 
-def _descontar_stock(tipo_item, item_pk, cantidad):
-    item = _lock_item(tipo_item, item_pk)
-    if item.cantidad < cantidad:
-        raise ValueError(
-            f"Stock insuficiente para {item.nombre}. Disponible: {item.cantidad}, solicitado: {cantidad}."
+def _cargar_items(detalles):
+    """Trae los items referenciados en a lo sumo dos consultas (Flor y Producto)."""
+    items = {}
+    for tipo_item, modelo in MODELOS_ITEM.items():
+        pks = {data["item_pk"] for data in detalles if data["tipo_item"] == tipo_item}
+        if pks:
+            for pk, item in modelo.objects.in_bulk(pks).items():
+                items[(tipo_item, pk)] = item
+    return items
+
+
+def _construir_detalles(venta, detalles):
+    """Arma los DetalleVenta (sin guardar) a partir de los detalles del POST."""
+    nuevos = []
+    for data in detalles:
+        detalle = DetalleVenta(
+            venta=venta,
+            tipo_item=data["tipo_item"],
+            cantidad=data["cantidad"],
+            precio=data["precio"],
         )
-    item.cantidad -= cantidad
-    item.save(update_fields=["cantidad"])
+        if data["tipo_item"] == "FLOR":
+            detalle.flor = data["item"]
+        else:
+            detalle.producto = data["item"]
+        nuevos.append(detalle.preparar())
+    return nuevos
 
 
-def _devolver_stock(tipo_item, item_pk, cantidad):
-    item = _lock_item(tipo_item, item_pk)
-    item.cantidad += cantidad
-    item.save(update_fields=["cantidad"])
+def _detalles_guardados(venta):
+    """Detalles actuales de la venta en el formato de ``_parse_detalles_venta``."""
+    detalles = []
+    for tipo_item, flor_id, producto_id, cantidad in venta.detalles.values_list(
+        "tipo_item", "flor_id", "producto_id", "cantidad"
+    ):
+        item_pk = flor_id if tipo_item == "FLOR" else producto_id
+        if item_pk:
+            detalles.append({"tipo_item": tipo_item, "item_pk": item_pk, "cantidad": cantidad})
+    return detalles
 
 
-def listar_ventas(request):
-    ventas = Venta.objects.select_related("cliente").prefetch_related("detalles__flor", "detalles__producto")
+def _parse_fecha(raw_fecha):
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y"):
+        try:
+            return datetime.strptime(raw_fecha, fmt).date()
+        except ValueError:
+            continue
+    return None
 
-    q = request.GET.get("q", "").strip()
-    cliente_nombre = request.GET.get("cliente_nombre", "").strip()
-    fecha_desde = request.GET.get("fecha_desde", "").strip()
-    precio_min = request.GET.get("precio_min", "").strip()
-    precio_max = request.GET.get("precio_max", "").strip()
 
-    def _parse_fecha(raw_fecha):
-        for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y"):
-            try:
-                return datetime.strptime(raw_fecha, fmt).date()
-            except ValueError:
-                continue
+def _parse_decimal(raw_numero):
+    valor = (raw_numero or "").strip()
+    if not valor:
+        return None
+    try:
+        if "," in valor:
+            valor = valor.replace(".", "").replace(",", ".")
+        return Decimal(valor)
+    except (InvalidOperation, ValueError, TypeError):
         return None
 
-    def _parse_decimal(raw_numero):
-        valor = (raw_numero or "").strip()
-        if not valor:
-            return None
-        try:
-            if "," in valor:
-                valor = valor.replace(".", "").replace(",", ".")
-            return Decimal(valor)
-        except (InvalidOperation, ValueError, TypeError):
-            return None
+
+def _filtrar_ventas(params):
+    """
+    Aplica los filtros del listado de ventas (q, cliente, fechas, precios).
+
+    Devuelve ``(ventas, filtros)``; en ``filtros`` los valores inválidos quedan vacíos.
+    """
+    ventas = Venta.objects.select_related("cliente")
+    filtros = {
+        clave: params.get(clave, "").strip()
+        for clave in ("q", "cliente_nombre", "fecha_desde", "fecha_hasta", "precio_min", "precio_max")
+    }
+    q = filtros["q"]
 
     if q:
-        filtros_q = (
-            Q(cliente__nombre__icontains=q) |
-            Q(cliente__apellido__icontains=q) |
-            Q(cliente__documento__icontains=q)
-        )
+        filtros_q = q_busqueda_cliente(q, prefijo="cliente__")
         if q.isdigit():
             filtros_q = filtros_q | Q(id=int(q))
         ventas = ventas.filter(filtros_q)
 
-    if cliente_nombre:
-        partes_nombre = [p for p in cliente_nombre.split() if p]
-        filtro_cliente = Q(cliente__nombre__icontains=cliente_nombre) | Q(cliente__apellido__icontains=cliente_nombre)
-
-        if len(partes_nombre) >= 2:
-            primer_token = partes_nombre[0]
-            resto_nombre = " ".join(partes_nombre[1:])
-            filtro_cliente = filtro_cliente | (
-                Q(cliente__nombre__icontains=primer_token) & Q(cliente__apellido__icontains=resto_nombre)
-            ) | (
-                Q(cliente__apellido__icontains=primer_token) & Q(cliente__nombre__icontains=resto_nombre)
-            )
+    if filtros["cliente_nombre"]:
+        ventas = ventas.filter(q_busqueda_cliente(filtros["cliente_nombre"], prefijo="cliente__"))
 
-        ventas = ventas.filter(filtro_cliente)
+    for clave, lookup in (("fecha_desde", "fecha__gte"), ("fecha_hasta", "fecha__lte")):
+        if filtros[clave]:
+            fecha = _parse_fecha(filtros[clave])
+            if fecha:
+                ventas = ventas.filter(**{lookup: fecha})
+            else:
+                filtros[clave] = ""
 
-    if fecha_desde:
-        fecha = _parse_fecha(fecha_desde)
-        if fecha:
-            ventas = ventas.filter(fecha__gte=fecha)
-        else:
-            fecha_desde = ""
+    for clave, lookup in (("precio_min", "total__gte"), ("precio_max", "total__lte")):
+        if filtros[clave]:
+            valor = _parse_decimal(filtros[clave])
+            if valor is not None:
+                ventas = ventas.filter(**{lookup: valor})
+            else:
+                filtros[clave] = ""
 
-    precio_min_val = _parse_decimal(precio_min)
-    precio_max_val = _parse_decimal(precio_max)
+    return ventas, filtros
 
-    if precio_min and precio_min_val is None:
-        precio_min = ""
-    if precio_max and precio_max_val is None:
-        precio_max = ""
 
-    if precio_min_val is not None:
-        ventas = ventas.filter(total__gte=precio_min_val)
-    if precio_max_val is not None:
-        ventas = ventas.filter(total__lte=precio_max_val)
+def listar_ventas(request):
+    ventas, filtros = _filtrar_ventas(request.GET)
 
     clientes = Cliente.objects.all().order_by("nombre", "apellido")
 
-    total_ventas = ventas.count()
-    monto_total = ventas.aggregate(Sum("total"))["total__sum"] or 0
-    total_clientes = ventas.values("cliente").distinct().count()
+    hay_filtros = any(filtros.values())
+    # Los indicadores solo se muestran en la primera página; sin filtros salen del resumen diario.
+    kpis = None
+    if not (request.GET.get("despues") or request.GET.get("antes")):
+        if hay_filtros:
+            kpis = resumir_kpis(ventas, campo_monto="total", campo_relacion="cliente", campo_fecha="fecha")
+        else:
+            kpis = resumir_kpis_sin_filtros(
+                ResumenDiarioVenta,
+                campo_conteo="num_ventas",
+                campo_monto="total",
+                relacionados=Cliente.objects.filter(Exists(Venta.objects.filter(cliente=OuterRef("pk")))),
+            )
+
+    num_items = (
+        DetalleVenta.objects.filter(venta=OuterRef("pk"))
+        .order_by()
+        .values("venta")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    pagina = paginar_por_cursor(
+        ventas.annotate(num_items=Coalesce(Subquery(num_items), 0)),
+        despues=request.GET.get("despues"),
+        antes=request.GET.get("antes"),
+        por_pagina=VENTAS_POR_PAGINA,
+    )
+    # Los detalles solo se cargan para las ventas de la página visible.
+    prefetch_related_objects(pagina.objetos, "detalles__flor", "detalles__producto")
 
-    hoy = date.today()
-    inicio_mes = hoy.replace(day=1)
-    ventas_mes = ventas.filter(fecha__gte=inicio_mes, fecha__lte=hoy).count()
+    filtros_query = urlencode({clave: valor for clave, valor in filtros.items() if valor})
 
     context = {
-        "ventas": ventas,
-        "query": q,
+        "ventas": pagina.objetos,
+        "cursor_siguiente": pagina.cursor_siguiente,
+        "cursor_anterior": pagina.cursor_anterior,
+        "filtros_query": filtros_query,
+        "query": filtros["q"],
         "clientes": clientes,
-        "cliente_nombre_filtro": cliente_nombre,
-        "fecha_desde_filtro": fecha_desde,
-        "precio_min_filtro": precio_min,
-        "precio_max_filtro": precio_max,
-        "total_ventas": total_ventas,
-        "monto_total": monto_total,
-        "total_clientes": total_clientes,
-        "ventas_mes": ventas_mes,
-        "resultados_filtrados": ventas.count(),
-        "hay_filtros": any([q, cliente_nombre, fecha_desde, precio_min, precio_max]),
+        "cliente_nombre_filtro": filtros["cliente_nombre"],
+        "fecha_desde_filtro": filtros["fecha_desde"],
+        "fecha_hasta_filtro": filtros["fecha_hasta"],
+        "precio_min_filtro": filtros["precio_min"],
+        "precio_max_filtro": filtros["precio_max"],
+        "kpis": kpis,
+        "resultados_filtrados": kpis.total if kpis else None,
+        "hay_filtros": hay_filtros,
     }
     return render(request, "ventas/listar_venta.html", context)
 
 
+ENCABEZADOS_EXPORTACION = [
+    "Venta", "Fecha", "Cliente", "Documento", "Tipo de venta", "Forma de pago", "Domicilio",
+    "Mano de obra", "Envio", "Subtotal venta", "Total venta",
+    "Tipo item", "Item", "Cantidad", "Precio unitario", "Subtotal linea",
+]
+
+
+def _filas_exportacion(ventas):
+    """Una fila por línea de venta; las ventas sin líneas salen con las columnas de item vacías."""
+    detalles = Prefetch(
+        "detalles",
+        queryset=DetalleVenta.objects.select_related("flor", "producto").order_by("pk"),
+    )
+    consulta = ventas.order_by("fecha", "pk").prefetch_related(detalles)
+    for venta in consulta.iterator(chunk_size=EXPORTACION_CHUNK):
+        datos_venta = [
+            venta.pk,
+            venta.fecha,
+            f"{venta.cliente.nombre} {venta.cliente.apellido}",
+            venta.cliente.documento,
+            venta.get_tipo_venta_display(),
+            venta.get_forma_pago_display(),
+            "Si" if venta.con_domicilio else "No",
+            venta.mano_obra,
+            venta.precio_envio,
+            venta.subtotal,
+            venta.total,
+        ]
+        lineas = venta.detalles.all()
+        if not lineas:
+            yield datos_venta + ["", "", "", "", ""]
+        for detalle in lineas:
+            yield datos_venta + [
+                detalle.get_tipo_item_display(),
+                detalle.item_nombre,
+                detalle.cantidad,
+                detalle.precio,
+                detalle.subtotal,
+            ]
+
+
+def exportar_ventas(request):
+    ventas, _ = _filtrar_ventas(request.GET)
+    nombre = f"ventas_{date.today():%Y%m%d}"
+    filas = _filas_exportacion(ventas)
+
+    if request.GET.get("formato") == "xlsx":
+        return respuesta_xlsx(nombre, ENCABEZADOS_EXPORTACION, filas, hoja="Ventas")
+    return respuesta_csv(nombre, ENCABEZADOS_EXPORTACION, filas)
+
+
 def crear_venta(request):
     flores = Flor.objects.all().order_by("nombre")
     productos = Producto.objects.all().order_by("nombre")
     mostrar_campos_domicilio = False
+    # Si el formulario se vuelve a mostrar por un error se conserva la clave:
+    # nada quedó registrado con ella.
+    clave = normalizar_clave(request.POST.get("clave_idempotencia")) if request.method == "POST" else None
 
     if request.method == "POST":
         form = VentaForm(request.POST)
@@ -233,36 +349,38 @@ def crear_venta(request):
                     "flores": flores,
                     "productos": productos,
                     "mostrar_campos_domicilio": mostrar_campos_domicilio,
+                    "clave_idempotencia": clave or nueva_clave(),
                 },
             )
 
         if form.is_valid():
             try:
-                with transaction.atomic():
-                    venta = form.save(commit=False)
-                    venta.total = Decimal("0")
-                    venta.save()
+                cambios = agrupar_cantidades(detalles, signo=-1)
+                with escritura():
+                    registro = registrar_clave("crear_venta", clave) if clave else None
 
-                    for data in detalles:
-                        detalle = DetalleVenta(
-                            venta=venta,
-                            tipo_item=data["tipo_item"],
-                            cantidad=data["cantidad"],
-                            precio=data["precio"],
-                        )
-                        if data["tipo_item"] == "FLOR":
-                            detalle.flor = Flor.objects.get(pk=data["item_pk"])
-                        else:
-                            detalle.producto = Producto.objects.get(pk=data["item_pk"])
-                        detalle.save()
+                    # El stock ya cargado por el parser permite rechazar sin intentar el UPDATE;
+                    # va después de la clave para que un reenvío se responda como repetido.
+                    verificar_disponible(cambios, {(d["tipo_item"], d["item_pk"]): d["item"] for d in detalles})
+                    ajustar_stock(cambios)
 
-                        _descontar_stock(data["tipo_item"], data["item_pk"], data["cantidad"])
+                    venta = form.save(commit=False)
+                    nuevos = _construir_detalles(venta, detalles)
+                    venta.aplicar_detalles(nuevos)
+                    venta.save()
 
-                    venta.recalcular_totales()
-                    venta.save(update_fields=["subtotal", "total"])
+                    DetalleVenta.objects.bulk_create(nuevos)
+                    registrar_lineas_vendidas(detalle.linea_vendida() for detalle in nuevos)
+                    registrar_movimientos(movimientos_de(cambios, "VENTA", venta.pk))
+                    if registro:
+                        completar_clave(registro, venta.pk)
 
                 messages.success(request, f"Venta #{venta.id} registrada correctamente.")
                 return redirect("ventas:listar_venta")
+            except SolicitudRepetida as exc:
+                # Reenvío del mismo formulario: se responde como la primera vez sin tocar el stock.
+                messages.info(request, f"La venta #{exc.resultado_id} ya estaba registrada.")
+                return redirect("ventas:listar_venta")
             except (Flor.DoesNotExist, Producto.DoesNotExist):
                 messages.error(request, "Uno de los items seleccionados ya no existe.")
             except ValueError as exc:
@@ -280,6 +398,7 @@ def crear_venta(request):
             "flores": flores,
             "productos": productos,
             "mostrar_campos_domicilio": mostrar_campos_domicilio,
+            "clave_idempotencia": clave or nueva_clave(),
         },
     )
 
@@ -313,40 +432,13 @@ def editar_venta(request, pk):
 
         if form.is_valid():
             try:
-                with transaction.atomic():
+                with escritura():
                     venta = form.save()
 
-                    detalles_actuales = list(venta.detalles.select_related("flor", "producto"))
-                    for detalle in detalles_actuales:
-                        item_pk = detalle.flor_id if detalle.tipo_item == "FLOR" else detalle.producto_id
-                        if not item_pk:
-                            continue
-
-                        _devolver_stock(
-                            detalle.tipo_item,
-                            item_pk,
-                            detalle.cantidad,
-                        )
-
-                    venta.detalles.all().delete()
-
-                    for data in nuevos_detalles:
-                        detalle = DetalleVenta(
-                            venta=venta,
-                            tipo_item=data["tipo_item"],
-                            cantidad=data["cantidad"],
-                            precio=data["precio"],
-                        )
-                        if data["tipo_item"] == "FLOR":
-                            detalle.flor = Flor.objects.get(pk=data["item_pk"])
-                        else:
-                            detalle.producto = Producto.objects.get(pk=data["item_pk"])
-                        detalle.save()
-
-                        _descontar_stock(data["tipo_item"], data["item_pk"], data["cantidad"])
-
-                    venta.recalcular_totales()
-                    venta.save(update_fields=["subtotal", "total"])
+                    deltas = conciliar_detalles(venta, nuevos_detalles)
+                    cambios = {clave: -delta for clave, delta in deltas.items()}
+                    ajustar_stock(cambios)
+                    registrar_movimientos(movimientos_de(cambios, "VENTA_EDITADA", venta.pk))
 
                 messages.success(request, f"Venta #{venta.id} actualizada correctamente.")
                 return redirect("ventas:listar_venta")
@@ -378,8 +470,6 @@ def detalle_venta(request, pk):
         Venta.objects.prefetch_related("detalles__flor", "detalles__producto").select_related("cliente"),
         pk=pk,
     )
-    venta.recalcular_totales()
-    venta.save(update_fields=["subtotal", "total"])
     return render(request, "ventas/detalle_venta.html", {"venta": venta})
 
 
@@ -388,18 +478,10 @@ def eliminar_venta(request, pk):
 
     if request.method == "POST":
         try:
-            with transaction.atomic():
-                detalles = list(venta.detalles.select_related("flor", "producto"))
-                for detalle in detalles:
-                    item_pk = detalle.flor_id if detalle.tipo_item == "FLOR" else detalle.producto_id
-                    if not item_pk:
-                        continue
-
-                    _devolver_stock(
-                        detalle.tipo_item,
-                        item_pk,
-                        detalle.cantidad,
-                    )
+            with escritura():
+                cambios = agrupar_cantidades(_detalles_guardados(venta))
+                ajustar_stock(cambios)
+                registrar_movimientos(movimientos_de(cambios, "VENTA_ELIMINADA", venta.pk))
                 venta.delete()
 
             messages.success(request, f"Venta #{pk} eliminada correctamente.")
@@ -410,43 +492,30 @@ def eliminar_venta(request, pk):
     return render(request, "ventas/eliminar_venta.html", {"venta": venta})
 
 
+@respuesta_condicional("clientes.Cliente", privado=True)
 def buscar_cliente(request):
     q = request.GET.get("q", "").strip()
-    clientes = Cliente.objects.filter(nombre__icontains=q)[:10]
+    clientes = Cliente.objects.filter(q_busqueda_cliente(q))[:10]
     data = list(clientes.values("id", "nombre", "direccion"))
     return JsonResponse({"clientes": data})
 
 
+@respuesta_condicional("flor.Flor", "producto.Producto")
 def buscar_arreglo(request):
     q = request.GET.get("q", "").strip()
 
-    flores = Flor.objects.filter(nombre__icontains=q)[:10]
-    productos = Producto.objects.filter(nombre__icontains=q)[:10]
-
     data = []
-    for f in flores:
-        data.append(
-            {
-                "id": f"F-{f.id}",
-                "nombre_flor": f.nombre,
-                "tipo_producto": "Flor",
-                "descripcion": f.descripcion,
-                "precio": str(f.precio),
-                "stock": f.cantidad,
-                "imagen": f.imagen.url if f.imagen else "",
-            }
-        )
-
-    for p in productos:
+    for item in buscar_items(q, limite=ARREGLOS_POR_BUSQUEDA):
+        es_flor = item["tipo_item"] == "FLOR"
         data.append(
             {
-                "id": f"P-{p.id}",
-                "nombre_flor": p.nombre,
-                "tipo_producto": "Producto",
-                "descripcion": p.descripcion,
-                "precio": str(p.precio),
-                "stock": p.cantidad,
-                "imagen": p.imagen.url if p.imagen else "",
+                "id": f"{'F' if es_flor else 'P'}-{item['id']}",
+                "nombre_flor": item["nombre"],
+                "tipo_producto": "Flor" if es_flor else "Producto",
+                "descripcion": Truncator(item["descripcion"]).chars(120),
+                "precio": str(Decimal(str(item["precio"])).quantize(Decimal("0.01"))),
+                "stock": item["cantidad"],
+                "imagen": url_imagen(item["imagen"]),
             }
         )
 